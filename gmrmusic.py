@@ -5,32 +5,521 @@ import os
 import sys
 import time
 import argparse
+import copy
+import hashlib
+import io
+import mmap
 import requests
+from requests.adapters import HTTPAdapter
 import platform
-import pandas as pd
+import random
+from openpyxl import Workbook, load_workbook
+import re
 import shutil
+import sqlite3
+import struct
+import atexit
+import tempfile
+import threading
+import unicodedata
+import queue
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import zip_longest
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 from tqdm import tqdm
 from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC
+from mutagen.id3 import ID3, ID3NoHeaderError, TIT2, TPE1, TALB, APIC
 from mutagen.mp4 import MP4, MP4Cover
 from mutagen import File
 
+# Backend opcional: yt-dlp usado em processo (--api)
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+# Opcional: Pillow para reduzir capas grandes antes de embutir
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Opcional: numpy para calcular e comparar fingerprints acústicas sem o Chromaprint
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Opcional: pyarrow para o catálogo colunar (Parquet/Arrow)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 
 # Set the biblioteca path to be relative to the script location
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BIBLIOTECA_PATH = os.path.join(SCRIPT_DIR, 'biblioteca')
 BIBLIOTECA_CSV = os.path.join(BIBLIOTECA_PATH, 'biblioteca.csv')
+BIBLIOTECA_DB = os.path.join(BIBLIOTECA_PATH, 'biblioteca.db')
 SECONDBRAIN_PATH = "/mnt/shared_folder/SecondBrain/"
 MARKDOWN_FILE = os.path.join(SECONDBRAIN_PATH, "musicas.md")
 EXCEL_FILE = os.path.join(SECONDBRAIN_PATH, "musicas.xlsx")
+PARQUET_FILE = os.path.join(SECONDBRAIN_PATH, "musicas.parquet")
+ARROW_FILE = os.path.join(SECONDBRAIN_PATH, "musicas.arrow")
+
+# Colunas do catálogo. As de escaneamento vêm dos arquivos; as demais (Novo_Nome, Tags e
+# qualquer coluna adicionada à mão) pertencem ao usuário e são preservadas no Excel.
+COLUNAS_CATALOGO = ["Diretório", "Nome_arquivo", "Novo_Nome", "meta_artista", "URL", "Tags"]
+COLUNAS_ESCANEAMENTO = ("Diretório", "Nome_arquivo", "meta_artista", "URL")
+
+# Caches locais (pastas ocultas são ignoradas na organização da biblioteca)
+CACHE_PATH = os.path.join(BIBLIOTECA_PATH, '.cache')
+THUMBNAILS_CACHE_PATH = os.path.join(CACHE_PATH, 'thumbnails')
+THUMBNAILS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+THUMBNAILS_CACHE_TTL = 7 * 24 * 3600  # Segundos até revalidar uma thumbnail com o servidor
+
+# Mensagens de andamento por arquivo (--verboso); erros e avisos são sempre exibidos
+SAIDA = {"verboso": False}
+
+# Política de capas: dimensões máximas, qualidade JPEG e orçamento de bytes por arquivo
+POLITICA_CAPA = {
+    "largura_max": 600,
+    "altura_max": 600,
+    "qualidade_jpeg": 85,
+    "bytes_max": 150 * 1024,
+}
+
+# Detecção de duplicatas acústicas: fingerprints dos primeiros `segundos` de cada faixa,
+# candidatas com duração até `tolerancia_duracao` segundos de diferença e similaridade
+# mínima (1 - taxa de bits diferentes) para considerar a mesma gravação
+POLITICA_DUPLICATAS = {
+    "verificar_antes": False,  # Checagem antes de cada download (--verificar-audio)
+    "segundos": 120,
+    "trecho": 30,  # Segundos baixados do vídeo novo para a checagem antes do download
+    "tolerancia_duracao": 10,
+    "similaridade_min": 0.65,
+    "candidatos": 5,  # Faixas mais votadas no índice invertido que têm os bits comparados
+}
+
+# Tamanho dos blocos entregues ao SHA-1 no hash do conteúdo de áudio (lido via mmap)
+HASH_BLOCO = 1024 * 1024
+
+# Número de threads usadas para ler as tags durante o escaneamento
+SCAN_WORKERS = 8
+
+# Tentativas de um item da fila que falhou antes que o --sync desista dele (vídeos privados,
+# apagados ou indisponíveis na região falhariam em toda sincronização)
+SYNC_MAX_TENTATIVAS = 3
+
+# Número de arquivos regravados ao mesmo tempo na atualização em massa das tags (-M).
+# Em SSD vale aumentar; em HD ou compartilhamento de rede, reduzir (use -j)
+TAG_WORKERS = 4
+
+# Servidor Ollama usado pelo --organize (OLLAMA_HOST permite apontar para outro servidor)
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'llama3')
+OLLAMA_TIMEOUT = 120  # Segundos por requisição (um lote inteiro de nomes)
+OLLAMA_LOTE = 25  # Nomes normalizados por chamada ao modelo
+# Journals das reorganizações (--organize), usados para retomar ou desfazer uma execução
+ORGANIZACAO_PATH = os.path.join(BIBLIOTECA_PATH, '.organizacao')
+
+# Regras e apelidos extras do normalizador local: {"regras": [[padrão, substituição], ...],
+# "aliases": {"nome como aparece": "Nome Canônico", ...}}
+NORMALIZACAO_CONFIG = os.path.join(BIBLIOTECA_PATH, 'normalizacao.json')
+# Requisições simultâneas ao Ollama; convém igualar ao OLLAMA_NUM_PARALLEL do servidor
+OLLAMA_CONCORRENCIA = int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+OLLAMA_TENTATIVAS = 4  # Tentativas por requisição antes de desistir do lote
+OLLAMA_ESPERA_BASE = 1.0  # Segundos de espera antes da 2ª tentativa; dobra a cada falha
+
+# Marcador usado para identificar, na saída do yt-dlp, o caminho final do arquivo baixado
+MARCADOR_ARQUIVO_FINAL = "GMRMUSIC_ARQUIVO_FINAL="
+
+# Bitrate do AAC quando o modo pipeline precisa recodificar o áudio baixado
+PIPELINE_BITRATE_AAC = '256k'
+
+def eh_pasta_interna(nome):
+    """Indica se uma pasta da biblioteca é de uso interno (downloads temporários, caches)."""
+    return nome == "downloads_puros" or nome.startswith('.')
+
+def conectar_banco(caminho=BIBLIOTECA_DB):
+    """Abre uma conexão com o banco SQLite da biblioteca, compartilhável entre threads."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    conexao = sqlite3.connect(caminho, check_same_thread=False)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    return conexao
+
+def _caixas_mp4(f, inicio, fim):
+    """Gera (tipo, início dos dados, fim) das caixas MP4 entre inicio e fim, lendo só os cabeçalhos."""
+    pos = inicio
+    while pos + 8 <= fim:
+        f.seek(pos)
+        cabecalho = f.read(8)
+        if len(cabecalho) < 8:
+            return
+        tamanho, tipo = struct.unpack('>I4s', cabecalho)
+        tamanho_cabecalho = 8
+        if tamanho == 1:
+            tamanho = struct.unpack('>Q', f.read(8))[0]
+            tamanho_cabecalho = 16
+        elif tamanho == 0:
+            tamanho = fim - pos
+        if tamanho < tamanho_cabecalho:
+            raise ValueError(f"caixa MP4 inválida em {pos}")
+        yield tipo, pos + tamanho_cabecalho, min(pos + tamanho, fim)
+        pos += tamanho
+
+def _filha_mp4(f, inicio, fim, tipo_procurado):
+    for tipo, dados, final in _caixas_mp4(f, inicio, fim):
+        if tipo == tipo_procurado:
+            return dados, final
+    return None
+
+def _hash_trecho(f, inicio, fim, tamanho_bloco=64 * 1024):
+    """Calcula o SHA-1 de um trecho do arquivo lendo em blocos, sem carregá-lo inteiro."""
+    resumo = hashlib.sha1()
+    f.seek(inicio)
+    restante = fim - inicio
+    while restante > 0:
+        bloco = f.read(min(tamanho_bloco, restante))
+        if not bloco:
+            break
+        resumo.update(bloco)
+        restante -= len(bloco)
+    return resumo.hexdigest()
+
+# Bytes iniciais da capa que entram no hash: com o tamanho, já distinguem capas diferentes
+# sem ler imagens de vários megabytes a cada escaneamento
+CAPA_HASH_PREFIXO = 64 * 1024
+
+def hash_capa(dados, tamanho=None):
+    """Hash de uma capa: SHA-1 do tamanho da imagem e dos primeiros CAPA_HASH_PREFIXO bytes."""
+    resumo = hashlib.sha1(str(len(dados) if tamanho is None else tamanho).encode('ascii'))
+    resumo.update(dados[:CAPA_HASH_PREFIXO])
+    return resumo.hexdigest()
+
+def _hash_capa_trecho(f, inicio, fim):
+    """hash_capa() de uma imagem que ocupa o trecho do arquivo, lendo só o prefixo."""
+    f.seek(inicio)
+    return hash_capa(f.read(min(fim - inicio, CAPA_HASH_PREFIXO)), fim - inicio)
+
+def _duracao_mvhd(f, inicio, fim):
+    """Lê a duração (em segundos) da caixa mvhd do moov."""
+    mvhd = _filha_mp4(f, inicio, fim, b'mvhd')
+    if mvhd is None:
+        return None
+    f.seek(mvhd[0])
+    versao = f.read(4)[0]
+    if versao == 1:
+        escala, duracao = struct.unpack('>16xIQ', f.read(28))
+    else:
+        escala, duracao = struct.unpack('>8xII', f.read(16))
+    return duracao / escala if escala else None
+
+def _tags_ilst(f, extras):
+    """Gera (nome, valor) dos itens de texto do ilst, sem carregar o conteúdo da capa (covr).
+    
+    Em extras ficam a duração (mvhd), o bitrate médio do mdat e o hash da capa, que lê
+    só o começo da imagem.
+    """
+    tamanho_arquivo = os.fstat(f.fileno()).st_size
+    moov = None
+    bytes_audio = 0
+    for tipo, dados, final in _caixas_mp4(f, 0, tamanho_arquivo):
+        if tipo == b'moov' and moov is None:
+            moov = (dados, final)
+        elif tipo == b'mdat':
+            bytes_audio += final - dados
+    if moov is None:
+        raise ValueError("caixa moov não encontrada")
+    
+    duracao = _duracao_mvhd(f, *moov)
+    if duracao:
+        extras["duracao"] = round(duracao, 3)
+        if bytes_audio:
+            extras["bitrate"] = round(bytes_audio * 8 / duracao / 1000)
+    
+    meta = None
+    udta = _filha_mp4(f, *moov, b'udta')
+    if udta is not None:
+        meta = _filha_mp4(f, *udta, b'meta')
+    if meta is None:
+        meta = _filha_mp4(f, *moov, b'meta')
+    if meta is None:
+        return
+    # 'meta' é uma full box: 4 bytes de versão/flags antes das filhas
+    ilst = _filha_mp4(f, meta[0] + 4, meta[1], b'ilst')
+    if ilst is None:
+        return
+    
+    for tipo, inicio, fim in _caixas_mp4(f, *ilst):
+        if tipo == b'covr':
+            capa = _filha_mp4(f, inicio, fim, b'data')
+            if capa is not None and "capa_hash" not in extras:
+                # 8 bytes de tipo/locale antes da imagem
+                extras["capa_hash"] = _hash_capa_trecho(f, capa[0] + 8, capa[1])
+            continue
+        nome = tipo.decode('latin-1')
+        valor = None
+        partes_nome = []
+        for filha, dados, final in _caixas_mp4(f, inicio, fim):
+            if filha in (b'mean', b'name'):
+                f.seek(dados + 4)
+                partes_nome.append(f.read(final - dados - 4).decode('utf-8', 'replace'))
+            elif filha == b'data' and valor is None:
+                f.seek(dados)
+                tipo_dado = struct.unpack('>I', f.read(4))[0] & 0xFFFFFF
+                # Só interessam textos (UTF-8 = 1, UTF-16 = 2); dados binários são ignorados
+                if tipo_dado in (1, 2) and final - dados - 8 <= 64 * 1024:
+                    f.seek(dados + 8)
+                    bruto = f.read(final - dados - 8)
+                    valor = bruto.decode('utf-8' if tipo_dado == 1 else 'utf-16-be', 'replace')
+        if partes_nome:
+            nome = ':'.join([nome] + partes_nome)
+        if valor:
+            yield nome, valor
+
+def _syncsafe(dados):
+    return (dados[0] << 21) | (dados[1] << 14) | (dados[2] << 7) | dados[3]
+
+def _texto_id3(dados):
+    """Decodifica um campo de texto ID3 (byte de codificação + texto), retornando o primeiro valor."""
+    if not dados:
+        return ''
+    codificacao = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(dados[0], 'latin-1')
+    texto = dados[1:].decode(codificacao, 'replace')
+    return texto.split('\x00')[0].strip()
+
+def _inicio_imagem_apic(dados, versao):
+    """Retorna o deslocamento da imagem dentro de um quadro APIC/PIC, ou None."""
+    codificacao = dados[0]
+    if versao == 2:
+        pos = 1 + 3 + 1  # Formato de 3 letras e tipo da imagem
+    else:
+        fim_mime = dados.find(b'\x00', 1)
+        if fim_mime < 0:
+            return None
+        pos = fim_mime + 1 + 1
+    if codificacao in (1, 2):
+        # Descrição UTF-16: terminador de 2 bytes alinhado
+        while pos + 1 < len(dados) and dados[pos:pos + 2] != b'\x00\x00':
+            pos += 2
+        pos += 2
+    else:
+        fim_descricao = dados.find(b'\x00', pos)
+        if fim_descricao < 0:
+            return None
+        pos = fim_descricao + 1
+    return pos if pos <= len(dados) else None
+
+def _tags_id3(f, extras):
+    """Gera (nome, valor) dos quadros de texto e URL da tag ID3v2, sem carregar imagens (APIC).
+    
+    Em extras ficam o fim da tag (onde começa o áudio) e o hash da primeira imagem, que
+    lê só o começo dela.
+    """
+    cabecalho = f.read(10)
+    if len(cabecalho) < 10 or cabecalho[:3] != b'ID3':
+        return
+    versao, flags = cabecalho[3], cabecalho[5]
+    if versao not in (2, 3, 4):
+        raise ValueError(f"versão ID3v2.{versao} não suportada")
+    if flags & 0x80 and versao < 4:
+        # Tag inteira com unsynchronisation: deixa para o mutagen
+        raise ValueError("tag ID3 com unsynchronisation")
+    fim = 10 + _syncsafe(cabecalho[6:10])
+    extras["fim_tag"] = fim + (10 if versao == 4 and flags & 0x10 else 0)
+    pos = 10
+    if flags & 0x40 and versao >= 3:
+        tamanho_ext = f.read(4)
+        pos += _syncsafe(tamanho_ext) if versao == 4 else 4 + struct.unpack('>I', tamanho_ext)[0]
+    
+    tamanho_cabecalho = 6 if versao == 2 else 10
+    while pos + tamanho_cabecalho <= fim:
+        f.seek(pos)
+        quadro = f.read(tamanho_cabecalho)
+        if versao == 2:
+            id_quadro = quadro[:3]
+            tamanho = int.from_bytes(quadro[3:6], 'big')
+        else:
+            id_quadro = quadro[:4]
+            tamanho = _syncsafe(quadro[4:8]) if versao == 4 else struct.unpack('>I', quadro[4:8])[0]
+        if not id_quadro.strip(b'\x00') or tamanho <= 0:
+            break  # Início do padding
+        inicio = pos + tamanho_cabecalho
+        pos = inicio + tamanho
+        
+        nome = id_quadro.decode('latin-1')
+        codificado = versao == 4 and quadro[9] & 0x0F or versao == 3 and quadro[9] & 0xC0
+        if nome in ('APIC', 'PIC') and not codificado and "capa_hash" not in extras:
+            f.seek(inicio)
+            deslocamento = _inicio_imagem_apic(f.read(min(tamanho, 1024)), versao)
+            if deslocamento is not None:
+                extras["capa_hash"] = _hash_capa_trecho(f, inicio + deslocamento, inicio + tamanho)
+            continue
+        if nome[0] not in 'TW' or tamanho > 64 * 1024:
+            continue  # Demais quadros binários não são lidos
+        if codificado:
+            # Quadro comprimido, cifrado ou com unsynchronisation: deixa para o mutagen
+            raise ValueError(f"quadro {nome} codificado")
+        f.seek(inicio)
+        dados = f.read(tamanho)
+        if nome in ('TXXX', 'TXX', 'WXXX', 'WXX'):
+            codificacao = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}.get(dados[0], 'latin-1')
+            separador = b'\x00\x00' if dados[0] in (1, 2) else b'\x00'
+            descricao, _, resto = dados[1:].partition(separador)
+            if separador == b'\x00\x00' and len(descricao) % 2:
+                # O terminador UTF-16 precisa estar alinhado em 2 bytes
+                descricao, resto = descricao + b'\x00', resto[1:]
+            nome = f"{nome}:{descricao.decode(codificacao, 'replace')}"
+            if nome.startswith('W'):
+                valor = resto.decode('latin-1', 'replace').split('\x00')[0].strip()
+            else:
+                valor = _texto_id3(dados[:1] + resto)
+        elif nome.startswith('W'):
+            valor = dados.decode('latin-1', 'replace').split('\x00')[0].strip()
+        else:
+            valor = _texto_id3(dados)
+        if valor:
+            yield nome, valor
+
+# Tabelas do cabeçalho de quadro MPEG Layer III (kbps e Hz)
+_BITRATES_MPEG = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_TAXAS_MPEG = (44100, 48000, 32000)
+
+def _info_mpeg(f, inicio, fim):
+    """Calcula duração e bitrate de um MP3 a partir do primeiro quadro MPEG.
+    
+    Usa o contador de quadros do cabeçalho Xing/Info ou VBRI quando existe (VBR); senão
+    estima pela taxa constante do primeiro quadro. Retorna {} se não achar um quadro válido.
+    """
+    f.seek(inicio)
+    bloco = f.read(64 * 1024)
+    pos = 0
+    while True:
+        pos = bloco.find(b'\xff', pos)
+        if pos < 0 or pos + 4 > len(bloco):
+            return {}
+        b1, b2, b3 = bloco[pos + 1], bloco[pos + 2], bloco[pos + 3]
+        versao_bits, camada = (b1 >> 3) & 3, (b1 >> 1) & 3
+        indice_bitrate, indice_taxa = b2 >> 4, (b2 >> 2) & 3
+        if b1 & 0xE0 == 0xE0 and versao_bits != 1 and camada == 1 and 0 < indice_bitrate < 15 and indice_taxa < 3:
+            break
+        pos += 1
+    
+    mpeg1 = versao_bits == 3
+    taxa = _TAXAS_MPEG[indice_taxa] >> {3: 0, 2: 1, 0: 2}[versao_bits]
+    amostras = 1152 if mpeg1 else 576
+    mono = b3 >> 6 == 3
+    bytes_audio = fim - inicio - pos
+    
+    quadros = None
+    xing = pos + 4 + (17 if mono else 32) if mpeg1 else pos + 4 + (9 if mono else 17)
+    if bloco[xing:xing + 4] in (b'Xing', b'Info') and struct.unpack('>I', bloco[xing + 4:xing + 8])[0] & 1:
+        quadros = struct.unpack('>I', bloco[xing + 8:xing + 12])[0]
+    elif bloco[pos + 36:pos + 40] == b'VBRI':
+        quadros = struct.unpack('>I', bloco[pos + 50:pos + 54])[0]
+    
+    if quadros:
+        duracao = quadros * amostras / taxa
+        bitrate = round(bytes_audio * 8 / duracao / 1000) if duracao else None
+    else:
+        bitrate = _BITRATES_MPEG[1 if mpeg1 else 2][indice_bitrate]
+        duracao = bytes_audio * 8 / (bitrate * 1000)
+    return {"duracao": round(duracao, 3), "bitrate": bitrate}
+
+# Quadros de artista equivalentes a '©ART' e 'aART' em cada formato
+_CHAVES_ARTISTA = {
+    '.m4a': ('©ART', 'aART'),
+    '.mp3': ('TPE1', 'TP1', 'TPE2', 'TP2'),
+}
+
+def ler_tags_rapido(arquivo):
+    """Lê artista, URL, duração, bitrate e hash da capa percorrendo só os cabeçalhos das caixas/quadros.
+    
+    Para M4A segue moov/udta/meta/ilst e pula o conteúdo de covr; para MP3 percorre os
+    quadros ID3v2, pula as imagens e lê o primeiro quadro de áudio. Da capa só é lido o
+    começo, para o hash. Retorna None se o arquivo não puder ser lido assim.
+    """
+    extensao = os.path.splitext(arquivo)[1].lower()
+    leitor = {'.m4a': _tags_ilst, '.mp3': _tags_id3}.get(extensao)
+    if leitor is None:
+        return None
+    
+    metadados = {"meta_artista": "", "URL": "", "duracao": None, "bitrate": None, "capa_hash": None}
+    extras = {}
+    try:
+        with open(arquivo, 'rb') as f:
+            tags = dict(leitor(f, extras))
+            if extensao == '.mp3':
+                fim = os.fstat(f.fileno()).st_size
+                f.seek(max(fim - 128, 0))
+                if f.read(3) == b'TAG':
+                    fim -= 128  # Tag ID3v1 no fim do arquivo
+                extras.update(_info_mpeg(f, extras.get("fim_tag", 0), fim))
+    except (OSError, ValueError, struct.error, IndexError, ZeroDivisionError):
+        return None
+    for chave in ("duracao", "bitrate", "capa_hash"):
+        metadados[chave] = extras.get(chave)
+    
+    for chave in _CHAVES_ARTISTA[extensao]:
+        if tags.get(chave):
+            metadados["meta_artista"] = tags[chave]
+            break
+    for nome, valor in tags.items():
+        # Em MP3, além de TXXX:URL, os quadros W*** (WOAR, WXXX...) são links
+        if 'url' in nome.lower() or (extensao == '.mp3' and nome.startswith('W')):
+            metadados["URL"] = valor
+            break
+    return metadados
 
 def obter_metadados(arquivo):
-    """Extrai metadados de um arquivo de áudio m4a."""
-    metadados = {"meta_artista": "", "URL": ""}
+    """Extrai metadados de um arquivo de áudio (m4a ou mp3)."""
+    # Caminho rápido: leitura apenas dos cabeçalhos, sem carregar a capa
+    metadados = ler_tags_rapido(arquivo)
+    if metadados is not None:
+        return metadados
+    
+    metadados = {"meta_artista": "", "URL": "", "duracao": None, "bitrate": None, "capa_hash": None}
     
     try:
+        info = File(arquivo)
+        if info is not None and info.info is not None:
+            metadados["duracao"] = round(info.info.length, 3)
+            metadados["bitrate"] = round(info.info.bitrate / 1000) if info.info.bitrate else None
+    except Exception:
+        pass
+    
+    try:
+        if arquivo.lower().endswith('.mp3'):
+            audio = ID3(arquivo)
+            capas = audio.getall('APIC')
+            if capas:
+                metadados["capa_hash"] = hash_capa(capas[0].data)
+            for chave in ('TPE1', 'TPE2'):
+                if chave in audio and audio[chave].text:
+                    metadados["meta_artista"] = str(audio[chave].text[0])
+                    break
+            for chave in audio.keys():
+                if chave.startswith('W') or 'url' in chave.lower():
+                    quadro = audio[chave]
+                    valor = getattr(quadro, 'url', None) or (quadro.text[0] if getattr(quadro, 'text', None) else '')
+                    if valor:
+                        metadados["URL"] = str(valor)
+                        break
+            return metadados
+        
         audio = MP4(arquivo)
+        if audio.get('covr'):
+            metadados["capa_hash"] = hash_capa(bytes(audio['covr'][0]))
         # Extrair artista - geralmente '©ART' no formato m4a
         if '©ART' in audio:
             metadados["meta_artista"] = audio['©ART'][0]
@@ -41,7 +530,9 @@ def obter_metadados(arquivo):
         # Isso é apenas um exemplo, pois URLs não são campos padronizados em m4a
         for tag in audio:
             if 'url' in tag.lower() and audio[tag]:
-                metadados["URL"] = audio[tag][0]
+                valor = audio[tag][0]
+                # Átomos livres (----:...) chegam como bytes (MP4FreeForm)
+                metadados["URL"] = valor.decode('utf-8', 'replace') if isinstance(valor, bytes) else str(valor)
                 break
     
     except Exception as e:
@@ -49,80 +540,398 @@ def obter_metadados(arquivo):
     
     return metadados
 
-def escanear_biblioteca():
-    """Escaneia a biblioteca de músicas e retorna uma lista de dados."""
-    dados = []
+def listar_arquivos_audio(raiz=BIBLIOTECA_PATH, extensoes=('.m4a',)):
+    """Percorre a biblioteca em uma única passada com os.scandir, gerando os arquivos de áudio encontrados."""
+    pilha = [raiz]
+    while pilha:
+        pasta = pilha.pop()
+        try:
+            with os.scandir(pasta) as iterador:
+                # Ordena por nome para que os catálogos saiam sempre na mesma ordem
+                entradas = sorted(iterador, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Erro ao listar {pasta}: {e}")
+            continue
+        
+        subpastas = []
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                if not eh_pasta_interna(entrada.name):
+                    subpastas.append(entrada.path)
+            elif entrada.name.lower().endswith(extensoes) and entrada.is_file():
+                yield entrada
+        # Empilha ao contrário para visitar as subpastas em ordem alfabética
+        pilha.extend(reversed(subpastas))
+
+class CacheEscaneamento:
+    """Cache persistente das tags lidas no escaneamento, guardado no banco da biblioteca.
     
-    print(f"Escaneando diretório: {BIBLIOTECA_PATH}")
+    Cada arquivo é identificado pelo caminho relativo e validado por inode, tamanho e
+    mtime: só arquivos novos ou alterados precisam ser relidos. Entradas gravadas por
+    uma versão anterior do leitor (VERSAO_METADADOS) também são relidas.
     
-    # Contar o número total de arquivos m4a para a barra de progresso
-    total_arquivos = 0
-    for raiz, _, arquivos in os.walk(BIBLIOTECA_PATH):
-        for arquivo in arquivos:
-            if arquivo.lower().endswith('.m4a'):
-                total_arquivos += 1
+    Junto das tags fica, quando já calculado, o hash do conteúdo de áudio (sem as tags),
+    usado para encontrar arquivos duplicados; ele é descartado quando o arquivo muda.
+    """
     
-    print(f"Total de arquivos m4a encontrados: {total_arquivos}")
+    VERSAO_METADADOS = 3
     
-    # Usar tqdm para barra de progresso
-    progresso = tqdm(total=total_arquivos, desc="Processando arquivos")
+    def __init__(self, caminho=BIBLIOTECA_DB):
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS cache_scan (
+                    caminho TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    tamanho INTEGER,
+                    mtime_ns INTEGER,
+                    versao INTEGER,
+                    metadados TEXT,
+                    conteudo_hash TEXT
+                )""")
+            colunas = {linha[1] for linha in self.conexao.execute("PRAGMA table_info(cache_scan)")}
+            if 'conteudo_hash' not in colunas:
+                self.conexao.execute("ALTER TABLE cache_scan ADD COLUMN conteudo_hash TEXT")
+        self._entradas = {}
+        self._hashes = {}
+        for caminho, inode, tamanho, mtime_ns, versao, metadados, conteudo_hash in self.conexao.execute(
+                "SELECT caminho, inode, tamanho, mtime_ns, versao, metadados, conteudo_hash FROM cache_scan"):
+            self._entradas[caminho] = (inode, tamanho, mtime_ns, versao, metadados)
+            if conteudo_hash:
+                self._hashes[caminho] = conteudo_hash
     
-    # Percorre todos os diretórios e arquivos
-    for raiz, _, arquivos in os.walk(BIBLIOTECA_PATH):
-        for arquivo in arquivos:
-            if arquivo.lower().endswith('.m4a'):
-                caminho_completo = os.path.join(raiz, arquivo)
-                diretorio_relativo = os.path.relpath(raiz, BIBLIOTECA_PATH)
-                
-                # Obter metadados
-                metadados = obter_metadados(caminho_completo)
-                
-                # Adicionar à lista de dados com coluna para novo nome
-                dados.append({
-                    "Diretório": diretorio_relativo,
-                    "Nome_arquivo": arquivo,
-                    "Novo_Nome": "",  # Coluna vazia para possível renomeação
-                    "meta_artista": metadados["meta_artista"],
-                    "URL": metadados["URL"],
-                    "Tags": ""  # Campo vazio para tags que podem ser adicionadas manualmente
-                })
-                
-                progresso.update(1)
+    def obter(self, caminho, info):
+        """Retorna os metadados em cache se o arquivo não mudou desde a última leitura."""
+        entrada = self._entradas.get(caminho)
+        if entrada is None:
+            return None
+        inode, tamanho, mtime_ns, versao, metadados = entrada
+        if (inode, tamanho, mtime_ns, versao) != (info.st_ino, info.st_size, info.st_mtime_ns, self.VERSAO_METADADOS):
+            return None
+        return json.loads(metadados)
     
-    progresso.close()
-    print(f"Processamento concluído. Total de arquivos catalogados: {len(dados)}")
-    return dados
+    def atualizar(self, caminho, info, metadados, conteudo_hash=None):
+        """Guarda os metadados recém-lidos de um arquivo (e, se calculado, o hash do conteúdo)."""
+        with self._lock:
+            if conteudo_hash is None:
+                # Relido só por mudança de VERSAO_METADADOS: o hash do conteúdo continua valendo
+                entrada = self._entradas.get(caminho)
+                if entrada is not None and entrada[:3] == (info.st_ino, info.st_size, info.st_mtime_ns):
+                    conteudo_hash = self._hashes.get(caminho)
+            linha = (caminho, info.st_ino, info.st_size, info.st_mtime_ns, self.VERSAO_METADADOS,
+                     json.dumps(metadados), conteudo_hash)
+            self._entradas[caminho] = linha[1:6]
+            if conteudo_hash:
+                self._hashes[caminho] = conteudo_hash
+            else:
+                self._hashes.pop(caminho, None)
+            self._pendentes.append(linha)
+    
+    def obter_hash(self, caminho, info):
+        """Retorna o hash do conteúdo em cache se o arquivo não mudou desde o cálculo."""
+        entrada = self._entradas.get(caminho)
+        if entrada is None or entrada[:3] != (info.st_ino, info.st_size, info.st_mtime_ns):
+            return None
+        return self._hashes.get(caminho)
+    
+    def remover(self, caminhos):
+        """Remove do cache os arquivos que não existem mais. Retorna quantos foram removidos."""
+        caminhos = [c for c in caminhos if c in self._entradas]
+        with self._lock:
+            self._gravar_pendentes()
+            for caminho in caminhos:
+                del self._entradas[caminho]
+                self._hashes.pop(caminho, None)
+            with self.conexao:
+                self.conexao.executemany("DELETE FROM cache_scan WHERE caminho = ?", [(c,) for c in caminhos])
+        return len(caminhos)
+    
+    def renomear(self, antigo, novo, pasta=False):
+        """Move para o novo caminho a entrada de um arquivo ou, com `pasta`, as de tudo dentro dela.
+        
+        Renomear não altera inode, tamanho nem mtime, então as tags em cache continuam válidas.
+        """
+        with self._lock:
+            self._gravar_pendentes()
+            movidos = {antigo: novo} if antigo in self._entradas else {}
+            if pasta:
+                prefixo = antigo + os.sep
+                movidos.update({c: novo + c[len(antigo):] for c in self._entradas if c.startswith(prefixo)})
+            for caminho, novo_caminho in movidos.items():
+                self._entradas[novo_caminho] = self._entradas.pop(caminho)
+                if caminho in self._hashes:
+                    self._hashes[novo_caminho] = self._hashes.pop(caminho)
+            with self.conexao:
+                self.conexao.executemany("UPDATE OR REPLACE cache_scan SET caminho = ? WHERE caminho = ?",
+                                         [(n, c) for c, n in movidos.items()])
+    
+    def caminhos(self):
+        return set(self._entradas)
+    
+    def _gravar_pendentes(self):
+        if not self._pendentes:
+            return
+        with self.conexao:
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO cache_scan (caminho, inode, tamanho, mtime_ns, versao, metadados, conteudo_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._pendentes)
+        self._pendentes = []
+    
+    def salvar(self):
+        """Grava em uma única transação as entradas pendentes."""
+        with self._lock:
+            self._gravar_pendentes()
 
-def criar_markdown(dados):
-    """Cria ou atualiza o arquivo markdown com os dados."""
-    # Verifica se o diretório existe
-    os.makedirs(os.path.dirname(MARKDOWN_FILE), exist_ok=True)
+_cache_scan = None
+_cache_scan_lock = threading.Lock()
+
+def obter_cache_scan():
+    """Retorna o cache de escaneamento, abrindo-o uma única vez por execução."""
+    global _cache_scan
+    with _cache_scan_lock:
+        if _cache_scan is None:
+            _cache_scan = CacheEscaneamento()
+            atexit.register(_cache_scan.salvar)
+        return _cache_scan
+
+def _linha_catalogo(caminho_relativo, metadados, info=None, video_id=None):
+    """Monta a linha do catálogo de um arquivo da biblioteca.
     
-    # Criar conteúdo do markdown
-    conteudo = "# Biblioteca de Músicas\n\n"
-    conteudo += "| Diretório | Nome_arquivo | Novo_Nome | meta_artista | URL | Tags |\n"
-    conteudo += "| --------- | ------------ | --------- | ------------ | --- | ---- |\n"
+    Além das colunas do Markdown/Excel, a linha leva os campos do catálogo colunar
+    (duração, bitrate, tamanho, mtime, ID do vídeo e hash da capa), ignorados pelos demais.
+    """
+    diretorio, nome_arquivo = os.path.split(caminho_relativo)
+    return {
+        "Diretório": diretorio or ".",
+        "Nome_arquivo": nome_arquivo,
+        "Novo_Nome": "",  # Coluna vazia para possível renomeação
+        "meta_artista": metadados["meta_artista"],
+        "URL": metadados["URL"],
+        "Tags": "",  # Campo vazio para tags que podem ser adicionadas manualmente
+        "video_id": extrair_video_id(metadados["URL"]) or video_id,
+        "duracao": metadados.get("duracao"),
+        "bitrate": metadados.get("bitrate"),
+        "tamanho": info.st_size if info is not None else None,
+        "mtime": datetime.fromtimestamp(info.st_mtime, timezone.utc) if info is not None else None,
+        "capa_hash": metadados.get("capa_hash"),
+    }
+
+def iterar_biblioteca(workers=SCAN_WORKERS, estatisticas=None):
+    """Escaneia a biblioteca gerando as linhas do catálogo à medida que ficam prontas.
     
-    for item in dados:
-        novo_nome = item.get('Novo_Nome', '')
-        conteudo += f"| {item['Diretório']} | {item['Nome_arquivo']} | {novo_nome} | {item['meta_artista']} | {item['URL']} | {item.get('Tags', '')} |\n"
+    A listagem e a leitura das tags acontecem ao mesmo tempo: cada arquivo novo ou
+    alterado vai para um pool de threads, os demais vêm do cache de escaneamento, e as
+    linhas saem na ordem da listagem, com um número limitado de leituras em andamento.
+    Ao fim da listagem, os arquivos removidos da biblioteca saem do cache.
+    """
+    cache = obter_cache_scan()
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.update(lidos=0, em_cache=0, removidos=0)
+    vistos = set()
+    video_ids = obter_registro().video_ids_por_caminho()
+    
+    def concluir(item):
+        futuro, caminho_relativo, info, lido = item
+        metadados = futuro.result()
+        if lido:
+            cache.atualizar(caminho_relativo, info, metadados)
+        return _linha_catalogo(caminho_relativo, metadados, info, video_ids.get(caminho_relativo))
+    
+    limite = workers * 4
+    em_andamento = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for entrada in listar_arquivos_audio(extensoes=('.m4a', '.mp3')):
+            caminho_relativo = os.path.relpath(entrada.path, BIBLIOTECA_PATH)
+            vistos.add(caminho_relativo)
+            info = entrada.stat()
+            metadados = cache.obter(caminho_relativo, info)
+            if metadados is not None:
+                estatisticas['em_cache'] += 1
+                futuro = Future()
+                futuro.set_result(metadados)
+                em_andamento.append((futuro, caminho_relativo, info, False))
+            else:
+                estatisticas['lidos'] += 1
+                em_andamento.append((executor.submit(obter_metadados, entrada.path), caminho_relativo, info, True))
+            
+            while len(em_andamento) >= limite or (em_andamento and em_andamento[0][0].done()):
+                yield concluir(em_andamento.popleft())
+        while em_andamento:
+            yield concluir(em_andamento.popleft())
+    
+    # A listagem terminou: o que não foi visto foi apagado da biblioteca
+    estatisticas['removidos'] = cache.remover(cache.caminhos() - vistos)
+    cache.salvar()
+
+def escanear_biblioteca():
+    """Escaneia a biblioteca de músicas, gerando as linhas do catálogo à medida que ficam prontas."""
+    print(f"Escaneando diretório: {BIBLIOTECA_PATH}")
+    
+    # O total não é conhecido antes do fim da listagem, então a barra apenas conta os arquivos
+    estatisticas = {}
+    total = 0
+    for linha in tqdm(iterar_biblioteca(estatisticas=estatisticas), desc="Processando arquivos", unit="arquivo"):
+        total += 1
+        yield linha
+    
+    print(f"Processamento concluído. Total de arquivos catalogados: {total}")
+    print(f"Lidos: {estatisticas['lidos']}, do cache: {estatisticas['em_cache']}, removidos do cache: {estatisticas['removidos']}")
+
+def coletar_para_excel(linhas, destino):
+    """Repassa as linhas do catálogo guardando em `destino` só as colunas que o Excel compara.
+    
+    Assim o markdown é escrito durante o escaneamento e a planilha é sincronizada no fim
+    sem que as linhas completas fiquem em memória.
+    """
+    for linha in linhas:
+        destino.append({coluna: linha.get(coluna) for coluna in COLUNAS_ESCANEAMENTO})
+        yield linha
+
+@contextmanager
+def substituicao_atomica(caminho):
+    """Fornece um caminho temporário na mesma pasta e o move sobre `caminho` só se a escrita terminar.
+    
+    Quem lê o arquivo (por exemplo, na pasta compartilhada do SecondBrain) vê sempre a
+    versão anterior completa ou a nova completa, nunca um arquivo pela metade.
+    """
+    pasta = os.path.dirname(caminho) or '.'
+    os.makedirs(pasta, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix=f".{os.path.basename(caminho)}.", suffix='.tmp')
+    os.close(descritor)
+    try:
+        yield temporario
+        # O mkstemp cria o arquivo com permissão 0600; mantém a permissão do arquivo original
+        modo = os.stat(caminho).st_mode & 0o777 if os.path.exists(caminho) else 0o644
+        os.chmod(temporario, modo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        try:
+            os.remove(temporario)
+        except OSError:
+            pass
+        raise
+
+def _celula_markdown(valor):
+    """Escapa um valor para uma célula de tabela markdown."""
+    if valor is None or (isinstance(valor, float) and valor != valor):  # None ou NaN vindo do Excel
+        return ''
+    texto = str(valor).replace('\\', '\\\\').replace('|', '\\|')
+    return ' '.join(texto.split())
+
+def criar_markdown(dados):
+    """Cria ou atualiza o arquivo markdown com os dados.
     
-    # Escrever no arquivo
-    with open(MARKDOWN_FILE, 'w', encoding='utf-8') as f:
-        f.write(conteudo)
+    `dados` pode ser qualquer iterável de linhas (por exemplo, o gerador do escaneamento):
+    as linhas são gravadas à medida que chegam em um arquivo temporário, que substitui o
+    markdown atual apenas no final.
+    """
+    total = 0
+    with substituicao_atomica(MARKDOWN_FILE) as temporario:
+        with open(temporario, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+            f.write("# Biblioteca de Músicas\n\n")
+            f.write("| Diretório | Nome_arquivo | Novo_Nome | meta_artista | URL | Tags |\n")
+            f.write("| --------- | ------------ | --------- | ------------ | --- | ---- |\n")
+            
+            for item in dados:
+                celulas = (item['Diretório'], item['Nome_arquivo'], item.get('Novo_Nome', ''),
+                           item['meta_artista'], item['URL'], item.get('Tags', ''))
+                f.write("| " + " | ".join(_celula_markdown(c) for c in celulas) + " |\n")
+                total += 1
     
-    print(f"Arquivo markdown criado/atualizado: {MARKDOWN_FILE}")
+    print(f"Arquivo markdown criado/atualizado: {MARKDOWN_FILE} ({total} linhas)")
+
+def _valor_celula(valor):
+    """Normaliza o valor de uma célula: vazio vira None e o resto é comparado como texto."""
+    if valor is None or valor == '':
+        return None
+    return valor
+
+def _chave_catalogo(linha):
+    """Identifica uma linha do catálogo pelo diretório e nome do arquivo."""
+    return (str(linha.get('Diretório') or ''), str(linha.get('Nome_arquivo') or ''))
+
+def _ler_planilha(caminho):
+    """Lê a planilha em modo somente leitura (streaming), retornando (cabeçalho, linhas)."""
+    workbook = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = workbook.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if not cabecalho:
+            return [], []
+        cabecalho = [str(c).strip() if c is not None else '' for c in cabecalho]
+        # Linhas com células finais vazias chegam mais curtas que o cabeçalho
+        registros = [dict(zip_longest(cabecalho, valores[:len(cabecalho)])) for valores in linhas
+                     if any(v is not None for v in valores)]
+        return cabecalho, registros
+    finally:
+        workbook.close()
+
+def _gravar_planilha(cabecalho, linhas):
+    """Grava a planilha em modo write_only (streaming), substituindo o arquivo de uma vez."""
+    with substituicao_atomica(EXCEL_FILE) as temporario:
+        workbook = Workbook(write_only=True)
+        planilha = workbook.create_sheet(title='Sheet1')
+        planilha.append(cabecalho)
+        for linha in linhas:
+            planilha.append([_valor_celula(linha.get(coluna)) for coluna in cabecalho])
+        workbook.save(temporario)
 
 def criar_excel(dados):
-    """Cria ou atualiza o arquivo Excel com os dados."""
-    # Verifica se o diretório existe
-    os.makedirs(os.path.dirname(EXCEL_FILE), exist_ok=True)
+    """Sincroniza o arquivo Excel com os dados do escaneamento.
     
-    # Criar DataFrame e salvar como Excel
-    df = pd.DataFrame(dados)
-    df.to_excel(EXCEL_FILE, index=False)
+    Compara o escaneamento com a planilha existente: linhas novas são acrescentadas,
+    linhas de arquivos removidos saem e apenas as colunas de escaneamento das linhas
+    alteradas são atualizadas. Colunas editadas pelo usuário são preservadas e, se
+    nada mudou, o arquivo não é regravado.
+    """
+    cabecalho = list(COLUNAS_CATALOGO)
+    cabecalho_atual = []
+    existentes = []
+    if os.path.exists(EXCEL_FILE):
+        try:
+            cabecalho_atual, existentes = _ler_planilha(EXCEL_FILE)
+            if cabecalho_atual:
+                cabecalho = cabecalho_atual + [c for c in COLUNAS_CATALOGO if c not in cabecalho_atual]
+        except Exception as e:
+            print(f"AVISO: não foi possível ler {EXCEL_FILE} ({e}). O arquivo será recriado.")
+            existentes = []
     
-    print(f"Arquivo Excel criado/atualizado: {EXCEL_FILE}")
+    # Mantém a ordem do escaneamento para as linhas novas
+    escaneados = {}
+    for item in dados:
+        escaneados[_chave_catalogo(item)] = item
+    
+    resultado = []
+    atualizadas = 0
+    removidas = 0
+    for linha in existentes:
+        item = escaneados.pop(_chave_catalogo(linha), None)
+        if item is None:
+            removidas += 1
+            continue
+        alterada = False
+        for coluna in COLUNAS_ESCANEAMENTO:
+            valor = _valor_celula(item.get(coluna))
+            if str(_valor_celula(linha.get(coluna))) != str(valor):
+                linha[coluna] = valor
+                alterada = True
+        atualizadas += alterada
+        resultado.append(linha)
+    
+    novas = len(escaneados)
+    resultado.extend({coluna: _valor_celula(item.get(coluna)) for coluna in cabecalho} for item in escaneados.values())
+    
+    if existentes and not (novas or atualizadas or removidas) and cabecalho == cabecalho_atual:
+        print(f"Arquivo Excel sem alterações: {EXCEL_FILE}")
+        return
+    
+    _gravar_planilha(cabecalho, resultado)
+    print(f"Arquivo Excel criado/atualizado: {EXCEL_FILE} "
+          f"({novas} novas, {atualizadas} atualizadas, {removidas} removidas)")
 
 def ler_excel():
     """Lê o arquivo Excel e retorna os dados."""
@@ -135,25 +944,102 @@ def ler_excel():
         print(f"Lendo arquivo Excel: {EXCEL_FILE}")
         
         # Exibir cabeçalhos do arquivo para diagnóstico
-        df = pd.read_excel(EXCEL_FILE)
-        print(f"Colunas encontradas no Excel: {list(df.columns)}")
-        
-        # Normalizar nomes das colunas para evitar problemas de case sensitivity
-        df.columns = [col.strip() for col in df.columns]
+        colunas, registros = _ler_planilha(EXCEL_FILE)
+        print(f"Colunas encontradas no Excel: {colunas}")
         
         # Verificar se as colunas necessárias existem
         colunas_requeridas = ['Diretório', 'Nome_arquivo']
         for col in colunas_requeridas:
-            if col not in df.columns and col.lower() not in [c.lower() for c in df.columns]:
+            if col not in colunas and col.lower() not in [c.lower() for c in colunas]:
                 print(f"AVISO: Coluna '{col}' não encontrada no arquivo Excel")
         
-        return df.to_dict('records')
+        # Pastas ou arquivos com nomes numéricos chegam como números
+        for registro in registros:
+            for col in colunas_requeridas:
+                if registro.get(col) is not None:
+                    registro[col] = str(registro[col])
+        
+        return registros
     except Exception as e:
         print(f"Erro ao ler o arquivo Excel: {e}")
         return []
 
-def atualizar_metadados(dados_atualizados):
-    """Atualiza os metadados dos arquivos baseado nos dados do Excel."""
+def _esquema_colunar():
+    """Esquema do catálogo colunar: as colunas do catálogo mais os dados técnicos de cada arquivo."""
+    return pa.schema([
+        ("Diretório", pa.string()),
+        ("Nome_arquivo", pa.string()),
+        ("meta_artista", pa.string()),
+        ("URL", pa.string()),
+        ("video_id", pa.string()),
+        ("duracao", pa.float64()),
+        ("bitrate", pa.int32()),
+        ("tamanho", pa.int64()),
+        ("mtime", pa.timestamp('us', tz='UTC')),
+        ("capa_hash", pa.string()),
+    ])
+
+def _arquivo_colunar(formato):
+    return PARQUET_FILE if formato == 'parquet' else ARROW_FILE
+
+def exportar_catalogo_colunar(dados, formato='parquet', tamanho_lote=10000):
+    """Exporta o catálogo em formato colunar (Parquet ou Arrow IPC) para consultas analíticas."""
+    if pa is None:
+        print("❌ pyarrow não encontrado. Instale com: pip install pyarrow")
+        return False
+    for _ in catalogo_colunar_em_fluxo(dados, formato, tamanho_lote):
+        pass
+    return True
+
+def catalogo_colunar_em_fluxo(dados, formato='parquet', tamanho_lote=10000):
+    """Repassa as linhas do catálogo gravando-as, ao mesmo tempo, no catálogo colunar.
+    
+    As linhas são convertidas em lotes (record batches) à medida que chegam, então um
+    gerador como iterar_biblioteca() não precisa ser materializado e o mesmo escaneamento
+    pode alimentar o markdown. O arquivo é escrito em um temporário e só substitui o
+    atual quando todas as linhas tiverem passado.
+    """
+    esquema = _esquema_colunar()
+    caminho = _arquivo_colunar(formato)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    total = 0
+    with substituicao_atomica(caminho) as temporario:
+        if formato == 'parquet':
+            escritor = pq.ParquetWriter(temporario, esquema, compression='zstd')
+        else:
+            escritor = pa.ipc.new_file(temporario, esquema)
+        try:
+            linhas = []
+            for linha in dados:
+                yield linha
+                linhas.append(linha)
+                if len(linhas) >= tamanho_lote:
+                    escritor.write_batch(pa.RecordBatch.from_pylist(linhas, schema=esquema))
+                    total += len(linhas)
+                    linhas = []
+            if linhas:
+                escritor.write_batch(pa.RecordBatch.from_pylist(linhas, schema=esquema))
+                total += len(linhas)
+        finally:
+            escritor.close()
+    
+    print(f"Catálogo colunar criado/atualizado: {caminho} ({total} arquivos)")
+
+def _texto_celula(valor):
+    """Converte o valor de uma célula em texto sem espaços nas pontas (vazio para None)."""
+    return '' if valor is None else str(valor).strip()
+
+def atualizar_metadados(dados_atualizados, forcar=False):
+    """Atualiza os metadados dos arquivos baseado nos dados do Excel, gravando só o que mudou.
+    
+    O artista de cada linha é comparado com as tags atuais do arquivo, vindas do cache de
+    escaneamento (ou relidas, se o arquivo mudou desde o último escaneamento): apenas
+    arquivos com artista diferente são regravados, a menos que `forcar` seja verdadeiro.
+    O cache é atualizado na hora. Retorna as alterações aplicadas, indexadas pela chave da
+    linha no catálogo: {(diretório, nome): {"caminho": novo caminho relativo, "meta_artista": ...}}.
+    """
+    cache = obter_cache_scan()
+    alteracoes = {}
     atualizados = 0
     renomeados = 0
     
@@ -162,55 +1048,73 @@ def atualizar_metadados(dados_atualizados):
     
     for item in dados_atualizados:
         # Verificar as chaves disponíveis
-        diretorio = item.get('Diretório', '')
-        nome_arquivo = item.get('Nome_arquivo', '')
-        novo_nome = item.get('Novo_Nome', '')
+        diretorio = _texto_celula(item.get('Diretório'))
+        nome_arquivo = _texto_celula(item.get('Nome_arquivo'))
+        novo_nome = _texto_celula(item.get('Novo_Nome'))
         
         # Tentar diferentes possíveis nomes para a chave de artista
-        meta_artista = None
+        meta_artista = ''
         for possivel_chave in ['meta_artista', 'Meta_artista', 'meta artista', 'Meta artista']:
             if possivel_chave in item:
-                meta_artista = item[possivel_chave]
+                meta_artista = _texto_celula(item[possivel_chave])
                 break
         
         if not diretorio or not nome_arquivo:
             barra.update(1)
             continue
-            
+        
         # Caminho completo para o arquivo
-        caminho_arquivo = os.path.join(BIBLIOTECA_PATH, diretorio, nome_arquivo)
+        caminho_relativo = os.path.normpath(os.path.join(diretorio, nome_arquivo))
+        caminho_arquivo = os.path.join(BIBLIOTECA_PATH, caminho_relativo)
         
-        # Verificar se o arquivo existe
-        if not os.path.exists(caminho_arquivo):
+        try:
+            info = os.stat(caminho_arquivo)
+        except OSError:
+            # Arquivo não existe mais: a linha será removida no próximo escaneamento
             barra.update(1)
             continue
         
         try:
-            # Atualizar metadados apenas se o arquivo existe
+            metadados = cache.obter(caminho_relativo, info) or obter_metadados(caminho_arquivo)
             alterado = False
             
-            if meta_artista:
-                audio = MP4(caminho_arquivo)
-                audio['©ART'] = [meta_artista]
+            extensao = os.path.splitext(nome_arquivo)[1].lower()
+            
+            if meta_artista and (forcar or meta_artista != metadados["meta_artista"]):
+                if extensao == '.mp3':
+                    audio = EasyID3(caminho_arquivo)
+                    audio['artist'] = meta_artista
+                else:
+                    audio = MP4(caminho_arquivo)
+                    audio['©ART'] = [meta_artista]
                 audio.save()
+                metadados = dict(metadados, meta_artista=meta_artista)
                 alterado = True
                 atualizados += 1
             
             # Processar renomeação se o novo nome foi fornecido
-            if novo_nome and novo_nome != nome_arquivo and novo_nome.strip():
+            if novo_nome and novo_nome != nome_arquivo:
                 novo_caminho = os.path.join(BIBLIOTECA_PATH, diretorio, novo_nome)
                 
                 # Verificar se o novo nome já tem a extensão correta
-                if not novo_nome.lower().endswith('.m4a'):
-                    novo_caminho += '.m4a'
+                if not novo_nome.lower().endswith(extensao):
+                    novo_caminho += extensao
                 
                 # Verificar se o destino não existe para evitar sobrescrever
                 if not os.path.exists(novo_caminho):
                     shutil.move(caminho_arquivo, novo_caminho)
+                    cache.remover([caminho_relativo])
+                    # O registro de downloads passa a apontar para o novo nome
+                    obter_registro().mover_caminho(caminho_arquivo, novo_caminho)
+                    caminho_arquivo = novo_caminho
+                    caminho_relativo = os.path.relpath(novo_caminho, BIBLIOTECA_PATH)
                     renomeados += 1
                     alterado = True
             
             if alterado:
+                cache.atualizar(caminho_relativo, os.stat(caminho_arquivo), metadados)
+                alteracoes[_chave_catalogo(item)] = {"caminho": caminho_relativo,
+                                                     "meta_artista": metadados["meta_artista"]}
                 barra.set_description(f"Atualizados: {atualizados}, Renomeados: {renomeados}")
         
         except Exception as e:
@@ -221,9 +1125,39 @@ def atualizar_metadados(dados_atualizados):
     
     # Fechar a barra de progresso
     barra.close()
+    cache.salvar()
     print(f"\nProcessamento concluído!")
     print(f"Total de arquivos com metadados atualizados: {atualizados}")
     print(f"Total de arquivos renomeados: {renomeados}")
+    print(f"Linhas sem alterações: {len(dados_atualizados) - len(alteracoes)}")
+    return alteracoes
+
+def atualizar_catalogos(alteracoes, linhas):
+    """Aplica aos catálogos apenas as linhas alteradas pelo -A, sem reescanear a biblioteca.
+    
+    `linhas` são as linhas da planilha já lidas por ler_excel(). As alteradas recebem o
+    novo nome e o novo artista e têm o Novo_Nome limpo; as demais linhas e as colunas do
+    usuário ficam como estão. O Markdown é regenerado a partir da planilha corrigida.
+    """
+    if not alteracoes:
+        print("Nenhum arquivo alterado: catálogos mantidos.")
+        return
+    
+    # Todas as linhas lidas têm as colunas do cabeçalho, na ordem da planilha
+    cabecalho = list(linhas[0]) if linhas else list(COLUNAS_CATALOGO)
+    for linha in linhas:
+        alteracao = alteracoes.get(_chave_catalogo(linha))
+        if alteracao is None:
+            continue
+        diretorio, nome_arquivo = os.path.split(alteracao["caminho"])
+        linha["Diretório"] = diretorio or "."
+        linha["Nome_arquivo"] = nome_arquivo
+        linha["meta_artista"] = alteracao["meta_artista"]
+        linha["Novo_Nome"] = None  # A renomeação já foi aplicada
+    
+    _gravar_planilha(cabecalho, linhas)
+    print(f"Arquivo Excel atualizado: {EXCEL_FILE} ({len(alteracoes)} linhas alteradas)")
+    criar_markdown(linhas)
 
 
 def verificar_ffmpeg():
@@ -242,218 +1176,1204 @@ def verificar_ytdlp():
     except FileNotFoundError:
         return False
 
-def verifica_biblioteca(video_url):
-    """Verifica se a música já foi baixada anteriormente."""
-    if not os.path.exists(BIBLIOTECA_CSV):
-        # Se o arquivo não existir, cria-o com o cabeçalho
-        with open(BIBLIOTECA_CSV, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Video URL', 'Canal'])
-        return False
+# IDs de vídeo do YouTube têm 11 caracteres do alfabeto base64 de URL
+_RE_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_HOSTS_YOUTUBE = ('youtube.com', 'youtube-nocookie.com')
+_PREFIXOS_CAMINHO_ID = ('shorts', 'embed', 'live', 'v', 'e')
+
+def extrair_video_id(url):
+    """Extrai o ID canônico de um vídeo a partir das várias formas de URL do YouTube."""
+    if not url:
+        return None
+    url = url.strip()
+    if _RE_VIDEO_ID.match(url):
+        return url
     
-    # Verifica se o URL já está no arquivo
-    with open(BIBLIOTECA_CSV, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Pula o cabeçalho
-        for row in reader:
-            if row and row[0] == video_url:
-                return True
+    if '://' not in url:
+        url = 'https://' + url
+    partes = urlparse(url)
+    host = (partes.hostname or '').lower()
+    segmentos = [p for p in partes.path.split('/') if p]
     
-    return False
+    candidato = None
+    if host == 'youtu.be':
+        candidato = segmentos[0] if segmentos else None
+    elif any(host == h or host.endswith('.' + h) for h in _HOSTS_YOUTUBE):
+        if partes.path.rstrip('/') == '/watch':
+            candidato = parse_qs(partes.query).get('v', [None])[0]
+        elif len(segmentos) >= 2 and segmentos[0] in _PREFIXOS_CAMINHO_ID:
+            candidato = segmentos[1]
+    
+    if candidato and _RE_VIDEO_ID.match(candidato):
+        return candidato
+    return None
+
+def url_canonica(video_id):
+    """Monta a URL padrão de um vídeo a partir do seu ID."""
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def chave_registro(video_url):
+    """Chave usada no registro: o ID do vídeo ou, para URLs fora do YouTube, a própria URL."""
+    return extrair_video_id(video_url) or video_url.strip()
+
+class RegistroBiblioteca:
+    """Registro indexado dos downloads, persistido em SQLite ao lado do CSV."""
+    
+    # Versões do esquema (PRAGMA user_version)
+    VERSAO_CSV_IMPORTADO = 1
+    VERSAO_CHAVES_CANONICAS = 2
+    
+    def __init__(self, caminho=BIBLIOTECA_DB, tamanho_lote=20):
+        self.tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._pendentes = []
+        
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    chave TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    canal TEXT,
+                    caminho TEXT,
+                    registrado_em REAL
+                )""")
+            self.conexao.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_downloads_chave ON downloads(chave)")
+        
+        self._migrar()
+        
+        # Carrega as chaves uma única vez para consultas O(1) durante a execução
+        self._chaves = {chave for (chave,) in self.conexao.execute("SELECT chave FROM downloads")}
+    
+    def _versao(self):
+        return self.conexao.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _migrar(self):
+        """Aplica as migrações pendentes do registro."""
+        if self._versao() < self.VERSAO_CSV_IMPORTADO:
+            self._importar_csv()
+            self.conexao.execute(f"PRAGMA user_version = {self.VERSAO_CSV_IMPORTADO}")
+        if self._versao() < self.VERSAO_CHAVES_CANONICAS:
+            self._migrar_chaves_canonicas()
+            self.conexao.execute(f"PRAGMA user_version = {self.VERSAO_CHAVES_CANONICAS}")
+    
+    def _importar_csv(self):
+        """Importa o biblioteca.csv legado no primeiro uso do registro."""
+        if not os.path.exists(BIBLIOTECA_CSV):
+            return
+        
+        with open(BIBLIOTECA_CSV, 'r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Pula o cabeçalho
+            linhas = [(row[0], row[0], row[1] if len(row) > 1 else '', None, None) for row in reader if row]
+        # As chaves entram como URLs e são convertidas para IDs na migração seguinte
+        
+        with self.conexao:
+            self.conexao.executemany(
+                "INSERT OR IGNORE INTO downloads (chave, url, canal, caminho, registrado_em) VALUES (?, ?, ?, ?, ?)",
+                linhas)
+        print(f"📥 {len(linhas)} registros importados de {BIBLIOTECA_CSV}")
+    
+    def _migrar_chaves_canonicas(self):
+        """Reescreve as chaves antigas (URLs) para IDs de vídeo, descartando duplicatas."""
+        linhas = self.conexao.execute("SELECT rowid, chave, url FROM downloads ORDER BY rowid").fetchall()
+        vistos = set()
+        remover = []
+        atualizar = []
+        for rowid, chave, url in linhas:
+            nova_chave = chave_registro(url)
+            if nova_chave in vistos:
+                remover.append((rowid,))
+                continue
+            vistos.add(nova_chave)
+            if nova_chave != chave:
+                atualizar.append((nova_chave, rowid))
+        
+        with self.conexao:
+            # As duplicatas saem primeiro para não violar o índice único nas atualizações
+            self.conexao.executemany("DELETE FROM downloads WHERE rowid = ?", remover)
+            self.conexao.executemany("UPDATE downloads SET chave = ? WHERE rowid = ?", atualizar)
+        if atualizar or remover:
+            print(f"🔁 Registro migrado para IDs de vídeo: {len(atualizar)} chaves reescritas, {len(remover)} duplicatas removidas.")
+    
+    def contem(self, video_url):
+        """Indica se o vídeo já está registrado, qualquer que seja a forma da URL."""
+        return chave_registro(video_url) in self._chaves
+    
+    def caminho(self, video_url):
+        """Retorna o caminho do arquivo registrado para o vídeo, ou None."""
+        self.salvar()
+        linha = self.conexao.execute("SELECT caminho FROM downloads WHERE chave = ?", (chave_registro(video_url),)).fetchone()
+        return linha[0] if linha else None
+    
+    def remover(self, video_url):
+        """Remove o vídeo do registro."""
+        self.salvar()
+        chave = chave_registro(video_url)
+        with self._lock, self.conexao:
+            self._chaves.discard(chave)
+            self.conexao.execute("DELETE FROM downloads WHERE chave = ?", (chave,))
+    
+    def registrar(self, video_url, canal, caminho=None):
+        """Registra um download. As escritas são gravadas em lotes."""
+        chave = chave_registro(video_url)
+        with self._lock:
+            self._chaves.add(chave)
+            self._pendentes.append((chave, video_url, canal, caminho, time.time()))
+            if len(self._pendentes) >= self.tamanho_lote:
+                self._gravar_pendentes()
+    
+    def _gravar_pendentes(self):
+        if not self._pendentes:
+            return
+        with self.conexao:
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO downloads (chave, url, canal, caminho, registrado_em) VALUES (?, ?, ?, ?, ?)",
+                self._pendentes)
+        self._pendentes = []
+    
+    def salvar(self):
+        """Grava em uma única transação os registros ainda pendentes."""
+        with self._lock:
+            self._gravar_pendentes()
+    
+    def mover_caminho(self, antigo, novo):
+        """Atualiza os caminhos registrados após mover um arquivo ou uma pasta (e tudo dentro dela)."""
+        self.salvar()
+        prefixo = os.path.join(antigo, '')
+        with self._lock, self.conexao:
+            self.conexao.execute("UPDATE downloads SET caminho = ? WHERE caminho = ?", (novo, antigo))
+            self.conexao.execute(
+                "UPDATE downloads SET caminho = ? || substr(caminho, ?) WHERE substr(caminho, 1, ?) = ?",
+                (os.path.join(novo, ''), len(prefixo) + 1, len(prefixo), prefixo))
+    
+    def video_ids_por_caminho(self):
+        """Mapeia o caminho (relativo à biblioteca) de cada download registrado ao ID do vídeo."""
+        self.salvar()
+        video_ids = {}
+        for chave, caminho in self.conexao.execute("SELECT chave, caminho FROM downloads WHERE caminho IS NOT NULL"):
+            if caminho and _RE_VIDEO_ID.fullmatch(chave):
+                video_ids[os.path.relpath(caminho, BIBLIOTECA_PATH)] = chave
+        return video_ids
+    
+    def listar(self):
+        """Retorna (url, canal) de todos os downloads na ordem de registro."""
+        self.salvar()
+        return self.conexao.execute("SELECT url, canal FROM downloads ORDER BY rowid").fetchall()
+
+_registro = None
+_registro_lock = threading.Lock()
+
+def obter_registro():
+    """Retorna o registro da biblioteca, abrindo-o uma única vez por execução."""
+    global _registro
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroBiblioteca()
+            atexit.register(_registro.salvar)
+        return _registro
+
+# Estados de um item da fila de downloads de uma playlist
+ESTADOS_FILA = ('pendente', 'obtendo-info', 'baixando', 'marcando', 'concluido', 'falhou')
+ESTADOS_INACABADOS = ('pendente', 'obtendo-info', 'baixando', 'marcando')
+
+class FilaDownloads:
+    """Fila persistente dos downloads de cada playlist, guardada no banco da biblioteca.
+    
+    Cada entrada da playlist tem um estado, gravado no banco a cada mudança: se a
+    execução for interrompida (Ctrl+C, queda de rede, reinício), a próxima continua dos
+    itens inacabados sem listar a playlist de novo. Ao passar para 'marcando' o item
+    guarda o destino e os metadados, para que a marcação possa ser concluída sem
+    baixar o arquivo outra vez.
+    """
+    
+    def __init__(self, caminho=BIBLIOTECA_DB):
+        self._lock = threading.Lock()
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS fila (
+                    playlist TEXT,
+                    video_id TEXT,
+                    posicao INTEGER,
+                    url TEXT,
+                    estado TEXT,
+                    tentativas INTEGER DEFAULT 0,
+                    erro TEXT,
+                    destino TEXT,
+                    metadados TEXT,
+                    atualizado_em REAL,
+                    PRIMARY KEY (playlist, video_id)
+                )""")
+    
+    def enfileirar(self, playlist, entradas, concluidos=(), reiniciar=False):
+        """Acrescenta as entradas (posição, ID, URL) da playlist à fila.
+        
+        Entradas já enfileiradas mantêm o estado (a não ser com `reiniciar`); as novas
+        entram como 'pendente', ou 'concluido' se o ID estiver em `concluidos`.
+        """
+        agora = time.time()
+        linhas = [(playlist, video_id, posicao, url, 'concluido' if video_id in concluidos else 'pendente', agora)
+                  for posicao, video_id, url in entradas]
+        atualizacao = "posicao = excluded.posicao, url = excluded.url"
+        if reiniciar:
+            atualizacao += ", estado = excluded.estado, erro = NULL, destino = NULL, metadados = NULL"
+        with self._lock, self.conexao:
+            self.conexao.executemany(
+                "INSERT INTO fila (playlist, video_id, posicao, url, estado, atualizado_em) VALUES (?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (playlist, video_id) DO UPDATE SET {atualizacao}", linhas)
+    
+    def itens(self, playlist, estados):
+        """Retorna, na ordem da playlist, os itens nos estados pedidos, como dicionários."""
+        marcadores = ', '.join('?' * len(estados))
+        with self._lock:
+            cursor = self.conexao.execute(
+                "SELECT video_id, posicao, url, estado, tentativas, erro, destino, metadados FROM fila "
+                f"WHERE playlist = ? AND estado IN ({marcadores}) ORDER BY posicao", (playlist, *estados))
+            colunas = [c[0] for c in cursor.description]
+            return [dict(zip(colunas, linha)) for linha in cursor]
+    
+    def marcar(self, playlist, video_ids, estado, erro=None, destino=None, metadados=None):
+        """Muda o estado de um ou mais itens, gravando a mudança imediatamente."""
+        if isinstance(video_ids, str):
+            video_ids = [video_ids]
+        campos = "estado = ?, atualizado_em = ?"
+        valores = [estado, time.time()]
+        if estado == 'falhou':
+            campos += ", erro = ?, tentativas = tentativas + 1"
+            valores.append(erro)
+        if destino is not None:
+            campos += ", destino = ?, metadados = ?"
+            valores += [destino, json.dumps(metadados) if metadados is not None else None]
+        with self._lock, self.conexao:
+            self.conexao.executemany(f"UPDATE fila SET {campos} WHERE playlist = ? AND video_id = ?",
+                                     [(*valores, playlist, video_id) for video_id in video_ids])
+    
+    def remover(self, playlist, video_ids):
+        """Tira itens da fila da playlist."""
+        with self._lock, self.conexao:
+            self.conexao.executemany("DELETE FROM fila WHERE playlist = ? AND video_id = ?",
+                                     [(playlist, video_id) for video_id in video_ids])
+    
+    def total(self, playlist):
+        with self._lock:
+            return self.conexao.execute("SELECT COUNT(*) FROM fila WHERE playlist = ?", (playlist,)).fetchone()[0]
+    
+    def resumo(self, playlist):
+        """Conta os itens da playlist em cada estado."""
+        with self._lock:
+            return dict(self.conexao.execute(
+                "SELECT estado, COUNT(*) FROM fila WHERE playlist = ? GROUP BY estado", (playlist,)))
+
+_fila = None
+_fila_lock = threading.Lock()
+
+def obter_fila():
+    """Retorna a fila de downloads, abrindo-a uma única vez por execução."""
+    global _fila
+    with _fila_lock:
+        if _fila is None:
+            _fila = FilaDownloads()
+        return _fila
+
+class SnapshotsPlaylists:
+    """Última listagem conhecida (IDs das entradas) de cada playlist sincronizada com --sync.
+    
+    A sincronização compara a listagem nova com a guardada aqui: só os IDs novos vão
+    para a fila de downloads, e os que sumiram da playlist são relatados.
+    """
+    
+    def __init__(self, caminho=BIBLIOTECA_DB):
+        self._lock = threading.Lock()
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots_playlist (
+                    playlist TEXT PRIMARY KEY,
+                    titulo TEXT,
+                    video_ids TEXT,
+                    sincronizado_em REAL
+                )""")
+    
+    def obter(self, playlist):
+        """Retorna a lista de IDs da última sincronização da playlist, ou None se ela nunca foi sincronizada."""
+        with self._lock:
+            linha = self.conexao.execute("SELECT video_ids FROM snapshots_playlist WHERE playlist = ?", (playlist,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+    
+    def gravar(self, playlist, titulo, video_ids):
+        with self._lock, self.conexao:
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO snapshots_playlist (playlist, titulo, video_ids, sincronizado_em) VALUES (?, ?, ?, ?)",
+                (playlist, titulo, json.dumps(list(video_ids)), time.time()))
+    
+    def ids_em_outras(self, playlist):
+        """Retorna os IDs presentes nas demais playlists sincronizadas."""
+        with self._lock:
+            linhas = self.conexao.execute("SELECT video_ids FROM snapshots_playlist WHERE playlist != ?", (playlist,)).fetchall()
+        return {video_id for (video_ids,) in linhas for video_id in json.loads(video_ids)}
+
+_snapshots = None
+_snapshots_lock = threading.Lock()
+
+def obter_snapshots():
+    """Retorna os snapshots de playlists, abrindo-os uma única vez por execução."""
+    global _snapshots
+    with _snapshots_lock:
+        if _snapshots is None:
+            _snapshots = SnapshotsPlaylists()
+        return _snapshots
+
+def verifica_biblioteca(video_url):
+    """Verifica se a música já foi baixada anteriormente."""
+    return obter_registro().contem(video_url)
 
 def listar_biblioteca():
     """Lista todas as músicas registradas na biblioteca."""
-    if not os.path.exists(BIBLIOTECA_CSV):
+    if not os.path.exists(BIBLIOTECA_DB) and not os.path.exists(BIBLIOTECA_CSV):
         print("❌ Biblioteca ainda não foi criada.")
         return
     
     print("\n📚 Conteúdo da biblioteca:")
     print("-" * 80)
     
-    with open(BIBLIOTECA_CSV, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        next(reader)  # Pula o cabeçalho
-        
-        count = 0
-        for row in reader:
-            if row:
-                count += 1
-                print(f"{count}. URL: {row[0]}")
-                print(f"   Canal: {row[1]}")
-                print("-" * 80)
-        
-        if count == 0:
-            print("Biblioteca vazia. Nenhuma música registrada.")
-        else:
-            print(f"Total de músicas: {count}")
+    count = 0
+    for url, canal in obter_registro().listar():
+        count += 1
+        print(f"{count}. URL: {url}")
+        print(f"   Canal: {canal}")
+        print("-" * 80)
+    
+    if count == 0:
+        print("Biblioteca vazia. Nenhuma música registrada.")
+    else:
+        print(f"Total de músicas: {count}")
             
 
-def normalizar_nome_artista(nome_artista):
-    """Usa o modelo para normalizar o nome do artista."""
-    prompt = f"""
-Sua tarefa é normalizar o nome do artista musical a seguir, corrigindo a formatação e removendo caracteres especiais desnecessários.
-Mantenha apenas letras, números, espaços e hífens. Não use underscores.
-Retorne APENAS o nome normalizado, sem explicações ou texto adicional.
-Nome original: {nome_artista}
-"""
-    resultado = consultar_ollama(prompt)
-    if not resultado:
-        return nome_artista
+def consultar_ollama(prompt, formato=None, tentativas=OLLAMA_TENTATIVAS):
+    """Envia um prompt ao Ollama (/api/generate) e retorna o texto da resposta, ou None em caso de erro.
+    
+    Usa a sessão HTTP compartilhada, então chamadas seguidas reaproveitam a conexão.
+    Com formato='json', o modelo é instruído a responder com JSON válido. Falhas de rede,
+    timeouts e respostas 429/5xx (servidor ocupado) são repetidas com espera exponencial.
+    """
+    corpo = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False}
+    if formato:
+        corpo["format"] = formato
+    for tentativa in range(1, tentativas + 1):
+        try:
+            resposta = obter_sessao_http().post(f"{OLLAMA_HOST.rstrip('/')}/api/generate", json=corpo, timeout=OLLAMA_TIMEOUT)
+            if resposta.status_code != 429 and resposta.status_code < 500:
+                resposta.raise_for_status()
+                return resposta.json().get("response", "").strip()
+            erro = f"HTTP {resposta.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            erro = e
+        except (requests.RequestException, ValueError) as e:
+            # Erros do pedido em si (4xx, resposta inválida) não melhoram com outra tentativa
+            print(f"⚠️ Erro ao consultar o Ollama: {e}")
+            return None
+        if tentativa < tentativas:
+            # Espera exponencial com variação aleatória para as threads não voltarem juntas
+            time.sleep(OLLAMA_ESPERA_BASE * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5))
+    print(f"⚠️ Erro ao consultar o Ollama após {tentativas} tentativas: {erro}")
+    return None
+
+class CacheNormalizacao:
+    """Cache persistente dos nomes já normalizados pelo modelo, guardado no banco da biblioteca.
     
-    # Limpa ainda mais o resultado para garantir que seja um nome de pasta válido
+    A chave é o tipo do nome ('artista' ou 'arquivo') e o nome original: nomes já
+    normalizados em uma execução anterior não voltam ao modelo.
+    """
+    
+    def __init__(self, caminho=BIBLIOTECA_DB):
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS normalizacao (
+                    tipo TEXT,
+                    original TEXT,
+                    normalizado TEXT,
+                    modelo TEXT,
+                    PRIMARY KEY (tipo, original)
+                )""")
+        self._nomes = {
+            (tipo, original): normalizado
+            for tipo, original, normalizado
+            in self.conexao.execute("SELECT tipo, original, normalizado FROM normalizacao")
+        }
+    
+    def obter(self, tipo, original):
+        return self._nomes.get((tipo, original))
+    
+    def atualizar(self, tipo, original, normalizado):
+        with self._lock:
+            self._nomes[(tipo, original)] = normalizado
+            self._pendentes.append((tipo, original, normalizado, OLLAMA_MODEL))
+    
+    def salvar(self):
+        """Grava em uma única transação os nomes pendentes."""
+        with self._lock:
+            if not self._pendentes:
+                return
+            with self.conexao:
+                self.conexao.executemany(
+                    "INSERT OR REPLACE INTO normalizacao (tipo, original, normalizado, modelo) VALUES (?, ?, ?, ?)",
+                    self._pendentes)
+            self._pendentes = []
+
+_cache_normalizacao = None
+_cache_normalizacao_lock = threading.Lock()
+
+def obter_cache_normalizacao():
+    """Retorna o cache de normalização, abrindo-o uma única vez por execução."""
+    global _cache_normalizacao
+    with _cache_normalizacao_lock:
+        if _cache_normalizacao is None:
+            _cache_normalizacao = CacheNormalizacao()
+            atexit.register(_cache_normalizacao.salvar)
+        return _cache_normalizacao
+
+# Instruções do prompt para cada tipo de nome
+_INSTRUCOES_NORMALIZACAO = {
+    "artista": ("nomes de artistas musicais",
+                "Corrija a formatação e remova caracteres especiais desnecessários. "
+                "Mantenha apóstrofos e a pontuação que faz parte do nome (P!nk, Ke$ha, AC/DC). Não use underscores."),
+    "arquivo": ("nomes de arquivos de música (sem a extensão)",
+                "Mantenha informações importantes como título e artista, mas remova caracteres "
+                "especiais desnecessários e melhore a formatação. Mantenha apóstrofos e a pontuação que faz parte dos nomes."),
+}
+
+# Regras mecânicas do normalizador local: (expressão regular, substituição), aplicadas em ordem.
+# Nenhuma regra padrão mexe dentro de uma palavra: "P!nk", "Can't", "Ke$ha" e "Jay-Z" passam intactos.
+REGRAS_NORMALIZACAO = [
+    # Sufixos de vídeo: "(Official Video)", "[Lyric Video]", "(Clipe Oficial)"... "(Remastered 2011)" fica
+    (r'[\(\[][^\)\]]*\b(official|oficial|lyrics?|letra|audio|áudio|video|vídeo|clipe|videoclipe|'
+     r'visualizer|hd|hq|4k)\b[^\)\]]*[\)\]]', ''),
+    (r'\[[A-Za-z0-9_-]{11}\]', ''),  # ID do vídeo acrescentado pelo yt-dlp
+    (r'_+', ' '),
+    (r'[\u2010-\u2015]', '-'),  # Travessões e hífens tipográficos
+    # Pontuação descartável no começo ou no fim de uma palavra (apóstrofos e pontos ficam)
+    (r'(?<![^\W_])[,!?"`´“”#*~:;|]+|[,!?"`´“”#*~:;|]+(?![^\W_])', ''),
+    (r'[\(\[]\s*[\)\]]', ''),  # Parênteses que ficaram vazios
+    (r'\s+-+\s*|\s*-+\s+|-{2,}', ' - '),  # Separadores, sem tocar em hífens dentro de palavras
+    (r'\s+', ' '),
+]
+
+# Pontuação entre duas letras ou dígitos ("P!nk", "AC/DC", "Ke$ha", "Can't")
+_RE_PONTUACAO_INTERNA = re.compile(r'(?<=[^\W_])[^\w\s]+(?=[^\W_])')
+# O mesmo trecho com as letras vizinhas, sobrepondo ocorrências ("a.b.c" -> "a.b", "b.c")
+_RE_TRECHO_INTERNO = re.compile(r'(?=([^\W_][^\w\s]+[^\W_]))')
+# Símbolos soltos que não deixam o nome duvidoso ("Rock & Roll", "Florence + The Machine", "(Remastered 2015)")
+_SIMBOLOS_CONFIAVEIS = " -'’&+.()[]"
+
+_config_normalizacao = None
+
+def carregar_config_normalizacao():
+    """Retorna (regras compiladas, apelidos) do normalizador local, lendo NORMALIZACAO_CONFIG uma vez."""
+    global _config_normalizacao
+    if _config_normalizacao is None:
+        regras = list(REGRAS_NORMALIZACAO)
+        aliases = {}
+        if os.path.exists(NORMALIZACAO_CONFIG):
+            try:
+                with open(NORMALIZACAO_CONFIG, encoding='utf-8') as f:
+                    config = json.load(f)
+                # As regras do usuário vêm antes das padrão
+                regras = [tuple(regra) for regra in config.get("regras", [])] + regras
+                aliases = {_chave_alias(nome): canonico for nome, canonico in config.get("aliases", {}).items()}
+            except (OSError, ValueError, TypeError) as e:
+                print(f"⚠️ Erro ao ler {NORMALIZACAO_CONFIG}: {e}")
+        _config_normalizacao = ([(re.compile(padrao, re.IGNORECASE), substituicao) for padrao, substituicao in regras], aliases)
+    return _config_normalizacao
+
+def _chave_alias(nome):
+    """Chave de comparação de apelidos: sem acentos, caixa, espaços nem pontuação."""
+    decomposto = unicodedata.normalize('NFKD', nome.casefold())
+    return ''.join(c for c in decomposto if c.isalnum())
+
+def _trechos_internos(nome):
+    """Trechos com pontuação dentro de uma palavra, com as letras vizinhas, em minúsculas."""
+    return {trecho.casefold() for trecho in _RE_TRECHO_INTERNO.findall(nome)}
+
+def normalizar_nome_local(nome, tipo):
+    """Normaliza um nome só com regras mecânicas, sem consultar o modelo.
+    
+    Aplica normalização Unicode (NFC), as regras de REGRAS_NORMALIZACAO e, para artistas,
+    a tabela de apelidos. Retorna None quando o resultado não é confiável e o nome deve
+    ir ao modelo: alguma regra removeu ou trocou caracteres dentro de uma palavra, sobram
+    símbolos fora de palavras além de & + . e parênteses, ou o nome está todo em minúsculas (ou em
+    maiúsculas, com mais de uma palavra) e precisaria de uma correção de caixa.
+    """
+    regras, aliases = carregar_config_normalizacao()
+    original = re.sub(r'[\u2010-\u2015]', '-', unicodedata.normalize('NFC', nome))
+    resultado = original
+    for padrao, substituicao in regras:
+        resultado = padrao.sub(substituicao, resultado)
+    resultado = resultado.strip(' -')
+    
+    if tipo == "artista":
+        canonico = aliases.get(_chave_alias(resultado))
+        if canonico:
+            return canonico
+    
+    # Uma regra que apaga pontuação dentro de uma palavra muda o nome ("P!nk" -> "Pnk")
+    if not _trechos_internos(original) <= _trechos_internos(resultado):
+        return None
+    soltos = _RE_PONTUACAO_INTERNA.sub('', resultado)
+    if len(resultado) < 2 or any(not (c.isalnum() or c in _SIMBOLOS_CONFIAVEIS) for c in soltos):
+        return None
+    letras = [c for c in resultado if c.isalpha()]
+    if len(letras) > 3 and (all(c.islower() for c in letras)
+                            or (all(c.isupper() for c in letras) and len(resultado.split()) > 1)):
+        return None
+    return resultado
+
+def _limpar_nome_normalizado(resultado, original):
+    """Garante que a resposta do modelo seja um nome de pasta/arquivo válido; senão mantém o original."""
+    if not isinstance(resultado, str):
+        return original
     resultado = resultado.replace('/', '-').replace('\\', '-').replace(':', '-')
     resultado = resultado.strip()
     
-    # Se o resultado for vazio ou muito diferente, mantenha o original
+    # Se o resultado for vazio ou muito curto, mantenha o original
     if not resultado or len(resultado) < 2:
-        return nome_artista
-        
+        return original
     return resultado
 
-def normalizar_nome_arquivo(nome_arquivo, extensao):
-    """Usa o modelo para normalizar o nome do arquivo."""
-    # Remove a extensão para processamento
-    nome_base = nome_arquivo.replace('.' + extensao, '')
-    
+def _normalizar_lote(nomes, tipo):
+    """Normaliza um lote de nomes em uma única chamada ao modelo. Retorna {original: normalizado}."""
+    descricao, regras = _INSTRUCOES_NORMALIZACAO[tipo]
+    lista = "\n".join(f"{i}. {nome}" for i, nome in enumerate(nomes, 1))
     prompt = f"""
-Sua tarefa é normalizar o nome deste arquivo de música, mantendo informações importantes como título e artista, 
-mas removendo caracteres especiais desnecessários e melhorando a formatação.
-Mantenha apenas letras, números, espaços e hífens.
-Retorne APENAS o nome normalizado, sem explicações ou texto adicional.
-Nome original: {nome_base}
+Sua tarefa é normalizar os {descricao} a seguir.
+{regras}
+Responda APENAS com um objeto JSON que associe o número de cada nome ao nome normalizado,
+por exemplo {{"1": "Nome Normalizado", "2": "Outro Nome"}}, sem explicações ou texto adicional.
+Nomes originais:
+{lista}
 """
-    resultado = consultar_ollama(prompt)
-    if not resultado:
-        return nome_arquivo
+    resposta = consultar_ollama(prompt, formato='json')
+    if not resposta:
+        return {}
+    try:
+        normalizados = json.loads(resposta)
+    except ValueError:
+        print("⚠️ Resposta do Ollama não é um JSON válido; o lote será reenviado na próxima execução.")
+        return {}
+    if not isinstance(normalizados, dict):
+        return {}
+    return {nome: _limpar_nome_normalizado(normalizados[str(i)], nome)
+            for i, nome in enumerate(nomes, 1) if str(i) in normalizados}
+
+def _separar_nomes(pedidos, resultado=None, estatisticas=None):
+    """Resolve pelo cache e pelas regras locais o que for possível; retorna {tipo: [nomes para o modelo]}."""
+    cache = obter_cache_normalizacao()
+    faltantes = {}
+    for tipo, nomes in pedidos.items():
+        faltantes[tipo] = []
+        for nome in dict.fromkeys(nomes):
+            normalizado = cache.obter(tipo, nome)
+            origem = "cache"
+            if normalizado is None:
+                normalizado = normalizar_nome_local(nome, tipo)
+                origem = "locais"
+            if normalizado is None:
+                faltantes[tipo].append(nome)
+                continue
+            if resultado is not None:
+                resultado[tipo][nome] = normalizado
+            if estatisticas is not None:
+                estatisticas[origem] = estatisticas.get(origem, 0) + 1
+    return faltantes
+
+def normalizar_em_lotes(pedidos, tamanho_lote=OLLAMA_LOTE, concorrencia=OLLAMA_CONCORRENCIA, estatisticas=None):
+    """Normaliza nomes de vários tipos ao mesmo tempo, em lotes, usando o cache e as regras locais.
     
-    # Limpa ainda mais o resultado para garantir que seja um nome de arquivo válido
-    resultado = resultado.replace('/', '-').replace('\\', '-').replace(':', '-')
-    resultado = resultado.strip()
+    `pedidos` mapeia o tipo ('artista' ou 'arquivo') para a lista de nomes. Nomes já
+    presentes no cache ou resolvidos por normalizar_nome_local() não são enviados ao
+    modelo; os demais vão em lotes de `tamanho_lote`, com até `concorrencia` requisições
+    em andamento. Nomes que o modelo não devolveu ficam como estão e não entram no cache.
+    Em `estatisticas` ficam as contagens 'cache', 'locais' e 'modelo'.
+    Retorna {tipo: {original: normalizado}}.
+    """
+    cache = obter_cache_normalizacao()
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas.update(cache=0, locais=0, modelo=0)
+    resultado = {tipo: {} for tipo in pedidos}
+    lotes = []
+    for tipo, faltantes in _separar_nomes(pedidos, resultado, estatisticas).items():
+        lotes.extend((tipo, faltantes[i:i + tamanho_lote]) for i in range(0, len(faltantes), tamanho_lote))
     
-    # Se o resultado for vazio ou muito diferente, mantenha o original
-    if not resultado or len(resultado) < 2:
-        return nome_arquivo
-        
-    return f"{resultado}.{extensao}"
+    if not lotes:
+        return resultado
+    
+    # O tamanho do pool limita as requisições simultâneas; as respostas são gravadas no
+    # cache aqui, na thread principal, na ordem em que chegam
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia)) as executor:
+        futuros = {executor.submit(_normalizar_lote, lote, tipo): (tipo, lote) for tipo, lote in lotes}
+        for futuro in tqdm(as_completed(futuros), total=len(futuros), desc="Normalizando nomes",
+                           unit="lote", disable=len(futuros) == 1):
+            tipo, lote = futuros[futuro]
+            normalizados = futuro.result()
+            estatisticas['modelo'] += len(normalizados)
+            for nome in lote:
+                if nome in normalizados:
+                    cache.atualizar(tipo, nome, normalizados[nome])
+                    # O nome já normalizado também não precisa voltar ao modelo na próxima execução
+                    if cache.obter(tipo, normalizados[nome]) is None:
+                        cache.atualizar(tipo, normalizados[nome], normalizados[nome])
+                resultado[tipo][nome] = normalizados.get(nome, nome)
+    cache.salvar()
+    return resultado
 
-def organizar_biblioteca():
-    """Organiza a biblioteca usando IA para melhorar nomes de pastas e arquivos."""
+def ollama_disponivel():
+    """Verifica se o servidor Ollama responde e tem o modelo configurado."""
+    try:
+        resposta = obter_sessao_http().get(f"{OLLAMA_HOST.rstrip('/')}/api/tags", timeout=10)
+        resposta.raise_for_status()
+        modelos = [m.get("name", "") for m in resposta.json().get("models", [])]
+    except (requests.RequestException, ValueError):
+        return False
+    return any(m == OLLAMA_MODEL or m.split(':')[0] == OLLAMA_MODEL for m in modelos)
+
+def organizar_biblioteca(concorrencia=OLLAMA_CONCORRENCIA, simular=False):
+    """Organiza a biblioteca usando IA para melhorar nomes de pastas e arquivos.
+    
+    Todos os nomes são listados antes e normalizados em lotes, com até `concorrencia`
+    requisições simultâneas ao Ollama (os já normalizados em execuções anteriores vêm do
+    cache). Com todas as respostas, é calculado o plano completo de renomeações, em ordem
+    alfabética, para que colisões (sufixo _alt) não dependam da ordem das respostas. O
+    plano é aplicado por um JournalOrganizacao; com `simular`, apenas é exibido.
+    """
     if not os.path.exists(BIBLIOTECA_PATH):
         print("❌ Biblioteca não encontrada.")
         return False
     
-    print("\n🧠 Conectando à API do Ollama...")
-    # Teste de conexão com o Ollama
-    teste = consultar_ollama("Responda apenas com 'OK' se você estiver funcionando corretamente.")
-    if not teste or "OK" not in teste.upper():
-        print("❌ Não foi possível conectar ao servidor Ollama ou modelo não disponível.")
+    journal = JournalOrganizacao.ultimo()
+    if journal is not None and journal.estado == "pendente" and journal.feitos:
+        print(f"⚠️ Há uma organização interrompida ({journal.caminho}).")
+        print("   Use --retomar para continuá-la ou --desfazer para revertê-la antes de organizar de novo.")
         return False
     
-    print("✅ Conexão com Ollama estabelecida.")
-    print("\n🔍 Iniciando organização da biblioteca...")
+    # Lista as pastas de artistas e os arquivos de cada uma
+    pastas = {}
+    for pasta_artista in sorted(os.listdir(BIBLIOTECA_PATH)):
+        caminho_pasta = os.path.join(BIBLIOTECA_PATH, pasta_artista)
+        # Ignora a pasta de downloads, os caches e arquivos (como o CSV)
+        if os.path.isdir(caminho_pasta) and not eh_pasta_interna(pasta_artista):
+            pastas[pasta_artista] = sorted(f for f in os.listdir(caminho_pasta)
+                                           if os.path.isfile(os.path.join(caminho_pasta, f)))
+    nomes_base = [os.path.splitext(arquivo)[0] for arquivos in pastas.values() for arquivo in arquivos]
     
-    # Lista para rastrear mudanças
-    mudancas_artistas = {}
-    mudancas_arquivos = []
-    contagem_total = 0
-    contagem_processados = 0
+    pedidos = {"artista": list(pastas), "arquivo": nomes_base}
+    faltantes = sum(len(nomes) for nomes in _separar_nomes(pedidos).values())
+    if faltantes:
+        print("\n🧠 Conectando à API do Ollama...")
+        if not ollama_disponivel():
+            print(f"❌ Não foi possível conectar ao servidor Ollama ({OLLAMA_HOST}) ou modelo {OLLAMA_MODEL} não disponível.")
+            return False
+        print("✅ Conexão com Ollama estabelecida.")
+        print(f"🧠 Normalizando {faltantes} nomes novos em lotes de até {OLLAMA_LOTE}, "
+              f"com até {concorrencia} requisições simultâneas...")
+    else:
+        print("\n🧠 Todos os nomes foram resolvidos pelo cache ou pelas regras locais; o Ollama não será consultado.")
     
-    # Primeiro, conte o número total de arquivos para a barra de progresso
-    for pasta_artista in os.listdir(BIBLIOTECA_PATH):
-        caminho_pasta = os.path.join(BIBLIOTECA_PATH, pasta_artista)
-        if os.path.isdir(caminho_pasta) and pasta_artista != "downloads_puros":
-            contagem_total += len([f for f in os.listdir(caminho_pasta) if os.path.isfile(os.path.join(caminho_pasta, f))])
+    estatisticas = {}
+    normalizados = normalizar_em_lotes(pedidos, concorrencia=concorrencia, estatisticas=estatisticas)
+    nomes_artistas, nomes_arquivos = normalizados["artista"], normalizados["arquivo"]
+    print(f"📐 Nomes resolvidos: {estatisticas['locais']} pelas regras locais, {estatisticas['cache']} pelo cache, "
+          f"{estatisticas['modelo']} pelo modelo.")
     
-    pbar = tqdm(total=contagem_total, desc="Organizando biblioteca", unit="arquivo")
+    plano = planejar_organizacao(pastas, nomes_artistas, nomes_arquivos)
+    if not plano:
+        print("\n✅ Nada a reorganizar: todos os nomes já estão normalizados.")
+        return True
+    _resumir_plano(plano)
     
-    # Organiza os arquivos por artista
-    for pasta_artista in os.listdir(BIBLIOTECA_PATH):
-        caminho_pasta = os.path.join(BIBLIOTECA_PATH, pasta_artista)
-        
-        # Ignora a pasta de downloads e arquivos (como o CSV)
-        if not os.path.isdir(caminho_pasta) or pasta_artista == "downloads_puros":
-            continue
+    if simular:
+        print("\n🔎 Simulação: nenhuma pasta ou arquivo foi alterado. Plano completo:")
+        for operacao in plano:
+            print(f"  • {_descrever_operacao(operacao)}")
+        return True
+    
+    journal = JournalOrganizacao.criar(plano)
+    print(f"\n🔍 Aplicando o plano (journal: {journal.caminho})...")
+    return journal.aplicar()
+
+def _nome_livre(nome, ocupados):
+    """Acrescenta o sufixo _alt (e depois _alt2, _alt3...) até o nome não colidir com `ocupados`."""
+    if nome not in ocupados:
+        return nome
+    nome_base, ext = os.path.splitext(nome)
+    sufixo, n = "_alt", 1
+    while f"{nome_base}{sufixo}{ext}" in ocupados:
+        n += 1
+        sufixo = f"_alt{n}"
+    return f"{nome_base}{sufixo}{ext}"
+
+def planejar_organizacao(pastas, nomes_artistas, nomes_arquivos):
+    """Calcula todas as renomeações da organização sem tocar no disco.
+    
+    `pastas` mapeia cada pasta de artista aos seus arquivos; os nomes normalizados vêm de
+    `nomes_artistas` e `nomes_arquivos` (nome base, sem extensão). O estado da biblioteca
+    é simulado operação a operação, então unificações de pastas e colisões (sufixo _alt)
+    saem iguais às da execução real. Retorna a lista de operações, em ordem:
+    {"tipo": "renomear_pasta" | "mover" | "remover_pasta", "origem": ..., "destino": ...},
+    com caminhos relativos à biblioteca.
+    """
+    conteudo = {}
+    for nome in os.listdir(BIBLIOTECA_PATH):
+        caminho = os.path.join(BIBLIOTECA_PATH, nome)
+        if os.path.isdir(caminho):
+            conteudo[nome] = set(pastas[nome]) if nome in pastas else set(os.listdir(caminho))
+    
+    plano = []
+    for pasta_artista, arquivos in pastas.items():
+        # Nome atual de cada arquivo e o nome base enviado para normalização
+        itens = [(arquivo, os.path.splitext(arquivo)[0]) for arquivo in arquivos]
+        pasta = pasta_artista
         
-        # Normaliza o nome do artista
-        novo_nome_artista = normalizar_nome_artista(pasta_artista)
+        novo_nome_artista = nomes_artistas.get(pasta_artista, pasta_artista)
         if novo_nome_artista != pasta_artista:
-            mudancas_artistas[pasta_artista] = novo_nome_artista
-            novo_caminho_pasta = os.path.join(BIBLIOTECA_PATH, novo_nome_artista)
-            
-            # Se já existir uma pasta com o novo nome, unifica os conteúdos
-            if os.path.exists(novo_caminho_pasta):
-                print(f"📁 Unificando pasta: {pasta_artista} → {novo_nome_artista}")
-                # Movemos os arquivos um por um
-                for arquivo in os.listdir(caminho_pasta):
-                    caminho_arquivo = os.path.join(caminho_pasta, arquivo)
-                    if os.path.isfile(caminho_arquivo):
-                        novo_caminho_arquivo = os.path.join(novo_caminho_pasta, arquivo)
-                        # Se o arquivo já existir, adiciona um sufixo
-                        if os.path.exists(novo_caminho_arquivo):
-                            nome_base, ext = os.path.splitext(arquivo)
-                            arquivo = f"{nome_base}_alt{ext}"
-                            novo_caminho_arquivo = os.path.join(novo_caminho_pasta, arquivo)
-                        os.rename(caminho_arquivo, novo_caminho_arquivo)
-                # Remove a pasta antiga vazia
-                os.rmdir(caminho_pasta)
-                # Atualiza o caminho para continuar o processamento
-                caminho_pasta = novo_caminho_pasta
+            if novo_nome_artista in conteudo:
+                # Já existe uma pasta com o novo nome: os arquivos são unificados nela
+                destino = conteudo[novo_nome_artista]
+                movidos = []
+                for arquivo, nome_original in itens:
+                    novo_arquivo = _nome_livre(arquivo, destino)
+                    destino.add(novo_arquivo)
+                    plano.append({"tipo": "mover", "origem": os.path.join(pasta_artista, arquivo),
+                                  "destino": os.path.join(novo_nome_artista, novo_arquivo)})
+                    movidos.append((novo_arquivo, nome_original))
+                itens = movidos
+                del conteudo[pasta_artista]
+                plano.append({"tipo": "remover_pasta", "origem": pasta_artista, "destino": novo_nome_artista})
             else:
-                # Renomeia a pasta
-                print(f"📁 Renomeando pasta: {pasta_artista} → {novo_nome_artista}")
-                os.rename(caminho_pasta, novo_caminho_pasta)
-                # Atualiza o caminho para continuar o processamento
-                caminho_pasta = novo_caminho_pasta
-        
-        # Processa os arquivos dentro da pasta
-        for arquivo in os.listdir(caminho_pasta):
-            caminho_arquivo = os.path.join(caminho_pasta, arquivo)
-            if os.path.isfile(caminho_arquivo):
-                # Extrai a extensão
-                _, ext = os.path.splitext(arquivo)
-                ext = ext.lstrip('.').lower()
-                
-                # Normaliza o nome do arquivo
-                novo_nome_arquivo = normalizar_nome_arquivo(arquivo, ext)
-                if novo_nome_arquivo != arquivo:
-                    novo_caminho_arquivo = os.path.join(caminho_pasta, novo_nome_arquivo)
-                    # Se já existir um arquivo com o novo nome, adiciona um sufixo
-                    if os.path.exists(novo_caminho_arquivo):
-                        nome_base, ext_com_ponto = os.path.splitext(novo_nome_arquivo)
-                        novo_nome_arquivo = f"{nome_base}_alt{ext_com_ponto}"
-                        novo_caminho_arquivo = os.path.join(caminho_pasta, novo_nome_arquivo)
-                    
-                    os.rename(caminho_arquivo, novo_caminho_arquivo)
-                    mudancas_arquivos.append((arquivo, novo_nome_arquivo))
-                
-                contagem_processados += 1
-                pbar.update(1)
-    
-    pbar.close()
-    
-    print(f"\n✅ Organização concluída! Processados {contagem_processados} arquivos.")
-    print(f"📊 Resumo: {len(mudancas_artistas)} pastas renomeadas, {len(mudancas_arquivos)} arquivos renomeados.")
+                conteudo[novo_nome_artista] = conteudo.pop(pasta_artista)
+                plano.append({"tipo": "renomear_pasta", "origem": pasta_artista, "destino": novo_nome_artista})
+            pasta = novo_nome_artista
+        
+        ocupados = conteudo[pasta]
+        for arquivo, nome_original in itens:
+            ext = os.path.splitext(arquivo)[1].lstrip('.').lower()
+            novo_nome_base = nomes_arquivos.get(nome_original, nome_original)
+            if novo_nome_base == nome_original:
+                continue
+            novo_arquivo = f"{novo_nome_base}.{ext}"
+            if novo_arquivo == arquivo:
+                continue
+            ocupados.discard(arquivo)
+            novo_arquivo = _nome_livre(novo_arquivo, ocupados)
+            ocupados.add(novo_arquivo)
+            plano.append({"tipo": "mover", "origem": os.path.join(pasta, arquivo),
+                          "destino": os.path.join(pasta, novo_arquivo)})
+    return plano
+
+def _descrever_operacao(operacao):
+    if operacao["tipo"] == "remover_pasta":
+        return f"📁 {operacao['origem']} unificada em {operacao['destino']}"
+    icone = "📁" if operacao["tipo"] == "renomear_pasta" else "📄"
+    return f"{icone} {operacao['origem']} → {operacao['destino']}"
+
+def _resumir_plano(plano):
+    """Mostra as mudanças de pastas e alguns exemplos de mudanças de arquivos do plano."""
+    pastas = [op for op in plano if op["tipo"] != "mover"]
+    arquivos = [op for op in plano if op["tipo"] == "mover"
+                and os.path.dirname(op["origem"]) == os.path.dirname(op["destino"])]
+    print(f"\n📊 Plano: {len(pastas)} pastas renomeadas ou unificadas, {len(arquivos)} arquivos renomeados "
+          f"({len(plano)} operações).")
     
     # Exibe as mudanças de nomes de artistas
-    if mudancas_artistas:
+    if pastas:
         print("\n🎨 Mudanças de nomes de artistas:")
-        for original, novo in mudancas_artistas.items():
-            print(f"  • {original} → {novo}")
+        for operacao in pastas:
+            print(f"  • {operacao['origem']} → {operacao['destino']}")
     
     # Exibe alguns exemplos de mudanças de nomes de arquivos (no máximo 10)
-    if mudancas_arquivos:
+    if arquivos:
         print("\n📄 Exemplos de mudanças de nomes de arquivos:")
-        for original, novo in mudancas_arquivos[:10]:
-            print(f"  • {original} → {novo}")
+        for operacao in arquivos[:10]:
+            print(f"  • {os.path.basename(operacao['origem'])} → {os.path.basename(operacao['destino'])}")
         
-        if len(mudancas_arquivos) > 10:
-            print(f"  ... e mais {len(mudancas_arquivos) - 10} mudanças.")
+        if len(arquivos) > 10:
+            print(f"  ... e mais {len(arquivos) - 10} mudanças.")
+
+class JournalOrganizacao:
+    """Journal append-only (JSON Lines) de uma reorganização da biblioteca.
     
-    return True
+    A primeira linha guarda o plano completo; cada operação aplicada acrescenta uma
+    linha "feito" e cada operação desfeita, uma linha "desfeito". Uma execução
+    interrompida pode ser retomada (as operações ainda não feitas são aplicadas) ou
+    desfeita (as já feitas são revertidas, da última para a primeira). Cada operação
+    também corrige, no mesmo passo, os caminhos do registro e do cache de escaneamento.
+    """
+    
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.plano = []
+        self.feitos = set()
+        self.estado = "pendente"
+        with open(caminho, encoding='utf-8') as f:
+            for linha in f:
+                if not linha.strip():
+                    continue
+                try:
+                    entrada = json.loads(linha)
+                except ValueError:
+                    break  # Última linha truncada por uma interrupção
+                tipo = entrada["tipo"]
+                if tipo == "plano":
+                    self.plano = entrada["operacoes"]
+                elif tipo == "feito":
+                    self.feitos.add(entrada["indice"])
+                elif tipo == "desfeito":
+                    self.feitos.discard(entrada["indice"])
+                elif tipo in ("concluido", "revertido"):
+                    self.estado = tipo
+                elif tipo == "retomado":
+                    self.estado = "pendente"
+    
+    @classmethod
+    def criar(cls, plano):
+        """Cria o journal de um novo plano."""
+        os.makedirs(ORGANIZACAO_PATH, exist_ok=True)
+        agora = time.time()
+        nome = time.strftime('%Y%m%d-%H%M%S', time.localtime(agora)) + f"-{int(agora * 1000) % 1000:03d}.jsonl"
+        caminho = os.path.join(ORGANIZACAO_PATH, nome)
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"tipo": "plano", "criado_em": time.time(), "operacoes": plano}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(caminho)
+    
+    @classmethod
+    def ultimo(cls):
+        """Retorna o journal mais recente, ou None se não houver nenhum."""
+        if not os.path.isdir(ORGANIZACAO_PATH):
+            return None
+        nomes = sorted(n for n in os.listdir(ORGANIZACAO_PATH) if n.endswith('.jsonl'))
+        return cls(os.path.join(ORGANIZACAO_PATH, nomes[-1])) if nomes else None
+    
+    def _registrar(self, f, tipo, indice=None):
+        entrada = {"tipo": tipo} if indice is None else {"tipo": tipo, "indice": indice}
+        f.write(json.dumps(entrada) + "\n")
+        f.flush()
+    
+    def _executar(self, tipo, origem, destino):
+        """Executa uma operação (idempotente: se já foi aplicada no disco, só corrige registro e cache)."""
+        caminho_destino = os.path.join(BIBLIOTECA_PATH, destino)
+        if tipo == "criar_pasta":
+            os.makedirs(caminho_destino, exist_ok=True)
+            return
+        caminho_origem = os.path.join(BIBLIOTECA_PATH, origem)
+        if tipo == "remover_pasta":
+            if os.path.isdir(caminho_origem):
+                os.rmdir(caminho_origem)
+            return
+        
+        if os.path.exists(caminho_origem):
+            if os.path.exists(caminho_destino) and not os.path.samefile(caminho_origem, caminho_destino):
+                raise FileExistsError(f"destino já existe: {destino}")
+            os.rename(caminho_origem, caminho_destino)
+        elif not os.path.exists(caminho_destino):
+            raise FileNotFoundError(f"origem não encontrada: {origem}")
+        
+        pasta = tipo == "renomear_pasta"
+        obter_registro().mover_caminho(caminho_origem, caminho_destino)
+        obter_cache_scan().renomear(origem, destino, pasta)
+    
+    def aplicar(self):
+        """Aplica as operações ainda não feitas, na ordem do plano."""
+        pendentes = [i for i in range(len(self.plano)) if i not in self.feitos]
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            if self.feitos:
+                self._registrar(f, "retomado")
+            try:
+                for indice in tqdm(pendentes, desc="Organizando biblioteca", unit="operação"):
+                    operacao = self.plano[indice]
+                    self._executar(operacao["tipo"], operacao["origem"], operacao["destino"])
+                    self._registrar(f, "feito", indice)
+                    self.feitos.add(indice)
+            except OSError as e:
+                print(f"\n❌ Erro em '{_descrever_operacao(operacao)}': {e}")
+                print("⚠️ Organização interrompida. Use --retomar para continuar ou --desfazer para reverter.")
+                return False
+            self._registrar(f, "concluido")
+            self.estado = "concluido"
+        
+        print(f"\n✅ Organização concluída! {len(self.plano)} operações aplicadas.")
+        return True
+    
+    def desfazer(self):
+        """Reverte as operações já feitas, da última para a primeira."""
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            try:
+                for indice in tqdm(sorted(self.feitos, reverse=True), desc="Desfazendo organização", unit="operação"):
+                    operacao = self.plano[indice]
+                    if operacao["tipo"] == "remover_pasta":
+                        self._executar("criar_pasta", None, operacao["origem"])
+                    else:
+                        self._executar(operacao["tipo"], operacao["destino"], operacao["origem"])
+                    self._registrar(f, "desfeito", indice)
+                    self.feitos.discard(indice)
+            except OSError as e:
+                print(f"\n❌ Erro ao desfazer '{_descrever_operacao(operacao)}': {e}")
+                return False
+            self._registrar(f, "revertido")
+            self.estado = "revertido"
+        
+        print(f"\n↩️ Organização desfeita: {self.caminho}")
+        return True
+
+def retomar_organizacao():
+    """Retoma a última organização interrompida."""
+    journal = JournalOrganizacao.ultimo()
+    if journal is None or journal.estado != "pendente":
+        print("ℹ️ Nenhuma organização interrompida para retomar.")
+        return True
+    print(f"🔁 Retomando organização: {len(journal.feitos)} de {len(journal.plano)} operações já aplicadas.")
+    return journal.aplicar()
+
+def desfazer_organizacao():
+    """Desfaz a última organização, concluída ou interrompida."""
+    journal = JournalOrganizacao.ultimo()
+    if journal is None or journal.estado == "revertido" or not journal.feitos:
+        print("ℹ️ Nenhuma organização para desfazer.")
+        return True
+    print(f"↩️ Desfazendo {len(journal.feitos)} operações de {journal.caminho}...")
+    return journal.desfazer()
+
+_sessao_http = None
+_sessao_http_lock = threading.Lock()
+
+def obter_sessao_http():
+    """Retorna a sessão HTTP compartilhada (keep-alive e pool de conexões)."""
+    global _sessao_http
+    with _sessao_http_lock:
+        if _sessao_http is None:
+            _sessao_http = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=2)
+            _sessao_http.mount('http://', adaptador)
+            _sessao_http.mount('https://', adaptador)
+        return _sessao_http
+
+def formato_imagem(dados):
+    """Identifica o formato da imagem pelos bytes iniciais: 'jpeg', 'png' ou None."""
+    if dados[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if dados[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    return None
+
+class CacheThumbnails:
+    """Cache em disco das capas, endereçado pelo conteúdo e indexado por URL/ETag.
+    
+    As imagens ficam em objetos/<sha256 do conteúdo>, então capas iguais usadas por
+    várias URLs são guardadas uma única vez. O índice urls/<sha256 da URL>.json guarda
+    o ETag e o hash do conteúdo. O mtime dos objetos marca o último acesso e os menos
+    usados são removidos, junto com as entradas do índice que apontam para eles, quando
+    o cache passa de `tamanho_maximo`.
+    """
+    
+    def __init__(self, pasta=THUMBNAILS_CACHE_PATH, tamanho_maximo=THUMBNAILS_CACHE_MAX_BYTES, ttl=THUMBNAILS_CACHE_TTL):
+        self.pasta_objetos = os.path.join(pasta, 'objetos')
+        self.pasta_urls = os.path.join(pasta, 'urls')
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.pasta_objetos, exist_ok=True)
+        os.makedirs(self.pasta_urls, exist_ok=True)
+    
+    def _caminho_indice(self, url):
+        return os.path.join(self.pasta_urls, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+    
+    def _caminho_objeto(self, hash_conteudo):
+        return os.path.join(self.pasta_objetos, hash_conteudo)
+    
+    def _gravar_atomico(self, caminho, dados):
+        descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho))
+        with os.fdopen(descritor, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+    
+    def _ler_entrada(self, url):
+        try:
+            with open(self._caminho_indice(url), 'r', encoding='utf-8') as f:
+                entrada = json.load(f)
+            with open(self._caminho_objeto(entrada['hash']), 'rb') as f:
+                return entrada, f.read()
+        except (OSError, ValueError, KeyError):
+            return None, None
+    
+    def _salvar_entrada(self, url, etag, dados):
+        hash_conteudo = hashlib.sha256(dados).hexdigest()
+        caminho_objeto = self._caminho_objeto(hash_conteudo)
+        if not os.path.exists(caminho_objeto):
+            self._gravar_atomico(caminho_objeto, dados)
+        entrada = {'url': url, 'etag': etag, 'hash': hash_conteudo, 'validado_em': time.time()}
+        self._gravar_atomico(self._caminho_indice(url), json.dumps(entrada).encode('utf-8'))
+        self._tocar(hash_conteudo)
+        self._aplicar_limite()
+    
+    def _tocar(self, hash_conteudo):
+        """Marca o objeto como usado agora (política LRU)."""
+        try:
+            os.utime(self._caminho_objeto(hash_conteudo))
+        except OSError:
+            pass
+    
+    def _aplicar_limite(self):
+        """Remove os objetos acessados há mais tempo até o cache caber no limite."""
+        with self._lock:
+            objetos = []
+            total = 0
+            with os.scandir(self.pasta_objetos) as entradas:
+                for entrada in entradas:
+                    if entrada.is_file():
+                        info = entrada.stat()
+                        objetos.append((info.st_mtime, info.st_size, entrada.path))
+                        total += info.st_size
+            if total <= self.tamanho_maximo:
+                return
+            removidos = set()
+            for _, tamanho, caminho in sorted(objetos):
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    continue
+                removidos.add(os.path.basename(caminho))
+                total -= tamanho
+                if total <= self.tamanho_maximo:
+                    break
+            self._remover_indices(removidos)
+    
+    def _remover_indices(self, removidos):
+        """Remove do índice as URLs cujos objetos foram descartados (ou já não existem)."""
+        with os.scandir(self.pasta_urls) as entradas:
+            for entrada in entradas:
+                if not entrada.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entrada.path, 'r', encoding='utf-8') as f:
+                        hash_conteudo = json.load(f)['hash']
+                except (OSError, ValueError, KeyError):
+                    hash_conteudo = None
+                if hash_conteudo is None or hash_conteudo in removidos or not os.path.exists(self._caminho_objeto(hash_conteudo)):
+                    try:
+                        os.remove(entrada.path)
+                    except OSError:
+                        pass
+    
+    def obter(self, url, timeout=30):
+        """Retorna os bytes da imagem, baixando-a apenas se não estiver em cache ou tiver mudado."""
+        entrada, dados = self._ler_entrada(url)
+        if dados is not None and time.time() - entrada.get('validado_em', 0) < self.ttl:
+            self._tocar(entrada['hash'])
+            return dados
+        
+        cabecalhos = {}
+        if dados is not None and entrada.get('etag'):
+            cabecalhos['If-None-Match'] = entrada['etag']
+        
+        response = obter_sessao_http().get(url, headers=cabecalhos, timeout=timeout)
+        if response.status_code == 304 and dados is not None:
+            self._salvar_entrada(url, entrada.get('etag'), dados)
+            return dados
+        if response.status_code != 200:
+            print(f"⚠️ Não foi possível baixar a thumbnail: {response.status_code}")
+            return None
+        
+        self._salvar_entrada(url, response.headers.get('ETag'), response.content)
+        return response.content
+
+_cache_thumbnails = None
+_cache_thumbnails_lock = threading.Lock()
+
+def baixar_thumbnail(url):
+    """Obtém a imagem da capa pelo cache de thumbnails."""
+    global _cache_thumbnails
+    with _cache_thumbnails_lock:
+        if _cache_thumbnails is None:
+            _cache_thumbnails = CacheThumbnails()
+    return _cache_thumbnails.obter(url)
+
+def escolher_thumbnail(thumbnails, politica=None):
+    """Escolhe a variante de thumbnail que melhor se encaixa na política de capas.
+    
+    Prefere a maior variante que cabe nas dimensões máximas; se nenhuma couber, usa a
+    menor entre as maiores (que será reduzida localmente). Variantes JPEG vêm antes de
+    WEBP com as mesmas dimensões, pois o M4A só aceita JPEG/PNG.
+    """
+    politica = politica or POLITICA_CAPA
+    candidatas = [t for t in thumbnails or [] if t.get('url')]
+    if not candidatas:
+        return None
+    
+    def area(t):
+        return (t.get('width') or 0) * (t.get('height') or 0)
+    
+    def eh_jpeg(t):
+        return t['url'].lower().split('?')[0].endswith(('.jpg', '.jpeg'))
+    
+    com_dimensoes = [t for t in candidatas if area(t)]
+    if not com_dimensoes:
+        # Sem dimensões conhecidas: o yt-dlp lista as thumbnails da pior para a melhor
+        return candidatas[-1]['url']
+    
+    cabem = [t for t in com_dimensoes
+             if t['width'] <= politica['largura_max'] and t['height'] <= politica['altura_max']]
+    if cabem:
+        return max(cabem, key=lambda t: (area(t), eh_jpeg(t)))['url']
+    return min(com_dimensoes, key=lambda t: (area(t), not eh_jpeg(t)))['url']
+
+def capa_excede_politica(dados, politica=None):
+    """Indica se a imagem precisa ser reduzida ou convertida para caber na política."""
+    politica = politica or POLITICA_CAPA
+    if formato_imagem(dados) is None or len(dados) > politica['bytes_max']:
+        return True
+    if Image is None:
+        return False
+    with Image.open(io.BytesIO(dados)) as imagem:
+        largura, altura = imagem.size
+    return largura > politica['largura_max'] or altura > politica['altura_max']
+
+def ajustar_capa(dados, politica=None):
+    """Reduz e recomprime a capa em JPEG até caber nas dimensões e no orçamento de bytes."""
+    politica = politica or POLITICA_CAPA
+    if not capa_excede_politica(dados, politica):
+        return dados
+    if Image is None:
+        # Sem Pillow a capa é embutida como veio
+        return dados
+    
+    with Image.open(io.BytesIO(dados)) as imagem:
+        imagem = imagem.convert('RGB')
+        imagem.thumbnail((politica['largura_max'], politica['altura_max']))
+        qualidade = politica['qualidade_jpeg']
+        while True:
+            saida = io.BytesIO()
+            imagem.save(saida, format='JPEG', quality=qualidade, optimize=True)
+            resultado = saida.getvalue()
+            if len(resultado) <= politica['bytes_max'] or min(imagem.size) <= 64:
+                return resultado
+            # Primeiro reduz a qualidade; no limite, reduz as dimensões
+            if qualidade > 50:
+                qualidade -= 10
+            else:
+                imagem = imagem.resize((max(1, int(imagem.width * 0.8)), max(1, int(imagem.height * 0.8))))
+
+def detalhe(mensagem):
+    """Exibe uma mensagem de andamento só no modo verboso, sem quebrar as barras de progresso."""
+    if SAIDA["verboso"]:
+        tqdm.write(mensagem)
 
 def definir_metadados(arquivo_path, artista, titulo, album, thumbnail_url=None):
     """Define os metadados do arquivo de áudio."""
-    print(f"📝 Configurando metadados para: {os.path.basename(arquivo_path)}")
+    detalhe(f"📝 Configurando metadados para: {os.path.basename(arquivo_path)}")
     extensao = os.path.splitext(arquivo_path)[1].lower()
     
     try:
@@ -467,48 +2387,43 @@ def definir_metadados(arquivo_path, artista, titulo, album, thumbnail_url=None):
             # Baixar e adicionar thumbnail como capa se disponível
             if thumbnail_url:
                 try:
-                    print("🖼️ Baixando thumbnail para capa...")
-                    response = requests.get(thumbnail_url, timeout=30)
-                    if response.status_code == 200:
-                        cover_data = response.content
+                    detalhe("🖼️ Baixando thumbnail para capa...")
+                    cover_data = baixar_thumbnail(thumbnail_url)
+                    if cover_data:
+                        cover_data = ajustar_capa(cover_data)
                         # Determinar o formato da imagem
-                        if thumbnail_url.lower().endswith('.jpg') or thumbnail_url.lower().endswith('.jpeg'):
+                        if formato_imagem(cover_data) == 'jpeg':
                             cover_format = MP4Cover.FORMAT_JPEG
                         else:
                             cover_format = MP4Cover.FORMAT_PNG
                         audio['covr'] = [MP4Cover(cover_data, cover_format)]
-                        print("✅ Capa adicionada com sucesso!")
-                    else:
-                        print(f"⚠️ Não foi possível baixar a thumbnail: {response.status_code}")
+                        detalhe("✅ Capa adicionada com sucesso!")
                 except Exception as e:
-                    print(f"⚠️ Erro ao adicionar capa: {str(e)}")
+                    tqdm.write(f"⚠️ Erro ao adicionar capa: {str(e)}")
             
             audio.save()
             
         elif extensao == '.mp3':
-            # Para arquivos MP3
+            # Para arquivos MP3: texto e capa vão na mesma gravação da tag ID3
             try:
-                audio = EasyID3(arquivo_path)
-            except:
+                audio = ID3(arquivo_path)
+            except ID3NoHeaderError:
                 # Se não existir tags, inicializa
-                audio = File(arquivo_path, easy=True)
-                audio.add_tags()
-                
-            audio['title'] = titulo
-            audio['artist'] = artista
-            audio['album'] = album
-            audio.save()
+                audio = ID3()
             
-            # Adicionar capa (requer ID3 completo)
+            audio.add(TIT2(encoding=3, text=[titulo]))
+            audio.add(TPE1(encoding=3, text=[artista]))
+            audio.add(TALB(encoding=3, text=[album]))
+            
+            # Adicionar capa
             if thumbnail_url:
                 try:
-                    print("🖼️ Baixando thumbnail para capa...")
-                    response = requests.get(thumbnail_url, timeout=30)
-                    if response.status_code == 200:
-                        cover_data = response.content
-                        audio = ID3(arquivo_path)
+                    detalhe("🖼️ Baixando thumbnail para capa...")
+                    cover_data = baixar_thumbnail(thumbnail_url)
+                    if cover_data:
+                        cover_data = ajustar_capa(cover_data)
                         # Determinar o tipo de imagem
-                        mime = 'image/jpeg' if thumbnail_url.lower().endswith('.jpg') or thumbnail_url.lower().endswith('.jpeg') else 'image/png'
+                        mime = 'image/jpeg' if formato_imagem(cover_data) == 'jpeg' else 'image/png'
                         audio.add(APIC(
                             encoding=3,  # UTF-8
                             mime=mime,
@@ -516,37 +2431,338 @@ def definir_metadados(arquivo_path, artista, titulo, album, thumbnail_url=None):
                             desc='Cover',
                             data=cover_data
                         ))
-                        audio.save()
-                        print("✅ Capa adicionada com sucesso!")
-                    else:
-                        print(f"⚠️ Não foi possível baixar a thumbnail: {response.status_code}")
+                        detalhe("✅ Capa adicionada com sucesso!")
                 except Exception as e:
-                    print(f"⚠️ Erro ao adicionar capa: {str(e)}")
+                    tqdm.write(f"⚠️ Erro ao adicionar capa: {str(e)}")
+            
+            audio.save(arquivo_path)
         
         else:
-            print(f"⚠️ Formato não suportado para metadados: {extensao}")
+            tqdm.write(f"⚠️ Formato não suportado para metadados: {extensao}")
             return False
         
-        print("✅ Metadados configurados com sucesso!")
+        detalhe("✅ Metadados configurados com sucesso!")
         return True
         
     except Exception as e:
-        print(f"❌ Erro ao definir metadados: {str(e)}")
+        tqdm.write(f"❌ Erro ao definir metadados: {str(e)}")
         return False
 
-def obter_info_video(yt_dlp_cmd, video_url):
+class ErroYtdlp(Exception):
+    """Falha do yt-dlp ao extrair informações ou baixar um vídeo."""
+
+# Formato pedido ao yt-dlp no modo pipeline: de preferência o AAC original, que é copiado sem recodificar
+FORMATO_PIPELINE = 'bestaudio[ext=m4a]/bestaudio/best'
+
+def gravar_audio_final(origem, destino, metadados, capa=None):
+    """Grava o M4A final em uma única passada do ffmpeg: áudio, tags e capa juntos.
+    
+    O áudio AAC é copiado sem recodificar; outros codecs (Opus, Vorbis) são convertidos
+    para AAC. `capa` são os bytes da imagem, já ajustados à política de capas.
+    """
+    comando = ['ffmpeg', '-v', 'error', '-y', '-i', origem]
+    caminho_capa = None
+    if capa:
+        caminho_capa = f"{destino}.capa.{'jpg' if formato_imagem(capa) == 'jpeg' else 'png'}"
+        with open(caminho_capa, 'wb') as f:
+            f.write(capa)
+        comando += ['-i', caminho_capa]
+    comando += ['-map', '0:a:0']
+    if caminho_capa:
+        comando += ['-map', '1:0', '-c:v', 'copy', '-disposition:v:0', 'attached_pic']
+    if os.path.splitext(origem)[1].lower() in ('.m4a', '.mp4', '.aac'):
+        comando += ['-c:a', 'copy']
+    else:
+        comando += ['-c:a', 'aac', '-b:a', PIPELINE_BITRATE_AAC]
+    comando += ['-metadata', f"title={metadados['title']}", '-metadata', f"artist={metadados['artist']}",
+                '-metadata', f"album={metadados['album']}", destino]
+    try:
+        resultado = subprocess.run(comando, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    finally:
+        if caminho_capa:
+            os.remove(caminho_capa)
+    if resultado.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou ao gravar o arquivo final: {resultado.stderr.strip()}")
+
+class BackendCLI:
+    """Executa o yt-dlp como processo externo, uma chamada por operação."""
+    
+    def __init__(self, apenas_audio=True, quality=None, cmd='yt-dlp', pipeline=False):
+        self.apenas_audio = apenas_audio
+        self.quality = quality
+        self.cmd = cmd
+        # No modo pipeline o yt-dlp só baixa o áudio; tags e capa entram na mesma passada do ffmpeg
+        self.pipeline = pipeline
+    
+    def disponivel(self):
+        return verificar_ytdlp()
+    
+    def _executar_json(self, command):
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+            return json.loads(result.stdout)
+        except subprocess.CalledProcessError as e:
+            raise ErroYtdlp(str(e)) from e
+        except json.JSONDecodeError as e:
+            raise ErroYtdlp(f"resposta inválida do yt-dlp ({str(e)})") from e
+    
+    def info(self, video_url):
+        """Retorna as informações completas de um vídeo."""
+        return self._executar_json([self.cmd, '-J', video_url])
+    
+    def info_playlist(self, playlist_url):
+        """Retorna a listagem simples (flat) de uma playlist."""
+        return self._executar_json([self.cmd, '--flat-playlist', '-J', playlist_url])
+    
+    def infos(self, video_urls):
+        """Obtém as informações de vários vídeos em uma única execução do yt-dlp.
+        
+        O yt-dlp emite um JSON por linha (-j) à medida que resolve cada vídeo, então as
+        informações são entregues conforme chegam. Vídeos indisponíveis são ignorados.
+        """
+        if not video_urls:
+            return
+        
+        command = [self.cmd, '-j', '--ignore-errors', '--no-playlist', '--batch-file', '-']
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   universal_newlines=True, bufsize=1)
+        try:
+            # O yt-dlp lê todo o batch file antes de começar, então não há risco de bloqueio aqui
+            process.stdin.write('\n'.join(video_urls) + '\n')
+            process.stdin.close()
+            
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"⚠️  Resposta inválida do yt-dlp ignorada. ({str(e)})")
+            process.wait()
+        finally:
+            # Encerra o yt-dlp se o consumidor parar antes do fim (ex.: Ctrl+C)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+    
+    def baixar(self, video_url, pasta_job, video_info=None, progresso=None):
+        """Baixa o vídeo em pasta_job e retorna o caminho final do arquivo (ou None)."""
+        command = [self.cmd]
+        if self.pipeline:
+            # Sem pós-processamento: o ffmpeg grava o arquivo final depois, uma única vez
+            command += ['-f', FORMATO_PIPELINE]
+        elif not self.apenas_audio:
+            if self.quality:
+                command += ['-f', f'bestvideo[height<={self.quality}]+bestaudio/best[height<={self.quality}]']
+            else:
+                command += ['-f', 'best']
+        else:
+            command += ['-x', '--audio-format', 'm4a', '--audio-quality', '0']
+        
+        command += ['-o', os.path.join(pasta_job, '%(id)s.%(ext)s')]
+        # Pede ao yt-dlp o caminho final do arquivo (após conversões), mantendo a barra de progresso
+        command += ['--print', f'after_move:{MARCADOR_ARQUIVO_FINAL}%(filepath)s', '--progress']
+        
+        if self.pipeline and video_info:
+            # O yt-dlp parte das informações já obtidas em vez de consultar o site de novo
+            caminho_info = os.path.join(pasta_job, 'info.json')
+            with open(caminho_info, 'w', encoding='utf-8') as f:
+                json.dump(video_info, f)
+            command += ['--load-info-json', caminho_info]
+        else:
+            command.append(video_url)
+        
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1
+        )
+        
+        caminho_final = None
+        for line in process.stdout:
+            if line.startswith(MARCADOR_ARQUIVO_FINAL):
+                caminho_final = line[len(MARCADOR_ARQUIVO_FINAL):].rstrip('\n')
+            elif "%" in line and progresso:
+                try:
+                    progresso(float(line.split('%')[0].split()[-1]))
+                except Exception:
+                    pass
+        
+        process.wait()
+        return caminho_final
+
+class BackendAPI:
+    """Usa o yt_dlp como biblioteca, sem abrir um processo por operação.
+    
+    Cada thread reaproveita uma única instância configurada do YoutubeDL durante
+    toda a execução, e o progresso chega pelos progress_hooks. Em testes, classes
+    (ou instâncias) de InfoExtractor locais podem ser passadas em `extratores` para
+    substituir os extratores reais.
+    """
+    
+    def __init__(self, apenas_audio=True, quality=None, extratores=None, opcoes_extras=None, pipeline=False):
+        self.apenas_audio = apenas_audio
+        self.quality = quality
+        self.pipeline = pipeline
+        self.extratores = extratores
+        self.opcoes_extras = opcoes_extras or {}
+        # O YoutubeDL não é thread-safe: uma instância por worker
+        self._local = threading.local()
+    
+    def disponivel(self):
+        return yt_dlp is not None
+    
+    def _opcoes(self):
+        opcoes = {
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'noplaylist': True,
+            'outtmpl': '%(id)s.%(ext)s',
+            'progress_hooks': [self._hook_progresso],
+        }
+        if self.pipeline:
+            # Sem pós-processamento: o ffmpeg grava o arquivo final depois, uma única vez
+            opcoes['format'] = FORMATO_PIPELINE
+        elif not self.apenas_audio:
+            if self.quality:
+                opcoes['format'] = f'bestvideo[height<={self.quality}]+bestaudio/best[height<={self.quality}]'
+            else:
+                opcoes['format'] = 'best'
+        else:
+            # Equivalente a: -x --audio-format m4a --audio-quality 0
+            opcoes['format'] = 'bestaudio/best'
+            opcoes['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'm4a', 'preferredquality': '0'}]
+        opcoes.update(self.opcoes_extras)
+        return opcoes
+    
+    def _ydl(self):
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            if self.extratores:
+                ydl = yt_dlp.YoutubeDL(self._opcoes(), auto_init=False)
+                for extrator in self.extratores:
+                    # O YoutubeDL só usa instâncias registradas; classes seriam procuradas entre os extratores reais
+                    ydl.add_info_extractor(extrator() if isinstance(extrator, type) else extrator)
+            else:
+                ydl = yt_dlp.YoutubeDL(self._opcoes())
+            self._local.ydl = ydl
+        return ydl
+    
+    def _hook_progresso(self, d):
+        progresso = getattr(self._local, 'progresso', None)
+        if not progresso:
+            return
+        if d.get('status') == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if total:
+                progresso(d.get('downloaded_bytes', 0) * 100 / total)
+        elif d.get('status') == 'finished':
+            progresso(100)
+    
+    def info(self, video_url):
+        """Retorna as informações completas de um vídeo."""
+        ydl = self._ydl()
+        try:
+            return ydl.sanitize_info(ydl.extract_info(video_url, download=False))
+        except yt_dlp.utils.DownloadError as e:
+            raise ErroYtdlp(str(e)) from e
+    
+    def info_playlist(self, playlist_url):
+        """Retorna a listagem simples (flat) de uma playlist."""
+        ydl = self._ydl()
+        anteriores = {chave: ydl.params.get(chave) for chave in ('extract_flat', 'noplaylist')}
+        ydl.params.update({'extract_flat': 'in_playlist', 'noplaylist': False})
+        try:
+            return ydl.sanitize_info(ydl.extract_info(playlist_url, download=False))
+        except yt_dlp.utils.DownloadError as e:
+            raise ErroYtdlp(str(e)) from e
+        finally:
+            ydl.params.update(anteriores)
+    
+    def infos(self, video_urls):
+        """Obtém as informações de vários vídeos no mesmo processo. Vídeos indisponíveis são ignorados."""
+        for video_url in video_urls:
+            try:
+                yield self.info(video_url)
+            except ErroYtdlp as e:
+                print(f"⚠️  Erro ao obter info do vídeo {video_url}. ({str(e)})")
+    
+    def baixar(self, video_url, pasta_job, video_info=None, progresso=None):
+        """Baixa o vídeo em pasta_job e retorna o caminho final do arquivo (ou None)."""
+        ydl = self._ydl()
+        ydl.params['paths'] = {'home': pasta_job}
+        self._local.progresso = progresso
+        try:
+            if video_info:
+                # Reaproveita as informações já extraídas em vez de consultar o site de novo
+                try:
+                    info = ydl.process_ie_result(copy.deepcopy(video_info), download=True)
+                except yt_dlp.utils.DownloadError:
+                    info = ydl.extract_info(video_info.get('webpage_url') or video_url, download=True)
+            else:
+                info = ydl.extract_info(video_url, download=True)
+        except yt_dlp.utils.DownloadError as e:
+            raise ErroYtdlp(str(e)) from e
+        finally:
+            self._local.progresso = None
+        
+        downloads = (info or {}).get('requested_downloads') or []
+        return downloads[0].get('filepath') if downloads else None
+
+def criar_backend(apenas_audio=True, quality=None, api=False, pipeline=False):
+    """Cria o backend do yt-dlp: em processo (API) ou via linha de comando."""
+    # O modo pipeline grava M4A; vídeos seguem o fluxo normal
+    pipeline = pipeline and apenas_audio
+    if api:
+        return BackendAPI(apenas_audio, quality, pipeline=pipeline)
+    return BackendCLI(apenas_audio, quality, pipeline=pipeline)
+
+def obter_info_video(backend, video_url):
     """Obtém informações do vídeo usando yt-dlp."""
     try:
-        command_video = [yt_dlp_cmd, '-J', video_url]
-        result_video = subprocess.run(command_video, capture_output=True, text=True, check=True)
-        video_info = json.loads(result_video.stdout)
-        return video_info
-    except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+        return backend.info(video_url)
+    except ErroYtdlp as e:
         print(f"⚠️  Erro ao obter info do vídeo {video_url}. ({str(e)})")
         return None
 
-def baixar_video(yt_dlp_cmd, video_url, video_info, download_dir, apenas_audio, quality, force=False, idx=None, total_videos=None):
-    """Baixa um vídeo individual."""
+def obter_info_videos(backend, video_urls):
+    """Obtém as informações de vários vídeos de uma vez, entregando-as conforme chegam."""
+    return backend.infos(video_urls)
+
+def pasta_preparo(download_dir, video_id, video_url):
+    """Retorna a pasta de preparo do download de um vídeo, a mesma em todas as execuções.
+    
+    Como a pasta não muda, um download interrompido encontra nela os arquivos .part e o
+    yt-dlp continua de onde parou em vez de começar do zero.
+    """
+    nome = video_id if video_id and _RE_VIDEO_ID.fullmatch(video_id) else hashlib.sha1(video_url.encode('utf-8')).hexdigest()[:16]
+    pasta = os.path.join(download_dir, nome)
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+def finalizar_download(destino_final, video_url, metadados, pipeline=False):
+    """Marca o arquivo já movido para a biblioteca e registra o download."""
+    # No modo pipeline as tags e a capa já foram gravadas pelo ffmpeg antes da movimentação
+    if not pipeline:
+        definir_metadados(destino_final, metadados['artist'], metadados['title'], metadados['album'], metadados.get('thumbnail_url'))
+    
+    # Registra o download no registro da biblioteca
+    obter_registro().registrar(video_url, metadados['artist'], destino_final)
+
+def baixar_video(backend, video_url, video_info, download_dir, apenas_audio, force=False, idx=None, total_videos=None, posicao=None, etapa=None):
+    """Baixa um vídeo individual.
+    
+    Retorna True se o vídeo foi baixado, None se foi pulado (o arquivo ou o mesmo áudio
+    já está na biblioteca) e False em caso de falha.
+    
+    Se dado, `etapa(estado, **dados)` é chamado a cada mudança de estado do download
+    ('baixando', 'marcando', 'concluido' ou 'falhou'), para a fila da playlist.
+    """
+    etapa = etapa or (lambda estado, **dados: None)
     artist = video_info.get('uploader', 'Desconhecido').strip()
     title = video_info.get('title', 'Sem título').strip()
     album = video_info.get('album') or "YouTube"
@@ -556,95 +2772,100 @@ def baixar_video(yt_dlp_cmd, video_url, video_info, download_dir, apenas_audio,
     destino_final = os.path.join(artista_folder, filename)
     
     if os.path.exists(destino_final) and not force:
-        print(f"⏩ Música já existe: {destino_final}. Pulando...")
-        return False
+        tqdm.write(f"⏩ Música já existe: {destino_final}. Pulando...")
+        etapa('concluido')
+        return None
     
-    command = [yt_dlp_cmd]
-    if not apenas_audio:
-        if quality:
-            command += ['-f', f'bestvideo[height<={quality}]+bestaudio/best[height<={quality}]']
-        else:
-            command += ['-f', 'best']
-    else:
-        command += ['-x', '--audio-format', 'm4a', '--audio-quality', '0']
+    if POLITICA_DUPLICATAS["verificar_antes"] and not force:
+        duplicata = duplicata_acustica(video_info)
+        if duplicata:
+            caminho, similaridade = duplicata
+            tqdm.write(f"⏩ Mesmo áudio já está na biblioteca: {caminho} ({similaridade:.0%} de similaridade). Pulando...")
+            etapa('concluido')
+            return None
     
-    command += ['-o', os.path.join(download_dir, '%(title)s.%(ext)s')]
-    command.append(video_url)
+    # Cada download usa uma pasta de preparo própria dentro de downloads_puros. Como ela fica
+    # no mesmo sistema de arquivos da biblioteca, a movimentação final é um rename atômico.
+    pasta_job = pasta_preparo(download_dir, video_info.get('id') or extrair_video_id(video_url), video_url)
     
     if idx is not None and total_videos is not None:
-        print(f"\n▶️  Baixando vídeo {idx}/{total_videos}: {title}")
+        tqdm.write(f"\n▶️  Baixando vídeo {idx}/{total_videos}: {title}")
     else:
-        print(f"\n▶️  Baixando: {title}")
+        tqdm.write(f"\n▶️  Baixando: {title}")
     
-    process = subprocess.Popen(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
-    
-    pbar_desc = f"[{idx}/{total_videos}] {title[:30]}..." if idx is not None else f"{title[:30]}..."
-    pbar = tqdm(total=100, desc=pbar_desc, unit='%')
-    
-    for line in process.stdout:
-        if "%" in line:
-            try:
-                percent = float(line.split('%')[0].split()[-1])
-                pbar.n = percent
-                pbar.refresh()
-            except Exception:
-                pass
-    
-    process.wait()
-    pbar.close()
+    # Escolhe a capa antes do download para que o modo pipeline possa gravá-la junto com o áudio
+    thumbnail_url = escolher_thumbnail(video_info.get('thumbnails', []))
+    metadados = {'title': title, 'artist': artist, 'album': album, 'thumbnail_url': thumbnail_url}
     
+    concluido = False
     try:
-        arquivos_baixados = os.listdir(download_dir)
-        if not arquivos_baixados:
-            print(f"⚠️  Nenhum arquivo encontrado para {title}.")
+        etapa('baixando')
+        pbar_desc = f"[{idx}/{total_videos}] {title[:30]}..." if idx is not None else f"{title[:30]}..."
+        pbar = tqdm(total=100, desc=pbar_desc, unit='%', position=posicao, leave=posicao is None)
+        
+        def progresso(percent):
+            pbar.n = percent
+            pbar.refresh()
+        
+        try:
+            caminho_origem = backend.baixar(video_url, pasta_job, video_info, progresso)
+        finally:
+            pbar.close()
+        
+        if not caminho_origem or not os.path.isfile(caminho_origem):
+            tqdm.write(f"⚠️  Nenhum arquivo encontrado para {title}.")
+            etapa('falhou', erro="nenhum arquivo gerado pelo yt-dlp")
             return False
         
-        arquivo_downloadado = arquivos_baixados[0]
-        caminho_origem = os.path.join(download_dir, arquivo_downloadado)
-        os.makedirs(artista_folder, exist_ok=True)
-        os.rename(caminho_origem, destino_final)
-        print(f"📦 Movido para biblioteca: {destino_final}")
-        
-        # Adiciona metadados ao arquivo
-        thumbnail_url = None
-        thumbnails = video_info.get('thumbnails', [])
-        if thumbnails:
-            # Pega a maior thumbnail disponível
-            thumbnails.sort(key=lambda x: x.get('height', 0) * x.get('width', 0), reverse=True)
-            thumbnail_url = thumbnails[0].get('url')
-            
-        definir_metadados(destino_final, artist, title, album, thumbnail_url)
+        if backend.pipeline:
+            # Áudio, tags e capa (já ajustada à política) em uma única gravação
+            capa = baixar_thumbnail(thumbnail_url) if thumbnail_url else None
+            arquivo_final = os.path.join(pasta_job, f"{os.path.splitext(os.path.basename(caminho_origem))[0]}.final.m4a")
+            gravar_audio_final(caminho_origem, arquivo_final, metadados, ajustar_capa(capa) if capa else None)
+            caminho_origem = arquivo_final
         
-        # Registra o download no CSV
-        with open(BIBLIOTECA_CSV, 'a', newline='', encoding='utf-8') as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerow([video_url, artist])
+        # O destino é gravado na fila antes da movimentação: se a execução parar depois dela,
+        # a próxima só precisa concluir a marcação
+        etapa('marcando', destino=destino_final, metadados={**metadados, 'pipeline': backend.pipeline})
+        os.makedirs(artista_folder, exist_ok=True)
+        os.replace(caminho_origem, destino_final)
+        detalhe(f"📦 Movido para biblioteca: {destino_final}")
         
-        for f in os.listdir(download_dir):
-            os.remove(os.path.join(download_dir, f))
-            
+        finalizar_download(destino_final, video_url, metadados, backend.pipeline)
+        etapa('concluido')
+        concluido = True
         return True
+    except ErroYtdlp as e:
+        tqdm.write(f"❌ Erro ao baixar {title}: {str(e)}")
+        etapa('falhou', erro=str(e))
+        return False
     except Exception as e:
-        print(f"❌ Erro ao mover/renomear {title}: {str(e)}")
+        tqdm.write(f"❌ Erro ao mover/renomear {title}: {str(e)}")
+        etapa('falhou', erro=str(e))
         return False
+    finally:
+        # A pasta de preparo só é removida após o sucesso; em caso de falha ou interrupção os
+        # arquivos .part ficam para a próxima tentativa
+        if concluido:
+            shutil.rmtree(pasta_job, ignore_errors=True)
 
-def baixar_video_individual(video_url, apenas_audio=True, quality=None, force=False, artist_name=None):
+def baixar_video_individual(video_url, apenas_audio=True, quality=None, force=False, artist_name=None, api=False, pipeline=False):
     """Baixa um vídeo individual do YouTube."""
     if not verificar_ffmpeg():
         print("⚠️  ffmpeg não encontrado. Instale e adicione ao PATH antes de continuar.")
         return False
     
-    if not verificar_ytdlp():
+    backend = criar_backend(apenas_audio, quality, api, pipeline)
+    if not backend.disponivel():
         print("⚠️  yt-dlp não encontrado. Instale e adicione ao PATH antes de continuar.")
         print("   Execute: pip install yt-dlp")
         return False
     
+    # Usa a URL canônica do vídeo (descarta &list=, youtu.be, music.youtube.com etc.)
+    video_id = extrair_video_id(video_url)
+    if video_id:
+        video_url = url_canonica(video_id)
+    
     # Verifica se o vídeo já foi baixado
     if verifica_biblioteca(video_url) and not force:
         print(f"⏩ Vídeo já registrado na biblioteca: {video_url}. Pulando...")
@@ -656,11 +2877,8 @@ def baixar_video_individual(video_url, apenas_audio=True, quality=None, force=Fa
     download_dir = os.path.join(BIBLIOTECA_PATH, "downloads_puros")
     os.makedirs(download_dir, exist_ok=True)
     
-    # Use 'yt-dlp' command directly
-    yt_dlp_cmd = 'yt-dlp'
-    
     print("\n🔍 Obtendo informações do vídeo...")
-    video_info = obter_info_video(yt_dlp_cmd, video_url)
+    video_info = obter_info_video(backend, video_url)
     
     if not video_info:
         print("❌ Não foi possível obter informações do vídeo.")
@@ -671,7 +2889,8 @@ def baixar_video_individual(video_url, apenas_audio=True, quality=None, force=Fa
         video_info['uploader'] = artist_name
     
     start_time = time.time()
-    result = baixar_video(yt_dlp_cmd, video_url, video_info, download_dir, apenas_audio, quality, force)
+    result = baixar_video(backend, video_url, video_info, download_dir, apenas_audio, force)
+    obter_registro().salvar()
     
     elapsed_time = time.time() - start_time
     minutes, seconds = divmod(int(elapsed_time), 60)
@@ -681,138 +2900,1186 @@ def baixar_video_individual(video_url, apenas_audio=True, quality=None, force=Fa
         return True
     return False
 
-def baixar_playlist(playlist_url, apenas_audio=True, quality=None, force=False, artist_name=None):
-    """Baixa todos os vídeos de uma playlist do YouTube."""
+def _processar_entrada_playlist(backend, video_url, video_info, download_dir, apenas_audio, force, artist_name, idx, total_videos, posicao=None, etapa=None):
+    """Baixa uma entrada da playlist a partir das informações já obtidas. Retorna o mesmo que baixar_video."""
+    try:
+        # Se um nome de artista foi especificado, sobrescreve o valor de uploader
+        if artist_name:
+            video_info['uploader'] = artist_name
+        
+        return baixar_video(backend, video_url, video_info, download_dir, apenas_audio, force, idx, total_videos, posicao, etapa)
+    except Exception as e:
+        # Uma falha em um worker não deve interromper os demais
+        tqdm.write(f"❌ Erro ao processar {video_url}: {str(e)}")
+        if etapa:
+            etapa('falhou', erro=str(e))
+        return False
+
+def _listar_playlist(backend, playlist_url):
+    """Obtém a listagem simples da playlist. Retorna (título, [(posição, ID, URL)]) ou None em caso de erro."""
+    print("\n🔍 Obtendo informações da playlist...")
+    try:
+        playlist_data = backend.info_playlist(playlist_url)
+    except ErroYtdlp as e:
+        print(f"❌ Erro ao obter informações da playlist: {e}")
+        print("   Verifique se a URL é válida.")
+        return None
+    
+    if 'entries' not in playlist_data:
+        print("❌ Não foi possível encontrar vídeos na playlist.")
+        return None
+    
+    entradas = []
+    for idx, entry in enumerate(playlist_data['entries'], start=1):
+        if not entry or not entry.get('id'):
+            continue
+        entradas.append((idx, entry['id'], url_canonica(entry['id'])))
+    return playlist_data.get('title') or playlist_url, entradas
+
+def _enfileirar_playlist(fila, playlist_url, entradas, force):
+    """Coloca as entradas da playlist na fila. Retorna quantas já estavam na biblioteca."""
+    registrados = set()
+    for idx, video_id, video_url in entradas:
+        # Verifica se o vídeo já foi baixado
+        if verifica_biblioteca(video_url) and not force:
+            print(f"⏩ Vídeo já registrado na biblioteca: {video_url}. Pulando...")
+            registrados.add(video_id)
+    
+    fila.enfileirar(playlist_url, entradas, registrados, reiniciar=force)
+    
+    # O registro grava em lotes: downloads concluídos pouco antes de uma interrupção podem ter
+    # ficado só na fila, e são registrados agora
+    for item in fila.itens(playlist_url, ('concluido',)):
+        if item['destino'] and os.path.isfile(item['destino']) and not verifica_biblioteca(item['url']):
+            obter_registro().registrar(item['url'], json.loads(item['metadados'])['artist'], item['destino'])
+    return len(registrados)
+
+def _preparar_downloads(apenas_audio, quality, api, pipeline):
+    """Verifica as dependências e cria o backend e a pasta de downloads. Retorna (backend, pasta) ou None."""
     if not verificar_ffmpeg():
         print("⚠️  ffmpeg não encontrado. Instale e adicione ao PATH antes de continuar.")
-        return False
+        return None
     
-    if not verificar_ytdlp():
+    backend = criar_backend(apenas_audio, quality, api, pipeline)
+    if not backend.disponivel():
         print("⚠️  yt-dlp não encontrado. Instale e adicione ao PATH antes de continuar.")
         print("   Execute: pip install yt-dlp")
-        return False
+        return None
     
     # Garante que a pasta biblioteca existe
     os.makedirs(BIBLIOTECA_PATH, exist_ok=True)
     
     download_dir = os.path.join(BIBLIOTECA_PATH, "downloads_puros")
     os.makedirs(download_dir, exist_ok=True)
+    return backend, download_dir
+
+def _baixar_itens_fila(backend, fila, playlist_url, itens, download_dir, apenas_audio, force, artist_name, jobs):
+    """Processa os itens da fila de uma playlist. Retorna (baixados, pulados, não baixados)."""
+    total_videos = fila.total(playlist_url)
+    contagem = {"baixados": 0, "pulados": 0, "falhos": 0}
     
-    # Use 'yt-dlp' command directly
-    yt_dlp_cmd = 'yt-dlp'
+    def contar(resultado):
+        if resultado:
+            contagem["baixados"] += 1
+        elif resultado is None:
+            contagem["pulados"] += 1
+        else:
+            contagem["falhos"] += 1
     
-    print("\n🔍 Obtendo informações da playlist...")
-    try:
-        result = subprocess.run([yt_dlp_cmd, '--flat-playlist', '-J', playlist_url], 
-                                capture_output=True, text=True, check=True)
-        playlist_data = json.loads(result.stdout)
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Erro ao obter informações da playlist: {e}")
-        return False
-    except json.JSONDecodeError:
-        print("❌ Erro ao processar informações da playlist. Verifique se a URL é válida.")
-        return False
+    def etapa_do(video_id):
+        def etapa(estado, **dados):
+            fila.marcar(playlist_url, video_id, estado, **dados)
+        return etapa
     
-    if 'entries' not in playlist_data:
-        print("❌ Não foi possível encontrar vídeos na playlist.")
+    # Itens que pararam depois de chegar à biblioteca só precisam da marcação
+    pendentes = []
+    for item in itens:
+        if item['destino'] and item['metadados'] and os.path.isfile(item['destino']):
+            metadados = json.loads(item['metadados'])
+            print(f"🏷️  Concluindo a marcação de {item['destino']}")
+            try:
+                finalizar_download(item['destino'], item['url'], metadados, metadados.get('pipeline', False))
+            except Exception as e:
+                print(f"❌ Erro ao marcar {item['destino']}: {str(e)}")
+                fila.marcar(playlist_url, item['video_id'], 'falhou', erro=str(e))
+                contar(False)
+                continue
+            fila.marcar(playlist_url, item['video_id'], 'concluido')
+            contar(True)
+        else:
+            pendentes.append((item['posicao'], item['video_id'], item['url']))
+    
+    # As informações completas de todas as entradas pendentes vêm de uma única execução do yt-dlp
+    if pendentes:
+        print(f"\n🔍 Obtendo informações de {len(pendentes)} vídeos...")
+    fila.marcar(playlist_url, [video_id for _, video_id, _ in pendentes], 'obtendo-info')
+    por_id = {video_id: (idx, video_url) for idx, video_id, video_url in pendentes}
+    recebidos = set()
+    
+    def infos_pendentes():
+        for video_info in obter_info_videos(backend, [video_url for _, _, video_url in pendentes]):
+            video_id = video_info.get('id')
+            if video_id not in por_id or video_id in recebidos:
+                continue
+            recebidos.add(video_id)
+            idx, video_url = por_id[video_id]
+            yield idx, video_id, video_url, video_info
+    
+    if jobs <= 1:
+        for idx, video_id, video_url, video_info in infos_pendentes():
+            contar(_processar_entrada_playlist(backend, video_url, video_info, download_dir, apenas_audio, force, artist_name,
+                                               idx, total_videos, etapa=etapa_do(video_id)))
+    elif pendentes:
+        print(f"\n⚙️  Baixando {len(pendentes)} vídeos com {jobs} downloads simultâneos...")
+        # Cada worker ocupa uma linha fixa do terminal para a sua barra de progresso
+        posicoes_livres = queue.Queue()
+        for posicao in range(1, jobs + 1):
+            posicoes_livres.put(posicao)
+        
+        def worker(idx, video_id, video_url, video_info):
+            posicao = posicoes_livres.get()
+            try:
+                return _processar_entrada_playlist(backend, video_url, video_info, download_dir, apenas_audio, force, artist_name,
+                                                   idx, total_videos, posicao, etapa_do(video_id))
+            finally:
+                posicoes_livres.put(posicao)
+        
+        pbar_geral = tqdm(total=len(pendentes), desc="Playlist", unit="vídeo", position=0)
+        executor = ThreadPoolExecutor(max_workers=jobs)
+        try:
+            # Os downloads começam assim que as informações de cada vídeo chegam
+            futuros = []
+            for idx, video_id, video_url, video_info in infos_pendentes():
+                futuro = executor.submit(worker, idx, video_id, video_url, video_info)
+                futuro.add_done_callback(lambda _: pbar_geral.update(1))
+                futuros.append(futuro)
+            pbar_geral.update(len(pendentes) - len(recebidos))
+            
+            for futuro in as_completed(futuros):
+                contar(futuro.result())
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            pbar_geral.close()
+        executor.shutdown()
+    
+    # Entradas cujas informações não puderam ser obtidas
+    sem_info = [video_id for _, video_id, _ in pendentes if video_id not in recebidos]
+    fila.marcar(playlist_url, sem_info, 'falhou', erro="informações do vídeo indisponíveis")
+    contagem["falhos"] += len(sem_info)
+    return contagem["baixados"], contagem["pulados"], contagem["falhos"]
+
+def baixar_playlist(playlist_url, apenas_audio=True, quality=None, force=False, artist_name=None, jobs=1, api=False, pipeline=False, retentar=False):
+    """Baixa todos os vídeos de uma playlist do YouTube.
+    
+    As entradas passam pela fila persistente: se a fila da playlist tiver itens
+    inacabados, a execução continua deles sem listar a playlist de novo. Com
+    `retentar`, só os itens que falharam são processados.
+    """
+    preparo = _preparar_downloads(apenas_audio, quality, api, pipeline)
+    if preparo is None:
         return False
+    backend, download_dir = preparo
     
-    entries = playlist_data['entries']
-    total_videos = len(entries)
-    videos_baixados = 0
+    fila = obter_fila()
     videos_pulados = 0
-    
     start_time = time.time()
     
-    for idx, entry in enumerate(entries, start=1):
-        if not entry:
+    if retentar:
+        itens = fila.itens(playlist_url, ('falhou',))
+        if not itens:
+            print("✅ Nenhum item com falha na fila desta playlist.")
+            return True
+        print(f"\n🔁 Tentando de novo {len(itens)} itens que falharam...")
+    else:
+        itens = [] if force else fila.itens(playlist_url, ESTADOS_INACABADOS)
+        if itens:
+            print(f"\n⏯️  Retomando a fila da playlist: {len(itens)} itens inacabados...")
+        else:
+            listagem = _listar_playlist(backend, playlist_url)
+            if listagem is None:
+                return False
+            videos_pulados = _enfileirar_playlist(fila, playlist_url, listagem[1], force)
+            itens = fila.itens(playlist_url, ESTADOS_INACABADOS)
+    
+    videos_baixados, pulados_fila, videos_falhos = _baixar_itens_fila(backend, fila, playlist_url, itens, download_dir,
+                                                                      apenas_audio, force, artist_name, jobs)
+    videos_pulados += pulados_fila
+    obter_registro().salvar()
+    
+    elapsed_time = time.time() - start_time
+    minutes, seconds = divmod(int(elapsed_time), 60)
+    
+    print(f"\n✅ Download concluído em {minutes}min {seconds}s!")
+    print(f"📊 Resumo: {videos_baixados} vídeos baixados, {videos_pulados} pulados, {videos_falhos} não baixados.")
+    falhas = fila.resumo(playlist_url).get('falhou', 0)
+    if falhas:
+        print(f"ℹ️ {falhas} itens da playlist estão com falha na fila; use --retentar-falhas para tentar de novo.")
+    
+    return True
+
+def ler_lista_playlists(alvo):
+    """Interpreta o alvo do --sync: um arquivo com uma URL de playlist por linha (# inicia comentário) ou uma URL."""
+    if not os.path.isfile(alvo):
+        return [alvo]
+    with open(alvo, 'r', encoding='utf-8') as f:
+        urls = [linha.split('#', 1)[0].strip() for linha in f]
+    # Mantém a ordem do arquivo, sem repetir playlists
+    return list(dict.fromkeys(url for url in urls if url))
+
+def _remover_ausentes(fila, playlist_url, removidos, simular=False):
+    """Apaga da biblioteca os vídeos que saíram da playlist e não estão em outra playlist sincronizada."""
+    em_outras = obter_snapshots().ids_em_outras(playlist_url)
+    registro = obter_registro()
+    cache = obter_cache_scan()
+    apagados = []
+    for video_id in removidos:
+        video_url = url_canonica(video_id)
+        caminho = registro.caminho(video_url)
+        if video_id in em_outras or not caminho or not os.path.isfile(caminho):
             continue
-        
-        video_id = entry.get('id')
-        if not video_id:
+        print(f"🗑️  {'Seria removido' if simular else 'Removendo'}: {caminho}")
+        if simular:
             continue
-        
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        # Verifica se o vídeo já foi baixado
-        if verifica_biblioteca(video_url) and not force:
-            print(f"⏩ Vídeo já registrado na biblioteca: {video_url}. Pulando...")
-            videos_pulados += 1
+        try:
+            os.remove(caminho)
+        except OSError as e:
+            print(f"❌ Erro ao remover {caminho}: {e}")
             continue
-        
-        video_info = obter_info_video(yt_dlp_cmd, video_url)
-        if not video_info:
+        registro.remover(video_url)
+        cache.remover([os.path.relpath(caminho, BIBLIOTECA_PATH)])
+        apagados.append(video_id)
+    fila.remover(playlist_url, apagados)
+    return len(apagados)
+
+def sincronizar_playlists(alvo, apenas_audio=True, quality=None, force=False, artist_name=None, jobs=1, api=False, pipeline=False,
+                          remover_ausentes=False, simular=False, max_tentativas=SYNC_MAX_TENTATIVAS):
+    """Sincroniza uma ou mais playlists com a biblioteca, baixando só as entradas novas.
+    
+    A listagem de cada playlist é comparada com o snapshot da sincronização anterior:
+    só os IDs novos são verificados e enfileirados, e são baixados junto com os itens
+    inacabados e os que falharam em sincronizações anteriores, enquanto ainda estiverem
+    na playlist e tiverem menos de `max_tentativas` falhas. Os IDs que saíram da
+    playlist são relatados e, com `remover_ausentes`, os arquivos deles são apagados se
+    não estiverem em outra playlist sincronizada.
+    """
+    playlists = ler_lista_playlists(alvo)
+    if not playlists:
+        print(f"❌ Nenhuma playlist encontrada em {alvo}.")
+        return False
+    preparo = _preparar_downloads(apenas_audio, quality, api, pipeline)
+    if preparo is None:
+        return False
+    backend, download_dir = preparo
+    
+    fila = obter_fila()
+    snapshots = obter_snapshots()
+    totais = {"novos": 0, "baixados": 0, "pulados": 0, "falhos": 0, "removidos": 0, "erros": 0}
+    start_time = time.time()
+    
+    for numero, playlist_url in enumerate(playlists, 1):
+        print(f"\n🔄 [{numero}/{len(playlists)}] Sincronizando {playlist_url}")
+        listagem = _listar_playlist(backend, playlist_url)
+        if listagem is None:
+            totais["erros"] += 1
             continue
+        titulo, entradas = listagem
         
-        # Se um nome de artista foi especificado, sobrescreve o valor de uploader
-        if artist_name:
-            video_info['uploader'] = artist_name
+        anteriores = snapshots.obter(playlist_url)
+        conhecidos = set(anteriores or [])
+        atuais = [video_id for _, video_id, _ in entradas]
+        novos = [entrada for entrada in entradas if entrada[1] not in conhecidos]
+        na_listagem = set(atuais)
+        removidos = [video_id for video_id in anteriores or [] if video_id not in na_listagem]
+        print(f"📋 {titulo}: {len(entradas)} entradas, {len(novos)} novas, {len(removidos)} removidas.")
         
-        if baixar_video(yt_dlp_cmd, video_url, video_info, download_dir, apenas_audio, quality, force, idx, total_videos):
-            videos_baixados += 1
+        if not simular:
+            totais["pulados"] += _enfileirar_playlist(fila, playlist_url, novos, force)
+            # O snapshot só avança depois que as entradas novas estão na fila, que garante o download delas
+            snapshots.gravar(playlist_url, titulo, atuais)
+            # Os itens que falharam voltam ao lote (como o snapshot já contém os IDs deles, não
+            # apareceriam de novo como entradas novas), a não ser que tenham saído da playlist
+            # ou esgotado as tentativas
+            itens = fila.itens(playlist_url, ESTADOS_INACABADOS)
+            desistidos = 0
+            for item in fila.itens(playlist_url, ('falhou',)):
+                if item['video_id'] not in na_listagem:
+                    continue
+                if item['tentativas'] >= max_tentativas:
+                    desistidos += 1
+                    continue
+                itens.append(item)
+            if desistidos:
+                print(f"ℹ️ {desistidos} itens falharam {max_tentativas} vezes e não serão tentados de novo "
+                      "(use -p com --retentar-falhas para forçar).")
+            baixados, pulados, falhos = _baixar_itens_fila(backend, fila, playlist_url, itens, download_dir,
+                                                           apenas_audio, force, artist_name, jobs)
+            totais["baixados"] += baixados
+            totais["pulados"] += pulados
+            totais["falhos"] += falhos
+        else:
+            for _, video_id, video_url in novos:
+                print(f"  ➕ {video_url}")
+        totais["novos"] += len(novos)
+        
+        for video_id in removidos:
+            print(f"  ➖ {url_canonica(video_id)} saiu da playlist")
+        if removidos and remover_ausentes:
+            totais["removidos"] += _remover_ausentes(fila, playlist_url, removidos, simular)
+    
+    obter_registro().salvar()
+    obter_cache_scan().salvar()
     
     elapsed_time = time.time() - start_time
     minutes, seconds = divmod(int(elapsed_time), 60)
+    print(f"\n✅ Sincronização concluída em {minutes}min {seconds}s!")
+    print(f"📊 Resumo: {len(playlists)} playlists, {totais['novos']} entradas novas, {totais['baixados']} vídeos baixados, "
+          f"{totais['pulados']} pulados, {totais['falhos']} não baixados, {totais['removidos']} arquivos removidos, {totais['erros']} playlists com erro.")
+    if simular:
+        print("ℹ️ Simulação: nada foi baixado nem removido, e os snapshots não mudaram.")
+    return totais["erros"] < len(playlists)
+
+# Tags de texto regravadas em massa: campo -> (chave MP4, quadro ID3)
+_CAMPOS_TAGS = {
+    "titulo": ('\xa9nam', TIT2),
+    "artista": ('\xa9ART', TPE1),
+    "album": ('\xa9alb', TALB),
+}
+
+def aplicar_tags(caminho, tags, simular=False):
+    """Aplica ao arquivo, em uma única gravação, as tags que diferem das atuais.
     
-    print(f"\n✅ Download concluído em {minutes}min {seconds}s!")
-    print(f"📊 Resumo: {videos_baixados} vídeos baixados, {videos_pulados} pulados.")
+    `tags` mapeia campos de _CAMPOS_TAGS para o valor desejado. Arquivos já corretos não
+    são gravados; com `simular`, nada é gravado. Retorna {campo: (valor atual, novo valor)}.
+    """
+    if caminho.lower().endswith('.mp3'):
+        try:
+            audio = ID3(caminho)
+        except ID3NoHeaderError:
+            audio = ID3()
+        atuais = {campo: str(audio[quadro.__name__].text[0]) if audio.get(quadro.__name__) and audio[quadro.__name__].text else ''
+                  for campo, (_, quadro) in _CAMPOS_TAGS.items()}
+    else:
+        audio = MP4(caminho)
+        atuais = {campo: str(audio[chave][0]) if audio.get(chave) else ''
+                  for campo, (chave, _) in _CAMPOS_TAGS.items()}
     
-    return True
+    mudancas = {campo: (atuais[campo], valor) for campo, valor in tags.items() if atuais[campo] != valor}
+    if not mudancas or simular:
+        return mudancas
+    
+    for campo, (_, valor) in mudancas.items():
+        chave, quadro = _CAMPOS_TAGS[campo]
+        if isinstance(audio, ID3):
+            audio.add(quadro(encoding=3, text=[valor]))
+        else:
+            audio[chave] = [valor]
+    if isinstance(audio, ID3):
+        audio.save(caminho)
+    else:
+        audio.save()
+    return mudancas
 
-def atualizar_metadados_existentes():
-    """Atualiza os metadados de todos os arquivos existentes na biblioteca."""
+def _tags_pelo_nome(pasta_artista, arquivo):
+    """Deduz artista, título e álbum da pasta e do nome do arquivo (artista_titulo_album)."""
+    nome_sem_ext = os.path.splitext(arquivo)[0]
+    partes = nome_sem_ext.split('_')
+    
+    # O padrão é: artista_titulo_album
+    tags = {
+        "artista": pasta_artista,  # Usa o nome da pasta como artista
+        "titulo": nome_sem_ext,  # Por padrão, usa o nome inteiro como título
+        "album": "YouTube",  # Valor padrão
+    }
+    # Tenta extrair mais informações do nome, se possível
+    if len(partes) >= 2:
+        tags["titulo"] = partes[1]
+    if len(partes) >= 3:
+        tags["album"] = partes[2]
+    return tags
+
+def atualizar_metadados_existentes(simular=False, workers=TAG_WORKERS):
+    """Atualiza os metadados de todos os arquivos existentes na biblioteca.
+    
+    As tags esperadas vêm da pasta do artista e do nome do arquivo. Cada arquivo é
+    comparado com elas e, se algo mudou, gravado uma única vez; as gravações rodam em
+    um pool de `workers` threads. Com `simular`, apenas relata o que seria alterado.
+    """
     print("\n🔍 Procurando arquivos na biblioteca para atualizar metadados...")
-    total_arquivos = 0
-    atualizados = 0
-    falhas = 0
     
-    for pasta_artista in os.listdir(BIBLIOTECA_PATH):
+    tarefas = []
+    for pasta_artista in sorted(os.listdir(BIBLIOTECA_PATH)):
         caminho_pasta = os.path.join(BIBLIOTECA_PATH, pasta_artista)
         
-        # Ignora a pasta de downloads e arquivos (como o CSV)
-        if not os.path.isdir(caminho_pasta) or pasta_artista == "downloads_puros":
+        # Ignora a pasta de downloads, os caches e arquivos (como o CSV)
+        if not os.path.isdir(caminho_pasta) or eh_pasta_interna(pasta_artista):
             continue
         
-        for arquivo in os.listdir(caminho_pasta):
+        for arquivo in sorted(os.listdir(caminho_pasta)):
             caminho_arquivo = os.path.join(caminho_pasta, arquivo)
-            if not os.path.isfile(caminho_arquivo):
-                continue
-                
             ext = os.path.splitext(arquivo)[1].lower()
-            if ext not in ['.mp3', '.m4a']:
-                continue
-                
-            total_arquivos += 1
-            print(f"\n📄 Processando arquivo: {arquivo}")
-            
-            # Extrair informações do nome do arquivo
-            nome_sem_ext = os.path.splitext(arquivo)[0]
-            partes = nome_sem_ext.split('_')
-            
-            # O padrão é: artista_titulo_album
-            artista = pasta_artista  # Usa o nome da pasta como artista
-            titulo = nome_sem_ext  # Por padrão, usa o nome inteiro como título
-            album = "YouTube"  # Valor padrão
-            
-            # Tenta extrair mais informações do nome, se possível
-            if len(partes) >= 2:
-                titulo = partes[1]
-            if len(partes) >= 3:
-                album = partes[2]
-                
-            # Atualiza os metadados
-            if definir_metadados(caminho_arquivo, artista, titulo, album):
+            if ext in ('.mp3', '.m4a') and os.path.isfile(caminho_arquivo):
+                tarefas.append((caminho_arquivo, _tags_pelo_nome(pasta_artista, arquivo)))
+    
+    total_arquivos = len(tarefas)
+    if total_arquivos == 0:
+        print("\n❓ Nenhum arquivo de áudio encontrado na biblioteca.")
+        return False
+    
+    atualizados = 0
+    falhas = 0
+    
+    def processar(tarefa):
+        caminho_arquivo, tags = tarefa
+        try:
+            return caminho_arquivo, aplicar_tags(caminho_arquivo, tags, simular), None
+        except Exception as e:
+            return caminho_arquivo, None, e
+    
+    descricao = "Simulando atualização" if simular else "Atualizando metadados"
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for caminho_arquivo, mudancas, erro in tqdm(executor.map(processar, tarefas), total=total_arquivos,
+                                                    desc=descricao, unit="arquivo"):
+            nome = os.path.relpath(caminho_arquivo, BIBLIOTECA_PATH)
+            if erro is not None:
+                falhas += 1
+                tqdm.write(f"❌ Erro ao definir metadados de {nome}: {erro}")
+            elif mudancas:
                 atualizados += 1
+                if simular:
+                    detalhes = "; ".join(f"{campo}: '{antes}' → '{depois}'" for campo, (antes, depois) in mudancas.items())
+                    tqdm.write(f"📝 {nome}: {detalhes}")
+    
+    if simular:
+        print(f"\n🔎 Simulação concluída: nenhum arquivo foi gravado.")
+        print(f"📊 Resumo: {total_arquivos} arquivos encontrados, {atualizados} seriam atualizados, {falhas} falhas.")
+    else:
+        print(f"\n✅ Atualização de metadados concluída!")
+        print(f"📊 Resumo: {total_arquivos} arquivos encontrados, {atualizados} atualizados, "
+              f"{total_arquivos - atualizados - falhas} já corretos, {falhas} falhas.")
+    
+    return atualizados > 0 or falhas == 0
+
+def encolher_capas_biblioteca(politica=None):
+    """Reduz as capas já embutidas na biblioteca que excedem a política de capas."""
+    politica = politica or POLITICA_CAPA
+    if Image is None:
+        print("❌ Pillow não encontrado. Execute: pip install Pillow")
+        return False
+    
+    arquivos = [entrada.path for entrada in listar_arquivos_audio(extensoes=('.m4a', '.mp3'))]
+    
+    reduzidos = 0
+    bytes_economizados = 0
+    falhas = 0
+    
+    for caminho in tqdm(arquivos, desc="Verificando capas", unit="arquivo"):
+        try:
+            if caminho.lower().endswith('.m4a'):
+                audio = MP4(caminho)
+                capas = audio.get('covr') or []
+                if not capas or not capa_excede_politica(bytes(capas[0]), politica):
+                    continue
+                nova = ajustar_capa(bytes(capas[0]), politica)
+                audio['covr'] = [MP4Cover(nova, MP4Cover.FORMAT_JPEG)] + list(capas[1:])
+                antes = len(capas[0])
             else:
+                try:
+                    audio = ID3(caminho)
+                except ID3NoHeaderError:
+                    continue  # MP3 sem tags: sem capa
+                apics = audio.getall('APIC')
+                if not apics or not capa_excede_politica(apics[0].data, politica):
+                    continue
+                antes = len(apics[0].data)
+                nova = ajustar_capa(apics[0].data, politica)
+                apics[0].data = nova
+                apics[0].mime = 'image/jpeg'
+            audio.save()
+            reduzidos += 1
+            bytes_economizados += antes - len(nova)
+        except Exception as e:
+            falhas += 1
+            tqdm.write(f"⚠️ Erro ao reduzir capa de {caminho}: {str(e)}")
+    
+    print(f"\n✅ Redução de capas concluída!")
+    print(f"📊 Resumo: {len(arquivos)} arquivos verificados, {reduzidos} capas reduzidas "
+          f"({bytes_economizados / (1024 * 1024):.1f} MB economizados), {falhas} falhas.")
+    return falhas == 0
+
+def trechos_audio(f, extensao):
+    """Retorna os trechos (início, fim) do arquivo que contêm o áudio, sem as tags.
+    
+    Em M4A são os dados das caixas mdat; em MP3, o que fica entre as tags ID3v2 do
+    início e as tags APEv2/ID3v1 do fim. Reescrever as tags não altera esses trechos.
+    """
+    tamanho = os.fstat(f.fileno()).st_size
+    if extensao == '.m4a':
+        trechos = [(dados, final) for tipo, dados, final in _caixas_mp4(f, 0, tamanho) if tipo == b'mdat']
+        if not trechos:
+            raise ValueError("caixa mdat não encontrada")
+        return trechos
+    
+    inicio = 0
+    f.seek(0)
+    cabecalho = f.read(10)
+    # Pode haver mais de uma tag ID3v2 seguida (por exemplo, gravadas por programas diferentes)
+    while len(cabecalho) == 10 and cabecalho[:3] == b'ID3':
+        inicio += 10 + _syncsafe(cabecalho[6:10]) + (10 if cabecalho[3] == 4 and cabecalho[5] & 0x10 else 0)
+        f.seek(inicio)
+        cabecalho = f.read(10)
+    
+    fim = tamanho
+    f.seek(max(fim - 128, 0))
+    if f.read(3) == b'TAG':
+        fim -= 128
+    if fim - 32 >= inicio:
+        f.seek(fim - 32)
+        rodape = f.read(32)
+        if rodape[:8] == b'APETAGEX':
+            tamanho_ape, _, flags = struct.unpack('<III', rodape[12:24])
+            fim -= tamanho_ape + (32 if flags & 0x80000000 else 0)  # O cabeçalho APE não entra no tamanho
+    return [(inicio, max(inicio, fim))]
+
+def hash_conteudo(arquivo, tamanho_bloco=HASH_BLOCO):
+    """Calcula o SHA-1 do áudio de um arquivo M4A ou MP3, ignorando as tags.
+    
+    O arquivo é mapeado em memória e entregue ao SHA-1 em blocos, sem cópias; o hashlib
+    libera o GIL nesses blocos, então vários arquivos podem ser processados em paralelo.
+    """
+    resumo = hashlib.sha1()
+    with open(arquivo, 'rb') as f:
+        trechos = [(inicio, fim) for inicio, fim in trechos_audio(f, os.path.splitext(arquivo)[1].lower()) if fim > inicio]
+        if not trechos:
+            return resumo.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            visao = memoryview(mapa)
+            try:
+                for inicio, fim in trechos:
+                    for pos in range(inicio, fim, tamanho_bloco):
+                        resumo.update(visao[pos:min(pos + tamanho_bloco, fim)])
+            finally:
+                visao.release()
+    return resumo.hexdigest()
+
+def indexar_hashes_conteudo(workers=SCAN_WORKERS):
+    """Calcula o hash do conteúdo dos arquivos novos ou alterados e o guarda no cache de escaneamento.
+    
+    Retorna {caminho relativo: (hash, stat)} de todos os arquivos de áudio da biblioteca.
+    """
+    cache = obter_cache_scan()
+    hashes = {}
+    pendentes = []
+    for entrada in listar_arquivos_audio(extensoes=('.m4a', '.mp3')):
+        caminho_relativo = os.path.relpath(entrada.path, BIBLIOTECA_PATH)
+        info = entrada.stat()
+        conteudo_hash = cache.obter_hash(caminho_relativo, info)
+        if conteudo_hash:
+            hashes[caminho_relativo] = (conteudo_hash, info)
+        else:
+            pendentes.append((entrada.path, caminho_relativo, info))
+    
+    def calcular(item):
+        caminho, caminho_relativo, info = item
+        try:
+            # As tags vão junto para o cache, que guarda as duas coisas na mesma linha
+            metadados = cache.obter(caminho_relativo, info) or obter_metadados(caminho)
+            return item, metadados, hash_conteudo(caminho), None
+        except Exception as e:
+            return item, None, None, e
+    
+    falhas = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (caminho, caminho_relativo, info), metadados, conteudo_hash, erro in tqdm(
+                executor.map(calcular, pendentes), total=len(pendentes), desc="Calculando hashes", unit="arquivo"):
+            if erro is not None:
                 falhas += 1
+                tqdm.write(f"⚠️ Hash não calculado para {caminho_relativo}: {erro}")
+                continue
+            cache.atualizar(caminho_relativo, info, metadados, conteudo_hash)
+            hashes[caminho_relativo] = (conteudo_hash, info)
+    
+    cache.remover(cache.caminhos() - set(hashes) - {p[1] for p in pendentes})
+    cache.salvar()
+    print(f"🔑 Hashes: {len(pendentes) - falhas} calculados, {len(hashes) - len(pendentes) + falhas} do cache, {falhas} falhas.")
+    return hashes
+
+def _prioridade_original(item):
+    """Ordena as cópias de um grupo: primeiro as sem sufixo _alt, depois o caminho mais curto e o arquivo mais antigo."""
+    caminho_relativo, (_, info) = item
+    nome_base = os.path.splitext(os.path.basename(caminho_relativo))[0]
+    return (bool(re.search(r'_alt\d*$', nome_base)), len(caminho_relativo), info.st_mtime_ns, caminho_relativo)
+
+def _arquivos_identicos(a, b):
+    """Compara dois arquivos byte a byte pelo tamanho e pelo SHA-1 do arquivo inteiro."""
+    tamanho = os.path.getsize(a)
+    if tamanho != os.path.getsize(b):
+        return False
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        return _hash_trecho(fa, 0, tamanho) == _hash_trecho(fb, 0, tamanho)
+
+def _substituir_por_link(original, copia):
+    """Troca `copia` por um hardlink para `original`, sem deixar a cópia ausente em nenhum momento."""
+    temporario = os.path.join(os.path.dirname(copia), f".{os.path.basename(copia)}.{os.getpid()}.link")
+    os.link(original, temporario)
+    try:
+        os.replace(temporario, copia)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+def deduplicar_biblioteca(acao=None, simular=False, workers=SCAN_WORKERS):
+    """Relata os arquivos com o mesmo áudio e, com `acao`, elimina as cópias.
     
-    print(f"\n✅ Atualização de metadados concluída!")
-    print(f"📊 Resumo: {total_arquivos} arquivos encontrados, {atualizados} atualizados, {falhas} falhas.")
+    Em cada grupo fica o arquivo sem sufixo _alt, de caminho mais curto e mais antigo.
+    Com acao='hardlink', cópias idênticas byte a byte viram hardlinks para ele (cópias só
+    com tags diferentes são mantidas, para não perder as tags); com acao='remover', as
+    cópias são apagadas e o registro de downloads passa a apontar para o arquivo mantido.
+    """
+    hashes = indexar_hashes_conteudo(workers)
+    grupos = {}
+    for caminho_relativo, (conteudo_hash, info) in hashes.items():
+        grupos.setdefault(conteudo_hash, []).append((caminho_relativo, (conteudo_hash, info)))
+    duplicados = sorted((sorted(membros, key=_prioridade_original) for membros in grupos.values() if len(membros) > 1),
+                        key=lambda membros: membros[0][0])
+    if not duplicados:
+        print("\n✅ Nenhum arquivo duplicado encontrado.")
+        return True
     
-    if total_arquivos == 0:
-        print("\n❓ Nenhum arquivo de áudio encontrado na biblioteca.")
+    cache = obter_cache_scan()
+    recuperavel = recuperado = 0
+    mantidos_com_tags = 0
+    print(f"\n🧬 {len(duplicados)} grupos de arquivos com o mesmo áudio:")
+    for numero, membros in enumerate(duplicados, 1):
+        original, (conteudo_hash, info_original) = membros[0]
+        caminho_original = os.path.join(BIBLIOTECA_PATH, original)
+        print(f"\n  Grupo {numero} (mantém {original}):")
+        inodes = {(info_original.st_dev, info_original.st_ino)}
+        for copia, (_, info) in membros[1:]:
+            caminho_copia = os.path.join(BIBLIOTECA_PATH, copia)
+            tamanho_mb = info.st_size / (1024 * 1024)
+            if (info.st_dev, info.st_ino) in inodes:
+                print(f"    • {copia} (já é hardlink)")
+                continue
+            inodes.add((info.st_dev, info.st_ino))
+            recuperavel += info.st_size
+            
+            if acao == 'hardlink':
+                if info.st_dev != info_original.st_dev or not _arquivos_identicos(caminho_original, caminho_copia):
+                    mantidos_com_tags += 1
+                    print(f"    • {copia} ({tamanho_mb:.1f} MB, tags diferentes: mantido)")
+                    continue
+                print(f"    • {copia} ({tamanho_mb:.1f} MB) → hardlink")
+                if simular:
+                    continue
+                try:
+                    _substituir_por_link(caminho_original, caminho_copia)
+                except OSError as e:
+                    print(f"      ❌ Erro ao criar o hardlink: {e}")
+                    continue
+                # Mesmo conteúdo do original: as tags em cache dele valem para a cópia
+                metadados = cache.obter(original, info_original)
+                if metadados is not None:
+                    cache.atualizar(copia, os.stat(caminho_copia), metadados, conteudo_hash)
+                else:
+                    cache.remover([copia])
+                recuperado += info.st_size
+            elif acao == 'remover':
+                print(f"    • {copia} ({tamanho_mb:.1f} MB) → removido")
+                if simular:
+                    continue
+                try:
+                    os.remove(caminho_copia)
+                except OSError as e:
+                    print(f"      ❌ Erro ao remover: {e}")
+                    continue
+                cache.remover([copia])
+                obter_registro().mover_caminho(caminho_copia, caminho_original)
+                recuperado += info.st_size
+            else:
+                print(f"    • {copia} ({tamanho_mb:.1f} MB)")
+    cache.salvar()
+    
+    print(f"\n📊 Resumo: {sum(len(m) for m in duplicados)} arquivos em {len(duplicados)} grupos; "
+          f"{recuperavel / (1024 * 1024):.1f} MB em cópias.")
+    if mantidos_com_tags:
+        print(f"ℹ️ {mantidos_com_tags} cópias têm tags diferentes e não viraram hardlink; use --deduplicar remover para apagá-las.")
+    if acao and simular:
+        print("ℹ️ Simulação: nenhum arquivo foi alterado.")
+    elif acao:
+        print(f"✅ {recuperado / (1024 * 1024):.1f} MB liberados.")
+    return True
+
+# Fingerprints calculadas pelo Chromaprint (fpcalc) ou, sem ele, pelo método de
+# Haitsma-Kalker com numpy: cada quadro vira um inteiro de 32 bits
+_FPCALC = shutil.which('fpcalc')
+_TAXA_HAITSMA = 5512
+_QUADRO_HAITSMA, _PASSO_HAITSMA = 2048, 256
+_QUADROS_POR_SEGUNDO = {"chromaprint": 11025 / 1365, "haitsma": _TAXA_HAITSMA / _PASSO_HAITSMA}
+
+# Índice invertido: os 24 bits mais altos de alguns quadros por segundo de cada faixa apontam
+# para (faixa, quadro). Uma busca conta, para cada faixa, quantos quadros coincidem em cada
+# alinhamento; só as mais votadas têm os bits comparados, e só naquele alinhamento
+_BITS_CHAVE = 24
+_TERMOS_POR_SEGUNDO = 3
+_VOTOS_MIN = 3
+_FOLGA_ALINHAMENTO = 2  # Quadros de folga em torno do alinhamento votado
+
+def algoritmo_fingerprint():
+    """Retorna o algoritmo de fingerprint disponível ('chromaprint' ou 'haitsma'), ou None."""
+    if _FPCALC:
+        return "chromaprint"
+    if np is not None:
+        return "haitsma"
+    return None
+
+def _fingerprint_haitsma(arquivo, segundos):
+    """Calcula a fingerprint de Haitsma-Kalker a partir do PCM mono decodificado pelo ffmpeg.
+    
+    Para cada quadro, a energia de 33 bandas logarítmicas entre 300 e 2000 Hz; cada bit
+    indica se a diferença de energia entre bandas vizinhas cresceu em relação ao quadro anterior.
+    """
+    resultado = subprocess.run(['ffmpeg', '-v', 'error', '-i', arquivo, '-t', str(segundos), '-ac', '1',
+                                '-ar', str(_TAXA_HAITSMA), '-f', 's16le', '-'],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.decode('utf-8', 'replace').strip() or "ffmpeg falhou")
+    amostras = np.frombuffer(resultado.stdout, dtype='<i2').astype(np.float32)
+    if len(amostras) < _QUADRO_HAITSMA * 2:
+        return None
+    
+    quadros = np.lib.stride_tricks.sliding_window_view(amostras, _QUADRO_HAITSMA)[::_PASSO_HAITSMA]
+    espectro = np.abs(np.fft.rfft(quadros * np.hanning(_QUADRO_HAITSMA), axis=1)) ** 2
+    frequencias = np.fft.rfftfreq(_QUADRO_HAITSMA, 1 / _TAXA_HAITSMA)
+    bordas = np.searchsorted(frequencias, np.geomspace(300, 2000, 34))
+    acumulado = np.cumsum(espectro, axis=1)
+    energias = acumulado[:, bordas[1:] - 1] - acumulado[:, bordas[:-1] - 1]
+    
+    diferencas = energias[:, :-1] - energias[:, 1:]
+    bits = (diferencas[1:] - diferencas[:-1]) > 0
+    return (bits.astype(np.uint64) << np.arange(32, dtype=np.uint64)).sum(axis=1).astype(np.uint32)
+
+def _fingerprint_chromaprint(arquivo, segundos):
+    """Calcula a fingerprint com o fpcalc (Chromaprint), em formato bruto."""
+    resultado = subprocess.run([_FPCALC, '-raw', '-length', str(segundos), arquivo],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip() or "fpcalc falhou")
+    for linha in resultado.stdout.splitlines():
+        if linha.startswith('FINGERPRINT='):
+            valores = [int(v) & 0xFFFFFFFF for v in linha.split('=', 1)[1].split(',') if v]
+            return np.array(valores, dtype=np.uint32) if np is not None else valores
+    return None
+
+def calcular_fingerprint(arquivo, segundos=None, algoritmo=None):
+    """Calcula a fingerprint acústica dos primeiros `segundos` de um arquivo de áudio."""
+    algoritmo = algoritmo or algoritmo_fingerprint()
+    segundos = segundos or POLITICA_DUPLICATAS["segundos"]
+    if algoritmo == "chromaprint":
+        return _fingerprint_chromaprint(arquivo, segundos)
+    return _fingerprint_haitsma(arquivo, segundos)
+
+def _fingerprint_para_blob(valores):
+    return struct.pack(f'<{len(valores)}I', *(int(v) for v in valores))
+
+def _fingerprint_de_blob(dados):
+    if np is not None:
+        return np.frombuffer(dados, dtype='<u4')
+    return list(struct.unpack(f'<{len(dados) // 4}I', dados))
+
+def similaridade_fingerprints(a, b, deslocamento_max=None, centro=0):
+    """Compara duas fingerprints: 1 - taxa de bits diferentes na melhor sobreposição.
+    
+    A mais curta desliza sobre a mais longa (com pelo menos metade dela sobreposta), o
+    que permite comparar um trecho com a faixa inteira. `deslocamento_max` limita o
+    deslocamento, em quadros, a até tantos quadros de `centro`, o alinhamento em que o
+    quadro 0 de `a` corresponde ao quadro `centro` de `b`.
+    """
+    curta, longa = (a, b) if len(a) <= len(b) else (b, a)
+    if not len(curta):
+        return 0.0
+    if curta is not a:
+        centro = -centro
+    minimo = max(len(curta) // 2, 1)
+    inicio, fim = -(len(curta) - minimo), len(longa) - minimo
+    if deslocamento_max is not None:
+        inicio, fim = max(inicio, centro - deslocamento_max), min(fim, centro + deslocamento_max)
+    
+    melhor = 0.0
+    for deslocamento in range(inicio, fim + 1):
+        ini_curta, ini_longa = max(0, -deslocamento), max(0, deslocamento)
+        n = min(len(curta) - ini_curta, len(longa) - ini_longa)
+        if n < minimo:
+            continue
+        if np is not None:
+            xor = np.bitwise_xor(curta[ini_curta:ini_curta + n], longa[ini_longa:ini_longa + n])
+            erros = int(np.unpackbits(xor.view(np.uint8)).sum())
+        else:
+            erros = sum(bin(x ^ y).count('1') for x, y in zip(curta[ini_curta:ini_curta + n], longa[ini_longa:ini_longa + n]))
+        melhor = max(melhor, 1 - erros / (32 * n))
+    return melhor
+
+def _termos_fingerprint(valores, algoritmo):
+    """Gera (chave, quadro) dos quadros de uma fingerprint que entram no índice invertido.
+    
+    Entram alguns quadros por segundo (_TERMOS_POR_SEGUNDO); quadros de silêncio (todos
+    os bits iguais) e repetidos do quadro anterior não ajudam a distinguir faixas e ficam de fora.
+    """
+    passo = max(1, round(_QUADROS_POR_SEGUNDO[algoritmo] / _TERMOS_POR_SEGUNDO))
+    valores = valores.tolist() if hasattr(valores, 'tolist') else valores
+    for quadro in range(0, len(valores), passo):
+        valor = valores[quadro]
+        if valor in (0, 0xFFFFFFFF) or (quadro and valores[quadro - 1] == valor):
+            continue
+        yield valor >> (32 - _BITS_CHAVE), quadro
+
+class IndiceFingerprints:
+    """Índice das fingerprints acústicas da biblioteca, guardado no banco da biblioteca.
+    
+    Como no cache de escaneamento, cada arquivo é validado por inode, tamanho e mtime.
+    Além da fingerprint inteira, cada faixa tem termos em um índice invertido
+    (fingerprint_termos: chave -> faixa, quadro), que encontra as faixas com trechos em
+    comum e o alinhamento entre elas sem comparar a fingerprint com a biblioteca inteira.
+    """
+    
+    def __init__(self, caminho=BIBLIOTECA_DB):
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self.conexao = conectar_banco(caminho)
+        with self.conexao:
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    caminho TEXT PRIMARY KEY,
+                    inode INTEGER,
+                    tamanho INTEGER,
+                    mtime_ns INTEGER,
+                    algoritmo TEXT,
+                    duracao REAL,
+                    dados BLOB
+                )""")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_duracao ON fingerprints(algoritmo, duracao)")
+            # A faixa é o rowid da linha em fingerprints
+            self.conexao.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprint_termos (
+                    chave INTEGER,
+                    faixa INTEGER,
+                    quadro INTEGER,
+                    PRIMARY KEY (chave, faixa, quadro)
+                ) WITHOUT ROWID""")
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_termos_faixa ON fingerprint_termos(faixa)")
+            # Índices gravados antes do índice invertido: os termos saem das fingerprints guardadas
+            if not self.conexao.execute("SELECT 1 FROM fingerprint_termos LIMIT 1").fetchone():
+                for faixa, algoritmo, dados in self.conexao.execute(
+                        "SELECT rowid, algoritmo, dados FROM fingerprints").fetchall():
+                    self._inserir_termos(faixa, algoritmo, _fingerprint_de_blob(dados))
+        self._entradas = {
+            caminho: (inode, tamanho, mtime_ns, algoritmo)
+            for caminho, inode, tamanho, mtime_ns, algoritmo
+            in self.conexao.execute("SELECT caminho, inode, tamanho, mtime_ns, algoritmo FROM fingerprints")
+        }
+    
+    def valido(self, caminho, info, algoritmo):
+        """Indica se a fingerprint guardada ainda corresponde ao arquivo."""
+        return self._entradas.get(caminho) == (info.st_ino, info.st_size, info.st_mtime_ns, algoritmo)
+    
+    def atualizar(self, caminho, info, algoritmo, duracao, valores):
+        linha = (caminho, info.st_ino, info.st_size, info.st_mtime_ns, algoritmo, duracao, _fingerprint_para_blob(valores))
+        with self._lock:
+            self._entradas[caminho] = linha[1:5]
+            self._pendentes.append((linha, valores))
+    
+    def _inserir_termos(self, faixa, algoritmo, valores):
+        self.conexao.executemany("INSERT OR IGNORE INTO fingerprint_termos (chave, faixa, quadro) VALUES (?, ?, ?)",
+                                 [(chave, faixa, quadro) for chave, quadro in _termos_fingerprint(valores, algoritmo)])
+    
+    def _remover_termos(self, caminho):
+        self.conexao.execute("DELETE FROM fingerprint_termos WHERE faixa IN (SELECT rowid FROM fingerprints WHERE caminho = ?)",
+                             (caminho,))
+    
+    def remover(self, caminhos):
+        """Remove do índice os arquivos que não existem mais. Retorna quantos foram removidos."""
+        caminhos = [c for c in caminhos if c in self._entradas]
+        with self._lock:
+            self._gravar_pendentes()
+            for caminho in caminhos:
+                del self._entradas[caminho]
+            with self.conexao:
+                for caminho in caminhos:
+                    self._remover_termos(caminho)
+                self.conexao.executemany("DELETE FROM fingerprints WHERE caminho = ?", [(c,) for c in caminhos])
+        return len(caminhos)
+    
+    def caminhos(self):
+        return set(self._entradas)
+    
+    def tem_duracao_proxima(self, algoritmo, duracao, tolerancia):
+        """Indica se alguma faixa indexada tem duração próxima (consulta só o índice da duração)."""
+        self.salvar()
+        with self._lock:
+            return self.conexao.execute(
+                "SELECT 1 FROM fingerprints WHERE algoritmo = ? AND duracao BETWEEN ? AND ? LIMIT 1",
+                (algoritmo, duracao - tolerancia, duracao + tolerancia)).fetchone() is not None
+    
+    def buscar(self, algoritmo, valores, duracao=None, tolerancia=None, excluir=None, limite=None):
+        """Busca no índice invertido as faixas com trechos em comum com a fingerprint `valores`.
+        
+        Cada quadro de `valores` vota, em cada faixa onde a chave dele aparece, no
+        alinhamento (quadro da faixa - quadro de `valores`). Com `duracao`, só entram faixas
+        com duração até `tolerancia` segundos de diferença; `excluir` é um caminho a
+        ignorar. Retorna as `limite` faixas mais votadas (com pelo menos _VOTOS_MIN votos)
+        como (caminho, alinhamento, votos, fingerprint).
+        """
+        limite = limite or POLITICA_DUPLICATAS["candidatos"]
+        por_chave = {}
+        # tolist() converte o array do numpy em inteiros do Python de uma vez
+        for quadro, valor in enumerate(valores.tolist() if hasattr(valores, 'tolist') else valores):
+            por_chave.setdefault(valor >> (32 - _BITS_CHAVE), []).append(quadro)
+        filtro, parametros = "f.algoritmo = ?", [algoritmo]
+        if duracao is not None:
+            filtro += " AND f.duracao BETWEEN ? AND ?"
+            parametros += [duracao - tolerancia, duracao + tolerancia]
+        if excluir is not None:
+            filtro += " AND f.caminho != ?"
+            parametros.append(excluir)
         
-    return atualizados > 0
+        self.salvar()
+        votos = Counter()
+        chaves = list(por_chave)
+        with self._lock:
+            for i in range(0, len(chaves), 500):
+                lote = chaves[i:i + 500]
+                marcadores = ', '.join('?' * len(lote))
+                # CROSS JOIN fixa a ordem: parte das chaves, e não de todas as faixas com duração próxima
+                for chave, faixa, quadro in self.conexao.execute(
+                        "SELECT t.chave, t.faixa, t.quadro FROM fingerprint_termos t CROSS JOIN fingerprints f ON f.rowid = t.faixa "
+                        f"WHERE t.chave IN ({marcadores}) AND {filtro}", (*lote, *parametros)):
+                    for quadro_busca in por_chave[chave]:
+                        votos[(faixa, quadro - quadro_busca)] += 1
+            
+            # O alinhamento mais votado de cada faixa
+            melhores = {}
+            for (faixa, alinhamento), n in votos.items():
+                if n >= _VOTOS_MIN and n > melhores.get(faixa, (0, 0))[0]:
+                    melhores[faixa] = (n, alinhamento)
+            escolhidas = sorted(melhores.items(), key=lambda item: item[1][0], reverse=True)[:limite]
+            resultado = []
+            for faixa, (n, alinhamento) in escolhidas:
+                caminho, dados = self.conexao.execute("SELECT caminho, dados FROM fingerprints WHERE rowid = ?", (faixa,)).fetchone()
+                resultado.append((caminho, alinhamento, n, _fingerprint_de_blob(dados)))
+        return resultado
+    
+    def todos(self, algoritmo):
+        """Gera (caminho, duração, fingerprint) de todas as faixas, em ordem de duração."""
+        self.salvar()
+        linhas = self.conexao.execute(
+            "SELECT caminho, duracao, dados FROM fingerprints WHERE algoritmo = ? AND duracao IS NOT NULL ORDER BY duracao",
+            (algoritmo,))
+        for caminho, duracao, dados in linhas:
+            yield caminho, duracao, _fingerprint_de_blob(dados)
+    
+    def _gravar_pendentes(self):
+        if not self._pendentes:
+            return
+        with self.conexao:
+            for linha, valores in self._pendentes:
+                # INSERT OR REPLACE troca o rowid da faixa: os termos antigos saem antes
+                self._remover_termos(linha[0])
+                cursor = self.conexao.execute(
+                    "INSERT OR REPLACE INTO fingerprints (caminho, inode, tamanho, mtime_ns, algoritmo, duracao, dados) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", linha)
+                self._inserir_termos(cursor.lastrowid, linha[4], valores)
+        self._pendentes = []
+    
+    def salvar(self):
+        """Grava em uma única transação as fingerprints pendentes."""
+        with self._lock:
+            self._gravar_pendentes()
+
+_indice_fingerprints = None
+_indice_fingerprints_lock = threading.Lock()
+
+def obter_indice_fingerprints():
+    """Retorna o índice de fingerprints, abrindo-o uma única vez por execução."""
+    global _indice_fingerprints
+    with _indice_fingerprints_lock:
+        if _indice_fingerprints is None:
+            _indice_fingerprints = IndiceFingerprints()
+            atexit.register(_indice_fingerprints.salvar)
+        return _indice_fingerprints
+
+def _verificar_ferramentas_fingerprint():
+    algoritmo = algoritmo_fingerprint()
+    if algoritmo is None:
+        print("❌ Para comparar áudio instale o Chromaprint (fpcalc) ou o numpy: pip install numpy")
+    elif algoritmo == "haitsma" and not verificar_ffmpeg():
+        print("❌ ffmpeg não encontrado. Ele é necessário para decodificar o áudio.")
+        return None
+    return algoritmo
+
+def indexar_fingerprints(workers=SCAN_WORKERS):
+    """Calcula as fingerprints dos arquivos novos ou alterados da biblioteca e remove as de arquivos apagados."""
+    algoritmo = _verificar_ferramentas_fingerprint()
+    if algoritmo is None:
+        return None
+    indice = obter_indice_fingerprints()
+    cache = obter_cache_scan()
+    
+    vistos = set()
+    pendentes = []
+    for entrada in listar_arquivos_audio(extensoes=('.m4a', '.mp3')):
+        caminho_relativo = os.path.relpath(entrada.path, BIBLIOTECA_PATH)
+        vistos.add(caminho_relativo)
+        info = entrada.stat()
+        if not indice.valido(caminho_relativo, info, algoritmo):
+            pendentes.append((entrada.path, caminho_relativo, info))
+    
+    def calcular(item):
+        caminho, caminho_relativo, info = item
+        try:
+            # A duração vem do cache de escaneamento (ou das tags) e indexa as candidatas
+            metadados = cache.obter(caminho_relativo, info) or obter_metadados(caminho)
+            return item, metadados.get("duracao"), calcular_fingerprint(caminho, algoritmo=algoritmo), None
+        except Exception as e:
+            return item, None, None, e
+    
+    falhas = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (caminho, caminho_relativo, info), duracao, valores, erro in tqdm(
+                executor.map(calcular, pendentes), total=len(pendentes), desc="Calculando fingerprints", unit="arquivo"):
+            if erro is not None or valores is None or not duracao:
+                falhas += 1
+                tqdm.write(f"⚠️ Fingerprint não calculada para {caminho_relativo}: {erro or 'áudio curto ou sem duração'}")
+                continue
+            indice.atualizar(caminho_relativo, info, algoritmo, duracao, valores)
+    
+    removidos = indice.remover(indice.caminhos() - vistos)
+    indice.salvar()
+    print(f"🔎 Fingerprints: {len(pendentes) - falhas} calculadas, {len(vistos) - len(pendentes)} do índice, "
+          f"{removidos} removidas, {falhas} falhas.")
+    return algoritmo
+
+def relatorio_duplicatas_acusticas(workers=SCAN_WORKERS):
+    """Atualiza o índice de fingerprints e relata os grupos de faixas com o mesmo áudio."""
+    algoritmo = indexar_fingerprints(workers)
+    if algoritmo is None:
+        return False
+    
+    tolerancia = POLITICA_DUPLICATAS["tolerancia_duracao"]
+    limiar = POLITICA_DUPLICATAS["similaridade_min"]
+    indice = obter_indice_fingerprints()
+    
+    # União das faixas parecidas. Cada faixa consulta o índice invertido, que devolve só as
+    # poucas faixas de duração próxima com trechos em comum e o alinhamento entre elas;
+    # os bits são comparados apenas em torno desse alinhamento
+    grupo = {}
+    def raiz(caminho):
+        grupo.setdefault(caminho, caminho)
+        while grupo[caminho] != caminho:
+            grupo[caminho] = grupo[grupo[caminho]]
+            caminho = grupo[caminho]
+        return caminho
+    
+    duracoes = {}
+    similaridades = {}
+    comparados = set()
+    for caminho_i, duracao_i, valores_i in tqdm(indice.todos(algoritmo), total=len(indice.caminhos()),
+                                                desc="Comparando fingerprints", unit="arquivo"):
+        duracoes[caminho_i] = duracao_i
+        for caminho_j, alinhamento, _, valores_j in indice.buscar(algoritmo, valores_i, duracao_i, tolerancia, excluir=caminho_i):
+            par = (min(caminho_i, caminho_j), max(caminho_i, caminho_j))
+            if par in comparados:
+                continue
+            comparados.add(par)
+            similaridade = similaridade_fingerprints(valores_i, valores_j, _FOLGA_ALINHAMENTO, alinhamento)
+            if similaridade >= limiar:
+                grupo[raiz(caminho_j)] = raiz(caminho_i)
+                similaridades[caminho_j] = max(similaridades.get(caminho_j, 0), similaridade)
+                similaridades[caminho_i] = max(similaridades.get(caminho_i, 0), similaridade)
+    
+    grupos = {}
+    for caminho in similaridades:
+        grupos.setdefault(raiz(caminho), []).append((caminho, duracoes[caminho]))
+    duplicados = [membros for membros in grupos.values() if len(membros) > 1]
+    
+    if not duplicados:
+        print("\n✅ Nenhuma duplicata acústica encontrada.")
+        return True
+    
+    print(f"\n🎧 {len(duplicados)} grupos de faixas com o mesmo áudio:")
+    recuperavel = 0
+    for numero, membros in enumerate(duplicados, 1):
+        print(f"\n  Grupo {numero}:")
+        tamanhos = []
+        for caminho, duracao in membros:
+            tamanho = os.path.getsize(os.path.join(BIBLIOTECA_PATH, caminho))
+            tamanhos.append(tamanho)
+            print(f"    • {caminho} ({duracao:.0f}s, {tamanho / (1024 * 1024):.1f} MB, {similaridades[caminho]:.0%})")
+        recuperavel += sum(tamanhos) - max(tamanhos)
+    print(f"\n📊 Resumo: {sum(len(m) for m in duplicados)} arquivos em {len(duplicados)} grupos; "
+          f"manter só o maior de cada grupo liberaria {recuperavel / (1024 * 1024):.1f} MB.")
+    return True
+
+def _url_audio(video_info):
+    """Escolhe, nas informações do vídeo, a URL de áudio mais leve para baixar um trecho."""
+    for formato in video_info.get('requested_formats') or []:
+        if formato.get('acodec') not in (None, 'none') and formato.get('url'):
+            return formato['url'], formato.get('http_headers') or {}
+    audios = [f for f in video_info.get('formats') or []
+              if f.get('url') and f.get('acodec') not in (None, 'none') and f.get('vcodec') in (None, 'none')
+              and not str(f.get('protocol', '')).startswith('m3u8')]
+    if audios:
+        formato = min(audios, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+        return formato['url'], formato.get('http_headers') or {}
+    if video_info.get('url'):
+        return video_info['url'], video_info.get('http_headers') or {}
+    return None, {}
+
+def duplicata_acustica(video_info):
+    """Verifica, antes do download, se o áudio do vídeo já está na biblioteca.
+    
+    Só se houver faixas indexadas com duração próxima à do vídeo o ffmpeg baixa os
+    primeiros segundos do áudio para calcular a fingerprint. O índice invertido aponta as
+    poucas faixas com trechos em comum e o alinhamento, onde os bits são comparados.
+    Retorna (caminho, similaridade) da faixa mais parecida, ou None.
+    """
+    duracao = video_info.get('duration')
+    algoritmo = algoritmo_fingerprint()
+    if not duracao or algoritmo is None:
+        return None
+    indice = obter_indice_fingerprints()
+    tolerancia = POLITICA_DUPLICATAS["tolerancia_duracao"]
+    if not indice.tem_duracao_proxima(algoritmo, duracao, tolerancia):
+        return None
+    url, cabecalhos = _url_audio(video_info)
+    if not url:
+        return None
+    
+    pasta = tempfile.mkdtemp(prefix="trecho-")
+    try:
+        trecho = os.path.join(pasta, "trecho.wav")
+        comando = ['ffmpeg', '-v', 'error', '-y']
+        if cabecalhos:
+            comando += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in cabecalhos.items())]
+        comando += ['-i', url, '-t', str(POLITICA_DUPLICATAS["trecho"]), '-vn', '-ac', '1', trecho]
+        if subprocess.run(comando, stdout=subprocess.PIPE, stderr=subprocess.PIPE).returncode != 0:
+            return None
+        valores = calcular_fingerprint(trecho, POLITICA_DUPLICATAS["trecho"], algoritmo)
+    except Exception as e:
+        tqdm.write(f"⚠️ Não foi possível verificar o áudio antes do download: {e}")
+        return None
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    if valores is None:
+        return None
+    
+    candidatos = indice.buscar(algoritmo, valores, duracao, tolerancia)
+    if not candidatos:
+        return None
+    melhor = max(((caminho, similaridade_fingerprints(valores, candidato, _FOLGA_ALINHAMENTO, alinhamento))
+                  for caminho, alinhamento, _, candidato in candidatos),
+                 key=lambda par: par[1])
+    return melhor if melhor[1] >= POLITICA_DUPLICATAS["similaridade_min"] else None
 
 def main():
     parser = argparse.ArgumentParser(
@@ -825,6 +4092,7 @@ Exemplos de uso:
   gmrmusic -a -m URL -q 320   # Baixa áudio de melhor qualidade
   gmrmusic -v -p URL -q 720   # Baixa vídeos da playlist em 720p
   gmrmusic -p URL -n "Artista"# Baixa playlist e define o nome do artista
+  gmrmusic -p URL -j 4        # Baixa a playlist com 4 downloads simultâneos
   gmrmusic --list             # Lista todas as músicas na biblioteca (corrigido para usar --)
   gmrmusic -a -m URL -f       # Força download mesmo se já existir
   gmrmusic --organize         # Organiza a biblioteca (novo exemplo)
@@ -848,9 +4116,8 @@ Códigos de saída:
 
     parser.add_argument('-A', '--atualizar', action='store_true', 
                         help='Atualizar metadados dos arquivos com base no arquivo Excel')
-    # O argumento -up/--update não parece ser utilizado no fluxo de código, mas sua definição é mantida caso seja um trabalho em progresso.
     parser.add_argument('-up', '--update', action='store_true',
-                        help='Força a atualização de todos os arquivos mesmo sem alterações')
+                        help='Com -A, regrava as tags de todos os arquivos mesmo sem alterações')
 
     # Argumentos para fonte
     source_group = parser.add_mutually_exclusive_group(required=False)
@@ -858,15 +4125,26 @@ Códigos de saída:
                              help='URL da playlist do YouTube')
     source_group.add_argument('-m', '--music', metavar='URL', 
                              help='URL do vídeo individual do YouTube')
+    source_group.add_argument('--sync', metavar='URL_OU_ARQUIVO',
+                             help='Sincroniza uma playlist (ou todas as de um arquivo, uma URL por linha),\nbaixando as entradas novas desde a última sincronização\ne tentando de novo as que falharam')
     
     # Outros argumentos
-    # O argumento -M/--meta não parece ser utilizado no fluxo de código, mas sua definição é mantida.
     parser.add_argument('-M','--meta', action='store_true',
-                        help='Atualizar metadados')
+                        help='Regrava título, artista e álbum de toda a biblioteca a partir das pastas e nomes\n(só arquivos com alguma tag diferente são gravados)')
+    parser.add_argument('--verboso', action='store_true',
+                        help='Mostra as mensagens de andamento de cada arquivo (tags, capas, movimentação para a biblioteca)')
+    parser.add_argument('--simular', action='store_true',
+                        help='Com -M, --organize, --deduplicar ou --sync, apenas relata o que seria alterado, sem gravar nada')
     parser.add_argument('-q', '--quality', metavar='QUALITY', 
                        help='Qualidade do vídeo (ex: 1080, 720, 480) ou do áudio')
     parser.add_argument('-f', '--force', action='store_true', 
                        help='Forçar download mesmo que já exista na biblioteca')
+    parser.add_argument('--remover-ausentes', action='store_true',
+                       help='Com --sync, apaga os arquivos dos vídeos que saíram da playlist\n(se não estiverem em outra playlist sincronizada)')
+    parser.add_argument('--retentar-falhas', action='store_true',
+                       help='Com -p, baixa de novo apenas os itens da fila da playlist que falharam')
+    parser.add_argument('--max-tentativas', type=int, default=SYNC_MAX_TENTATIVAS, metavar='N',
+                       help=f'Com --sync, número de falhas após o qual um item deixa de ser tentado (padrão: {SYNC_MAX_TENTATIVAS})')
     # É mais comum usar --list para argumentos longos sem valor.
     parser.add_argument('--list', action='store_true', 
                        help='Listar músicas na biblioteca')
@@ -874,10 +4152,38 @@ Códigos de saída:
                        help='Define um nome de artista personalizado para organizar os downloads')
     parser.add_argument('-pn', '--playlist-artist', action='store_true',
                        help='Solicita nome do artista ao baixar uma playlist')
+    parser.add_argument('--api', action='store_true',
+                       help='Usa o yt-dlp em processo (módulo yt_dlp) em vez de chamar o executável')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='Baixa só o áudio e grava o M4A final, com título, artista, álbum e capa,\nem uma única passada do ffmpeg (sem extração e regravação das tags à parte)')
+    parser.add_argument('--capa-max', metavar='LxA',
+                       help=f"Dimensões máximas da capa (padrão: {POLITICA_CAPA['largura_max']}x{POLITICA_CAPA['altura_max']})")
+    parser.add_argument('--capa-qualidade', metavar='N', type=int,
+                       help=f"Qualidade JPEG ao recomprimir capas (padrão: {POLITICA_CAPA['qualidade_jpeg']})")
+    parser.add_argument('--capa-bytes', metavar='N', type=int,
+                       help=f"Tamanho máximo da capa em bytes (padrão: {POLITICA_CAPA['bytes_max']})")
+    parser.add_argument('--colunar', choices=('parquet', 'arrow'),
+                       help='Exporta também o catálogo em formato colunar (duração, bitrate, tamanho,\nmtime, ID do vídeo e hash da capa). Requer pyarrow')
+    parser.add_argument('--duplicatas', action='store_true',
+                       help='Relata os arquivos com o mesmo áudio (hash do conteúdo, sem as tags)')
+    parser.add_argument('--deduplicar', choices=['hardlink', 'remover'],
+                       help='Elimina as cópias de cada grupo de duplicatas: hardlink para cópias idênticas\nou remover (com --simular, só mostra o que seria feito)')
+    parser.add_argument('--duplicatas-acusticas', action='store_true',
+                       help='Indexa as fingerprints acústicas da biblioteca e relata faixas com o mesmo áudio\n(requer ffmpeg e numpy, ou o fpcalc do Chromaprint)')
+    parser.add_argument('--verificar-audio', action='store_true',
+                       help='Antes de cada download, compara um trecho do áudio com as faixas indexadas\nde duração parecida e pula as que já estão na biblioteca')
+    parser.add_argument('--encolher-capas', action='store_true',
+                       help='Reduz as capas já embutidas na biblioteca que excedem a política de capas')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int,
+                       help=f'Número de vídeos da playlist baixados simultaneamente (padrão: 1)\nou, com -M, de arquivos gravados simultaneamente (padrão: {TAG_WORKERS})\nou, com --organize, de requisições simultâneas ao Ollama (padrão: {OLLAMA_CONCORRENCIA})')
     
     # Adicionar o argumento para 'organize'
     parser.add_argument('--organize', action='store_true',
                        help='Organiza a biblioteca usando IA para melhorar nomes de pastas e arquivos.')
+    parser.add_argument('--retomar', action='store_true',
+                       help='Retoma a última organização (--organize) interrompida')
+    parser.add_argument('--desfazer', action='store_true',
+                       help='Desfaz a última organização (--organize), concluída ou interrompida')
     # O argumento -h/--help é adicionado automaticamente pelo argparse
     
     args = parser.parse_args()
@@ -897,6 +4203,37 @@ Códigos de saída:
     
     # Verificar argumentos e executar ações correspondentes
     # Corrigido para usar args.list (com dois hífens como definido acima)
+    # Aplica a política de capas informada na linha de comando
+    if args.capa_max:
+        try:
+            largura, altura = (int(v) for v in args.capa_max.lower().split('x'))
+        except ValueError:
+            parser.error("--capa-max deve estar no formato LARGURAxALTURA (ex: 600x600)")
+        POLITICA_CAPA['largura_max'] = largura
+        POLITICA_CAPA['altura_max'] = altura
+    if args.capa_qualidade:
+        POLITICA_CAPA['qualidade_jpeg'] = args.capa_qualidade
+    if args.capa_bytes:
+        POLITICA_CAPA['bytes_max'] = args.capa_bytes
+    
+    if args.verboso:
+        SAIDA['verboso'] = True
+    
+    if args.verificar_audio:
+        POLITICA_DUPLICATAS['verificar_antes'] = True
+    
+    if args.encolher_capas:
+        return encolher_capas_biblioteca()
+    
+    if args.duplicatas or args.deduplicar:
+        return deduplicar_biblioteca(args.deduplicar, simular=args.simular)
+    
+    if args.duplicatas_acusticas:
+        return relatorio_duplicatas_acusticas()
+    
+    if args.meta:
+        return atualizar_metadados_existentes(args.simular, args.jobs or TAG_WORKERS)
+    
     if args.list: 
         listar_biblioteca()
         return True # main() deve retornar True/False ou códigos de saída numéricos
@@ -906,13 +4243,13 @@ Códigos de saída:
         # Ler dados do Excel e atualizar metadados
         dados_excel = ler_excel()
         if dados_excel:
-            atualizar_metadados(dados_excel)
+            alteracoes = atualizar_metadados(dados_excel, forcar=args.update)
             
-            # Após atualizar, reescanear a biblioteca para atualizar o markdown
-            print("\nReescaneando biblioteca para atualizar documentação...")
-            dados = escanear_biblioteca()
-            criar_markdown(dados)
-            criar_excel(dados)
+            # Após atualizar, corrigir nos catálogos só as linhas alteradas
+            atualizar_catalogos(alteracoes, dados_excel)
+            if args.colunar:
+                # O cache já tem as tags novas: o escaneamento só confere stat dos arquivos
+                exportar_catalogo_colunar(iterar_biblioteca(), args.colunar)
             print("Documentação atualizada com sucesso!")
         else:
             print("Sem dados para atualizar. Execute o script sem a flag -A primeiro.")
@@ -925,8 +4262,12 @@ Códigos de saída:
     # Definir o nome do artista se necessário
     artist_name = args.artist_name
     
-    if args.organize: # Agora args.organize existe
-        return organizar_biblioteca()
+    if args.retomar:
+        return retomar_organizacao()
+    elif args.desfazer:
+        return desfazer_organizacao()
+    elif args.organize: # Agora args.organize existe
+        return organizar_biblioteca(args.jobs or OLLAMA_CONCORRENCIA, args.simular)
     elif args.playlist:
         # Se a flag -pn foi usada, solicita o nome do artista
         if args.playlist_artist and not artist_name:
@@ -935,16 +4276,28 @@ Códigos de saída:
                 print("⚠️ Nome de artista não fornecido. Será usado o nome do uploader original.")
                 artist_name = None
         
-        return baixar_playlist(args.playlist, apenas_audio, args.quality, args.force, artist_name)
+        return baixar_playlist(args.playlist, apenas_audio, args.quality, args.force, artist_name, args.jobs or 1, args.api, args.pipeline,
+                               retentar=args.retentar_falhas)
+    elif args.sync:
+        return sincronizar_playlists(args.sync, apenas_audio, args.quality, args.force, artist_name, args.jobs or 1, args.api,
+                                     args.pipeline, args.remover_ausentes, args.simular, args.max_tentativas)
     elif args.music:
         # Permitir o uso de -n também para vídeos individuais
-        return baixar_video_individual(args.music, apenas_audio, args.quality, args.force, artist_name)
+        return baixar_video_individual(args.music, apenas_audio, args.quality, args.force, artist_name, args.api, args.pipeline)
     else:
         # Modo padrão: escanear biblioteca e atualizar arquivos
         # (Se nenhum dos argumentos acima foi passado, executa esta ação)
-        dados = escanear_biblioteca()
-        criar_markdown(dados)
-        criar_excel(dados)
+        # Um único escaneamento alimenta o markdown (e o catálogo colunar) enquanto acontece;
+        # para o Excel ficam só as colunas comparadas
+        linhas = escanear_biblioteca()
+        if args.colunar:
+            if pa is None:
+                print("❌ pyarrow não encontrado. Instale com: pip install pyarrow")
+            else:
+                linhas = catalogo_colunar_em_fluxo(linhas, args.colunar)
+        linhas_excel = []
+        criar_markdown(coletar_para_excel(linhas, linhas_excel))
+        criar_excel(linhas_excel)
         print("Biblioteca escaneada e documentos atualizados com sucesso!")
         return True # Adicionado retorno para consistência
 
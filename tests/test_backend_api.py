@@ -0,0 +1,118 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import gmrmusic
+
+yt_dlp = pytest.importorskip("yt_dlp")
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+AUDIO = bytes(range(256)) * 512
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+class _Servidor(BaseHTTPRequestHandler):
+    """Serve o mesmo conteúdo de áudio em qualquer caminho."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mp4")
+        self.send_header("Content-Length", str(len(AUDIO)))
+        self.end_headers()
+        self.wfile.write(AUDIO)
+
+
+@pytest.fixture
+def servidor():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Servidor)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+    srv.server_close()
+
+
+def _extratores(base):
+    """Extratores locais que atendem URLs do YouTube sem acessar a rede."""
+
+    class VideoLocalIE(InfoExtractor):
+        IE_NAME = "video-local"
+        _VALID_URL = r"https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>[\w-]{11})"
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            if video_id == "indisponive":
+                raise yt_dlp.utils.ExtractorError("vídeo indisponível", expected=True)
+            return {
+                "id": video_id,
+                "title": f"Título {video_id}",
+                "uploader": "Artista Local",
+                "webpage_url": url,
+                "formats": [{"format_id": "140", "url": f"{base}/{video_id}.m4a", "ext": "m4a",
+                             "acodec": "mp4a.40.2", "vcodec": "none", "filesize": len(AUDIO)}],
+            }
+
+    class PlaylistLocalIE(InfoExtractor):
+        IE_NAME = "playlist-local"
+        _VALID_URL = r"https?://(?:www\.)?youtube\.com/playlist\?list=(?P<id>\w+)"
+
+        def _real_extract(self, url):
+            ids = ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+            entradas = [self.url_result(gmrmusic.url_canonica(video_id), VideoLocalIE, video_id) for video_id in ids]
+            return self.playlist_result(entradas, self._match_id(url), "Playlist Local")
+
+    return [VideoLocalIE, PlaylistLocalIE]
+
+
+@pytest.fixture
+def backend(servidor):
+    return gmrmusic.BackendAPI(extratores=_extratores(servidor), pipeline=True)
+
+
+def test_info(backend):
+    info = backend.info(gmrmusic.url_canonica(VIDEO_ID))
+    assert info["id"] == VIDEO_ID
+    assert info["uploader"] == "Artista Local"
+
+
+def test_info_de_video_indisponivel(backend):
+    with pytest.raises(gmrmusic.ErroYtdlp):
+        backend.info(gmrmusic.url_canonica("indisponive"))
+    assert list(backend.infos([gmrmusic.url_canonica("indisponive"), gmrmusic.url_canonica(VIDEO_ID)]))[0]["id"] == VIDEO_ID
+
+
+def test_info_playlist_e_simples(backend):
+    playlist = backend.info_playlist("https://www.youtube.com/playlist?list=PLlocal")
+    assert [entrada["id"] for entrada in playlist["entries"]] == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    # A listagem simples não extrai os vídeos, e a instância volta às opções de um vídeo só
+    assert "formats" not in playlist["entries"][0]
+    assert backend._ydl().params.get("noplaylist") is True
+
+
+def test_baixar_reaproveita_a_instancia_e_informa_o_progresso(backend, tmp_path):
+    video_url = gmrmusic.url_canonica(VIDEO_ID)
+    info = backend.info(video_url)
+    ydl = backend._ydl()
+    progresso = []
+
+    caminho = backend.baixar(video_url, str(tmp_path), info, progresso.append)
+
+    assert backend._ydl() is ydl
+    assert os.path.dirname(caminho) == str(tmp_path)
+    with open(caminho, "rb") as f:
+        assert f.read() == AUDIO
+    assert progresso and progresso[-1] == 100
+
+
+def test_instancia_por_thread(backend):
+    instancias = []
+    threads = [threading.Thread(target=lambda: instancias.append(backend._ydl())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert instancias[0] is not instancias[1]
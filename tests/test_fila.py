@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+import gmrmusic
+
+PLAYLIST = "https://www.youtube.com/playlist?list=PLlocal"
+IDS = ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "ddddddddddd"]
+
+
+class _BackendLocal:
+    """Backend no lugar do yt-dlp: lista a playlist e devolve as informações sem rede."""
+
+    pipeline = True
+
+    def __init__(self):
+        self.listagens = 0
+
+    def info_playlist(self, playlist_url):
+        self.listagens += 1
+        return {"title": "Playlist Local", "entries": [{"id": video_id} for video_id in IDS]}
+
+    def infos(self, video_urls):
+        for video_url in video_urls:
+            yield {"id": gmrmusic.extrair_video_id(video_url), "uploader": "Artista Local"}
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    db = str(tmp_path / "biblioteca.db")
+    backend = _BackendLocal()
+    monkeypatch.setattr(gmrmusic, "BIBLIOTECA_PATH", str(tmp_path))
+    monkeypatch.setattr(gmrmusic, "BIBLIOTECA_CSV", str(tmp_path / "biblioteca.csv"))
+    monkeypatch.setattr(gmrmusic, "_registro", gmrmusic.RegistroBiblioteca(db))
+    monkeypatch.setattr(gmrmusic, "_fila", gmrmusic.FilaDownloads(db))
+    monkeypatch.setattr(gmrmusic, "_preparar_downloads", lambda *args: (backend, str(tmp_path / "downloads_puros")))
+    return backend
+
+
+def _baixador(tmp_path, baixados, interromper_em=None):
+    """Substitui baixar_video: percorre as mesmas etapas, gravando um arquivo por vídeo.
+
+    O vídeo `interromper_em` para depois de chegar à biblioteca, como um Ctrl+C na marcação.
+    """
+    def baixar_video(backend, video_url, video_info, download_dir, apenas_audio, force=False, idx=None,
+                     total_videos=None, posicao=None, etapa=None):
+        video_id = video_info["id"]
+        baixados.append(video_id)
+        etapa("baixando")
+        destino = str(tmp_path / f"{video_id}.m4a")
+        with open(destino, "wb") as f:
+            f.write(video_id.encode())
+        metadados = {"artist": video_info["uploader"], "title": video_id, "album": "", "pipeline": True}
+        etapa("marcando", destino=destino, metadados=metadados)
+        if video_id == interromper_em:
+            raise KeyboardInterrupt
+        gmrmusic.finalizar_download(destino, video_url, metadados, pipeline=True)
+        etapa("concluido")
+        return True
+    return baixar_video
+
+
+def test_itens_interrompidos_sao_retomados(ambiente, tmp_path, monkeypatch):
+    baixados = []
+    monkeypatch.setattr(gmrmusic, "baixar_video", _baixador(tmp_path, baixados, interromper_em=IDS[1]))
+    with pytest.raises(KeyboardInterrupt):
+        gmrmusic.baixar_playlist(PLAYLIST)
+
+    fila = gmrmusic.obter_fila()
+    assert baixados == IDS[:2]
+    assert fila.resumo(PLAYLIST) == {"concluido": 1, "marcando": 1, "obtendo-info": 2}
+
+    # A segunda execução continua da fila: não lista a playlist de novo, só conclui a marcação
+    # do vídeo que já estava na biblioteca e baixa os que não tinham começado
+    baixados.clear()
+    monkeypatch.setattr(gmrmusic, "baixar_video", _baixador(tmp_path, baixados))
+    assert gmrmusic.baixar_playlist(PLAYLIST)
+
+    assert ambiente.listagens == 1
+    assert baixados == IDS[2:]
+    assert fila.resumo(PLAYLIST) == {"concluido": 4}
+    registro = gmrmusic.obter_registro()
+    assert registro.caminho(gmrmusic.url_canonica(IDS[1])) == str(tmp_path / f"{IDS[1]}.m4a")
+    assert all(registro.contem(gmrmusic.url_canonica(video_id)) for video_id in IDS)
+
+
+def test_marcacao_sem_arquivo_baixa_de_novo(ambiente, tmp_path, monkeypatch):
+    fila = gmrmusic.obter_fila()
+    fila.enfileirar(PLAYLIST, [(1, IDS[0], gmrmusic.url_canonica(IDS[0]))])
+    fila.marcar(PLAYLIST, IDS[0], "marcando", destino=str(tmp_path / "apagado.m4a"),
+                metadados={"artist": "Artista Local", "title": "t", "album": "", "pipeline": True})
+    assert not os.path.exists(tmp_path / "apagado.m4a")
+
+    baixados = []
+    monkeypatch.setattr(gmrmusic, "baixar_video", _baixador(tmp_path, baixados))
+    assert gmrmusic.baixar_playlist(PLAYLIST)
+
+    assert baixados == IDS[:1]
+    item, = fila.itens(PLAYLIST, ("concluido",))
+    assert item["destino"] == str(tmp_path / f"{IDS[0]}.m4a")
+    assert json.loads(item["metadados"])["title"] == IDS[0]
+    assert ambiente.listagens == 0
@@ -0,0 +1,91 @@
+import types
+
+import pytest
+
+import gmrmusic
+
+np = pytest.importorskip("numpy")
+
+QUADROS = 2580  # 120 s de fingerprint de Haitsma-Kalker
+INFO = types.SimpleNamespace(st_ino=1, st_size=1, st_mtime_ns=1)
+
+
+def _aleatoria(rng, quadros=QUADROS):
+    return rng.integers(0, 2 ** 32, quadros, dtype=np.uint64).astype(np.uint32)
+
+
+def _copia_com_ruido(rng, valores, deslocamento, taxa_erros=0.1):
+    """Mesma gravação com `taxa_erros` dos bits trocados, começando `deslocamento` quadros depois."""
+    bits = rng.random((len(valores), 32)) < taxa_erros
+    mascara = (bits.astype(np.uint64) << np.arange(32, dtype=np.uint64)).sum(axis=1).astype(np.uint32)
+    return np.concatenate([_aleatoria(rng, deslocamento), (valores ^ mascara)[:len(valores) - deslocamento]])
+
+
+@pytest.fixture
+def indice(tmp_path, monkeypatch):
+    indice = gmrmusic.IndiceFingerprints(str(tmp_path / "biblioteca.db"))
+    monkeypatch.setattr(gmrmusic, "_indice_fingerprints", indice)
+    return indice
+
+
+@pytest.fixture
+def biblioteca(indice):
+    """40 faixas de durações parecidas; b/3 é a a/3 com ruído, 7 quadros atrasada."""
+    rng = np.random.default_rng(1)
+    faixas = {}
+    for i in range(40):
+        faixas[f"a/{i}.m4a"] = _aleatoria(rng)
+        indice.atualizar(f"a/{i}.m4a", INFO, "haitsma", 200 + i % 9, faixas[f"a/{i}.m4a"])
+    faixas["b/3.m4a"] = _copia_com_ruido(rng, faixas["a/3.m4a"], 7)
+    indice.atualizar("b/3.m4a", INFO, "haitsma", 201, faixas["b/3.m4a"])
+    indice.salvar()
+    return faixas
+
+
+def test_busca_encontra_o_trecho_e_o_alinhamento(indice, biblioteca):
+    trecho = biblioteca["a/3.m4a"][100:100 + 645]
+    candidatos = {caminho: alinhamento for caminho, alinhamento, _, _ in indice.buscar("haitsma", trecho, 200, 10)}
+    assert candidatos == {"a/3.m4a": 100, "b/3.m4a": 107}
+
+
+def test_busca_respeita_a_duracao_e_o_excluido(indice, biblioteca):
+    valores = biblioteca["a/3.m4a"]
+    assert indice.buscar("haitsma", valores, 300, 10) == []
+    assert [c for c, _, _, _ in indice.buscar("haitsma", valores, 200, 10, excluir="a/3.m4a")] == ["b/3.m4a"]
+
+
+def test_similaridade_no_alinhamento(biblioteca):
+    a, b = biblioteca["a/3.m4a"], biblioteca["b/3.m4a"]
+    assert gmrmusic.similaridade_fingerprints(a, b, 2, 7) == pytest.approx(0.9, abs=0.01)
+    assert gmrmusic.similaridade_fingerprints(b, a, 2, -7) == pytest.approx(0.9, abs=0.01)
+    assert gmrmusic.similaridade_fingerprints(a, b, 2, 0) < 0.6
+
+
+def test_relatorio_agrupa_so_as_copias(indice, biblioteca, monkeypatch, capsys):
+    monkeypatch.setattr(gmrmusic, "indexar_fingerprints", lambda workers: "haitsma")
+    monkeypatch.setattr(gmrmusic.os.path, "getsize", lambda caminho: 1024 * 1024)
+    assert gmrmusic.relatorio_duplicatas_acusticas()
+    saida = capsys.readouterr().out
+    assert "1 grupos" in saida and "a/3.m4a" in saida and "b/3.m4a" in saida
+
+
+def test_termos_acompanham_as_fingerprints(tmp_path, indice, biblioteca):
+    faixas = indice.conexao.execute("SELECT COUNT(DISTINCT faixa) FROM fingerprint_termos").fetchone()[0]
+    assert faixas == len(biblioteca)
+
+    # Regravar uma faixa troca os termos dela, e remover apaga os termos
+    indice.atualizar("a/0.m4a", INFO, "haitsma", 200, biblioteca["a/1.m4a"])
+    indice.remover(["b/3.m4a"])
+    assert [c for c, _, _, _ in indice.buscar("haitsma", biblioteca["a/1.m4a"], 200, 10)] in (
+        ["a/0.m4a", "a/1.m4a"], ["a/1.m4a", "a/0.m4a"])
+    assert indice.buscar("haitsma", biblioteca["b/3.m4a"][:645], 200, 10, excluir="a/3.m4a") == []
+    orfaos = indice.conexao.execute(
+        "SELECT COUNT(*) FROM fingerprint_termos WHERE faixa NOT IN (SELECT rowid FROM fingerprints)").fetchone()[0]
+    assert orfaos == 0
+
+
+def test_indice_antigo_ganha_os_termos(tmp_path, indice, biblioteca):
+    with indice.conexao:
+        indice.conexao.execute("DELETE FROM fingerprint_termos")
+    reaberto = gmrmusic.IndiceFingerprints(str(tmp_path / "biblioteca.db"))
+    assert [c for c, _, _, _ in reaberto.buscar("haitsma", biblioteca["a/5.m4a"], 200, 10)] == ["a/5.m4a"]
@@ -0,0 +1,137 @@
+import copy
+import struct
+
+import pytest
+from mutagen.id3 import ID3, APIC, TPE1, TPE2, TIT2, TXXX, WOAR, WXXX, Encoding
+from mutagen.mp4 import MP4, MP4Cover
+
+import gmrmusic
+
+CAPA = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 40
+# Maior que o prefixo lido para o hash da capa
+CAPA_GRANDE = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 1024
+
+
+def _caixa(tipo, dados):
+    return struct.pack('>I4s', 8 + len(dados), tipo) + dados
+
+
+def _m4a(caminho, duracao=5):
+    """M4A mínimo (ftyp, moov/mvhd e mdat), suficiente para o mutagen gravar as tags."""
+    mvhd = _caixa(b'mvhd', bytes(4) + struct.pack('>IIII', 0, 0, 1000, duracao * 1000) + bytes(80))
+    with open(caminho, 'wb') as f:
+        f.write(_caixa(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom'))
+        f.write(_caixa(b'moov', mvhd))
+        f.write(_caixa(b'mdat', bytes(20000)))
+
+
+def _mp3(caminho, quadros=40):
+    """MP3 com quadros MPEG-1 Layer III de 128 kbps a 44,1 kHz (417 bytes cada)."""
+    with open(caminho, 'wb') as f:
+        f.write((b'\xff\xfb\x90\x00' + bytes(413)) * quadros)
+
+
+def _mutagen(caminho, monkeypatch):
+    """Lê o arquivo pelo caminho do mutagen de obter_metadados, sem o leitor rápido."""
+    with monkeypatch.context() as m:
+        m.setattr(gmrmusic, "ler_tags_rapido", lambda arquivo: None)
+        return gmrmusic.obter_metadados(str(caminho))
+
+
+def _comparar(caminho, monkeypatch):
+    rapido = gmrmusic.ler_tags_rapido(str(caminho))
+    esperado = _mutagen(caminho, monkeypatch)
+    assert rapido is not None
+    for chave in ("meta_artista", "URL", "capa_hash"):
+        assert rapido[chave] == esperado[chave], chave
+    assert rapido["duracao"] == pytest.approx(esperado["duracao"], abs=0.05)
+    return rapido
+
+
+@pytest.mark.parametrize("tags", [
+    {'©ART': ['Ártista Ünicode']},
+    {'aART': ['Artista do Álbum']},
+    {'©ART': ['Artista'], '----:com.apple.iTunes:URL': [b'https://www.youtube.com/watch?v=dQw4w9WgXcQ']},
+    {'©ART': ['Artista'], 'covr': [MP4Cover(CAPA, MP4Cover.FORMAT_JPEG)]},
+    {'©ART': ['Artista'], 'covr': [MP4Cover(CAPA_GRANDE, MP4Cover.FORMAT_JPEG)]},
+    {'©ART': ['Artista'], '©nam': ['Título'], 'covr': [MP4Cover(CAPA, MP4Cover.FORMAT_JPEG), MP4Cover(CAPA[::-1])]},
+])
+def test_m4a_igual_ao_mutagen(tmp_path, monkeypatch, tags):
+    caminho = tmp_path / "musica.m4a"
+    _m4a(caminho)
+    audio = MP4(caminho)
+    audio.update(tags)
+    audio.save()
+
+    rapido = _comparar(caminho, monkeypatch)
+    if 'covr' in tags:
+        assert rapido["capa_hash"] is not None
+
+
+def test_m4a_sem_tags(tmp_path, monkeypatch):
+    caminho = tmp_path / "musica.m4a"
+    _m4a(caminho)
+    rapido = _comparar(caminho, monkeypatch)
+    assert rapido["meta_artista"] == "" and rapido["capa_hash"] is None
+    assert rapido["bitrate"] == round(20000 * 8 / 5 / 1000)
+
+
+# ID3v2.3 só tem Latin-1 e UTF-16; a v2.4 acrescenta UTF-16BE e UTF-8
+@pytest.mark.parametrize("versao, codificacao", [
+    (3, Encoding.LATIN1), (3, Encoding.UTF16),
+    (4, Encoding.LATIN1), (4, Encoding.UTF16), (4, Encoding.UTF16BE), (4, Encoding.UTF8),
+])
+@pytest.mark.parametrize("quadros", [
+    [TPE1(text=['Artista Ção'])],
+    [TPE2(text=['Artista do Álbum'])],
+    [TPE1(text=['Artista']), TXXX(desc='URL', text=['https://www.youtube.com/watch?v=dQw4w9WgXcQ'])],
+    [TPE1(text=['Artista']), WOAR(url='https://www.youtube.com/watch?v=dQw4w9WgXcQ')],
+    [TPE1(text=['Artista']), WXXX(desc='Descrição', url='https://youtu.be/dQw4w9WgXcQ')],
+    [TPE1(text=['Artista']), TIT2(text=['Título']), APIC(mime='image/jpeg', type=3, desc='Capa ü', data=CAPA)],
+    [APIC(mime='image/jpeg', type=3, desc='Capa grande', data=CAPA_GRANDE)],
+    [APIC(mime='image/png', type=3, desc='', data=CAPA), APIC(mime='image/jpeg', type=4, desc='verso', data=CAPA[::-1])],
+])
+def test_mp3_igual_ao_mutagen(tmp_path, monkeypatch, versao, codificacao, quadros):
+    caminho = tmp_path / "musica.mp3"
+    _mp3(caminho)
+    tag = ID3()
+    for quadro in copy.deepcopy(quadros):
+        if hasattr(quadro, 'encoding'):
+            quadro.encoding = codificacao
+        if codificacao == Encoding.LATIN1 and hasattr(quadro, 'text'):
+            quadro.text = [texto.encode('latin-1', 'replace').decode('latin-1') for texto in quadro.text]
+        tag.add(quadro)
+    tag.save(caminho, v2_version=versao)
+
+    rapido = _comparar(caminho, monkeypatch)
+    assert rapido["bitrate"] == 128
+
+
+def test_mp3_com_id3v1(tmp_path, monkeypatch):
+    caminho = tmp_path / "musica.mp3"
+    _mp3(caminho)
+    tag = ID3()
+    tag.add(TPE1(encoding=Encoding.UTF16, text=['Artista']))
+    tag.save(caminho, v2_version=4, v1=2)
+
+    rapido = _comparar(caminho, monkeypatch)
+    assert rapido["meta_artista"] == "Artista"
+    assert rapido["duracao"] == pytest.approx(40 * 417 * 8 / 128000, abs=0.01)
+
+
+def test_mp3_sem_tag(tmp_path, monkeypatch):
+    caminho = tmp_path / "musica.mp3"
+    _mp3(caminho)
+    assert _comparar(caminho, monkeypatch)["meta_artista"] == ""
+
+
+def test_extensao_desconhecida(tmp_path):
+    caminho = tmp_path / "musica.ogg"
+    caminho.write_bytes(b'OggS')
+    assert gmrmusic.ler_tags_rapido(str(caminho)) is None
+
+
+def test_hash_da_capa_le_so_o_prefixo():
+    assert gmrmusic.hash_capa(CAPA_GRANDE) == gmrmusic.hash_capa(CAPA_GRANDE[:gmrmusic.CAPA_HASH_PREFIXO], len(CAPA_GRANDE))
+    # O tamanho entra no hash: capas com o mesmo começo e tamanhos diferentes não se confundem
+    assert gmrmusic.hash_capa(CAPA_GRANDE) != gmrmusic.hash_capa(CAPA_GRANDE + b'\x00')
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import gmrmusic
+
+
+@pytest.fixture(autouse=True)
+def config_normalizacao(tmp_path, monkeypatch):
+    """Usa um normalizacao.json temporário e recarrega a configuração a cada teste."""
+    monkeypatch.setattr(gmrmusic, "NORMALIZACAO_CONFIG", str(tmp_path / "normalizacao.json"))
+    monkeypatch.setattr(gmrmusic, "_config_normalizacao", None)
+    return tmp_path / "normalizacao.json"
+
+
+@pytest.mark.parametrize("nome", [
+    "P!nk",
+    "Guns N' Roses",
+    "Can't Stop",
+    "AC/DC",
+    "Ke$ha",
+    "Rock & Roll",
+    "Florence + The Machine",
+    "Jay-Z",
+    "ABBA",
+    "Mr. Brightside",
+])
+def test_nomes_com_pontuacao_ficam_intactos(nome):
+    assert gmrmusic.normalizar_nome_local(nome, "artista") == nome
+
+
+@pytest.mark.parametrize("nome, esperado", [
+    ("Queen - Bohemian Rhapsody (Official Video) [fJ9rUzIMcZQ]", "Queen - Bohemian Rhapsody"),
+    ("Coldplay_-_Yellow", "Coldplay - Yellow"),
+    ("Artista — Música", "Artista - Música"),
+    ("Hello, World!", "Hello World"),
+    ("Song (feat. X) [Lyrics]", "Song (feat. X)"),
+    ("Californication (Remastered 2015)", "Californication (Remastered 2015)"),
+])
+def test_regras_mecanicas(nome, esperado):
+    assert gmrmusic.normalizar_nome_local(nome, "arquivo") == esperado
+
+
+@pytest.mark.parametrize("nome", ["linkin park", "SYSTEM OF A DOWN", "Song {x}", "x"])
+def test_nomes_duvidosos_vao_ao_modelo(nome):
+    assert gmrmusic.normalizar_nome_local(nome, "arquivo") is None
+
+
+def test_regra_que_apaga_pontuacao_dentro_da_palavra_vai_ao_modelo(config_normalizacao):
+    config_normalizacao.write_text(json.dumps({"regras": [["[!$']", ""]]}), encoding="utf-8")
+    for nome in ("P!nk", "Ke$ha", "Can't Stop"):
+        assert gmrmusic.normalizar_nome_local(nome, "artista") is None
+    assert gmrmusic.normalizar_nome_local("Muse!", "artista") == "Muse"
+
+
+def test_apelidos(config_normalizacao):
+    config_normalizacao.write_text(json.dumps({"aliases": {"acdc": "AC-DC"}}), encoding="utf-8")
+    assert gmrmusic.normalizar_nome_local("ac_dc", "artista") == "AC-DC"
+    assert gmrmusic.normalizar_nome_local("ac_dc", "arquivo") is None
@@ -0,0 +1,106 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import gmrmusic
+
+
+class _OllamaLocal(BaseHTTPRequestHandler):
+    """Servidor no lugar do Ollama: devolve cada nome do lote com underscores trocados e em Title Case."""
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, corpo, status=200):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        self._responder({"models": [{"name": "llama3:latest"}]})
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.pedidos.append(corpo)
+        if self.server.falhas:
+            self.server.falhas -= 1
+            return self._responder({"error": "ocupado"}, 503)
+        if self.server.resposta is not None:
+            return self._responder({"response": self.server.resposta, "done": True})
+        nomes = re.findall(r"^(\d+)\. (.*)$", corpo["prompt"], re.M)
+        self._responder({"response": json.dumps({n: nome.replace("_", " ").title() for n, nome in nomes}), "done": True})
+
+
+@pytest.fixture
+def servidor(tmp_path, monkeypatch):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _OllamaLocal)
+    srv.pedidos, srv.falhas, srv.resposta = [], 0, None
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    monkeypatch.setattr(gmrmusic, "OLLAMA_HOST", f"http://127.0.0.1:{srv.server_port}")
+    monkeypatch.setattr(gmrmusic, "OLLAMA_ESPERA_BASE", 0)
+    monkeypatch.setattr(gmrmusic, "_sessao_http", None)
+    monkeypatch.setattr(gmrmusic, "NORMALIZACAO_CONFIG", str(tmp_path / "normalizacao.json"))
+    monkeypatch.setattr(gmrmusic, "_config_normalizacao", None)
+    monkeypatch.setattr(gmrmusic, "_cache_normalizacao", gmrmusic.CacheNormalizacao(str(tmp_path / "biblioteca.db")))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+# Nomes todos em minúsculas: as regras locais não resolvem e eles vão ao modelo
+NOMES = ["linkin_park", "system of a down", "foo fighters"]
+
+
+def test_ollama_disponivel(servidor):
+    assert gmrmusic.ollama_disponivel()
+
+
+def test_lotes_e_cache(servidor, tmp_path):
+    estatisticas = {}
+    resultado = gmrmusic.normalizar_em_lotes({"artista": NOMES}, tamanho_lote=2, estatisticas=estatisticas)
+
+    assert resultado == {"artista": {"linkin_park": "Linkin Park", "system of a down": "System Of A Down",
+                                     "foo fighters": "Foo Fighters"}}
+    assert len(servidor.pedidos) == 2
+    assert all(pedido["format"] == "json" and pedido["model"] == gmrmusic.OLLAMA_MODEL for pedido in servidor.pedidos)
+    assert estatisticas == {"cache": 0, "locais": 0, "modelo": 3}
+
+    # Numa nova execução, tudo vem do cache do banco, sem chamar o modelo
+    gmrmusic._cache_normalizacao = gmrmusic.CacheNormalizacao(str(tmp_path / "biblioteca.db"))
+    assert gmrmusic.normalizar_em_lotes({"artista": NOMES}, estatisticas=estatisticas) == resultado
+    assert len(servidor.pedidos) == 2
+    assert estatisticas["cache"] == 3
+
+
+def test_nomes_resolvidos_localmente_nao_vao_ao_modelo(servidor):
+    estatisticas = {}
+    resultado = gmrmusic.normalizar_em_lotes({"artista": ["P!nk", "Guns N' Roses"]}, estatisticas=estatisticas)
+    assert resultado == {"artista": {"P!nk": "P!nk", "Guns N' Roses": "Guns N' Roses"}}
+    assert servidor.pedidos == []
+    assert estatisticas["locais"] == 2
+
+
+def test_servidor_ocupado_e_tentado_de_novo(servidor):
+    servidor.falhas = 2
+    assert gmrmusic.consultar_ollama("1. a_b", formato="json") == json.dumps({"1": "A B"})
+    assert len(servidor.pedidos) == 3
+
+
+def test_desiste_depois_das_tentativas(servidor):
+    servidor.falhas = 10
+    assert gmrmusic.consultar_ollama("1. a_b", tentativas=2) is None
+    assert len(servidor.pedidos) == 2
+
+
+def test_resposta_invalida_nao_entra_no_cache(servidor):
+    servidor.resposta = "isto não é JSON"
+    resultado = gmrmusic.normalizar_em_lotes({"arquivo": NOMES[:1]})
+    assert resultado == {"arquivo": {"linkin_park": "linkin_park"}}
+    assert gmrmusic.obter_cache_normalizacao().obter("arquivo", "linkin_park") is None
@@ -0,0 +1,113 @@
+import os
+import types
+
+import pytest
+
+import gmrmusic
+
+INFO = types.SimpleNamespace(st_ino=1, st_size=1, st_mtime_ns=1)
+
+PASTAS = {
+    "Foo Fighters": ["everlong.m4a"],
+    "foo fighters": ["best_of_you.m4a"],
+    "linkin_park": ["in_the_end.m4a", "numb.m4a"],
+}
+ARTISTAS = {"foo fighters": "Foo Fighters", "linkin_park": "Linkin Park"}
+ARQUIVOS = {"best_of_you": "Best Of You", "in_the_end": "In The End", "numb": "Numb"}
+FINAL = {
+    os.path.join("Foo Fighters", "everlong.m4a"),
+    os.path.join("Foo Fighters", "Best Of You.m4a"),
+    os.path.join("Linkin Park", "In The End.m4a"),
+    os.path.join("Linkin Park", "Numb.m4a"),
+}
+
+
+@pytest.fixture
+def biblioteca(tmp_path, monkeypatch):
+    """Biblioteca temporária com registro e cache de escaneamento apontando para cada arquivo."""
+    raiz = tmp_path / "biblioteca"
+    db = str(tmp_path / "biblioteca.db")
+    monkeypatch.setattr(gmrmusic, "BIBLIOTECA_PATH", str(raiz))
+    monkeypatch.setattr(gmrmusic, "BIBLIOTECA_CSV", str(raiz / "biblioteca.csv"))
+    monkeypatch.setattr(gmrmusic, "ORGANIZACAO_PATH", str(tmp_path / "organizacao"))
+    monkeypatch.setattr(gmrmusic, "_registro", gmrmusic.RegistroBiblioteca(db))
+    monkeypatch.setattr(gmrmusic, "_cache_scan", gmrmusic.CacheEscaneamento(db))
+
+    for n, (pasta, arquivos) in enumerate(PASTAS.items()):
+        (raiz / pasta).mkdir(parents=True)
+        for m, arquivo in enumerate(arquivos):
+            (raiz / pasta / arquivo).write_bytes(arquivo.encode())
+            relativo = os.path.join(pasta, arquivo)
+            gmrmusic._registro.registrar(gmrmusic.url_canonica(f"video{n}{m}xxxx"), pasta, str(raiz / relativo))
+            gmrmusic._cache_scan.atualizar(relativo, INFO, {"arquivo": arquivo})
+    gmrmusic._registro.salvar()
+    gmrmusic._cache_scan.salvar()
+    return raiz
+
+
+def _arquivos(raiz):
+    return {os.path.relpath(os.path.join(pasta, nome), raiz) for pasta, _, nomes in os.walk(raiz) for nome in nomes}
+
+
+def _registrados(raiz):
+    gmrmusic._registro.salvar()
+    return {os.path.relpath(caminho, raiz) for (caminho,) in gmrmusic._registro.conexao.execute("SELECT caminho FROM downloads")}
+
+
+def _interromper_na(monkeypatch, operacao):
+    """Faz a `operacao`-ésima operação do journal falhar como um erro de disco."""
+    executar = gmrmusic.JournalOrganizacao._executar
+    chamadas = []
+
+    def falhar(self, tipo, origem, destino):
+        chamadas.append(tipo)
+        if len(chamadas) == operacao:
+            raise OSError("disco cheio")
+        return executar(self, tipo, origem, destino)
+
+    monkeypatch.setattr(gmrmusic.JournalOrganizacao, "_executar", falhar)
+
+
+def _aplicar_ate_interromper(biblioteca, monkeypatch):
+    plano = gmrmusic.planejar_organizacao(PASTAS, ARTISTAS, ARQUIVOS)
+    assert len(plano) == 6
+    with monkeypatch.context() as m:
+        _interromper_na(m, 4)
+        assert not gmrmusic.JournalOrganizacao.criar(plano).aplicar()
+    journal = gmrmusic.JournalOrganizacao.ultimo()
+    assert journal.estado == "pendente" and journal.feitos == {0, 1, 2}
+    return journal
+
+
+def test_retomar_e_desfazer(biblioteca, monkeypatch):
+    original = _arquivos(biblioteca)
+    _aplicar_ate_interromper(biblioteca, monkeypatch)
+
+    # Uma nova organização recusa começar por cima da interrompida
+    assert not gmrmusic.organizar_biblioteca()
+
+    assert gmrmusic.retomar_organizacao()
+    assert _arquivos(biblioteca) == FINAL
+    assert _registrados(biblioteca) == FINAL
+    assert gmrmusic._cache_scan.caminhos() == FINAL
+    assert gmrmusic.JournalOrganizacao.ultimo().estado == "concluido"
+
+    assert gmrmusic.desfazer_organizacao()
+    assert _arquivos(biblioteca) == original
+    assert _registrados(biblioteca) == original
+    assert gmrmusic._cache_scan.caminhos() == original
+    journal = gmrmusic.JournalOrganizacao.ultimo()
+    assert journal.estado == "revertido" and not journal.feitos
+
+
+def test_desfazer_interrompida_com_linha_truncada(biblioteca, monkeypatch):
+    original = _arquivos(biblioteca)
+    journal = _aplicar_ate_interromper(biblioteca, monkeypatch)
+    with open(journal.caminho, "a", encoding="utf-8") as f:
+        f.write('{"tipo": "feito", "ind')
+
+    assert gmrmusic.JournalOrganizacao.ultimo().feitos == {0, 1, 2}
+    assert gmrmusic.desfazer_organizacao()
+    assert _arquivos(biblioteca) == original
+    assert _registrados(biblioteca) == original
+    assert gmrmusic._cache_scan.caminhos() == original
@@ -0,0 +1,68 @@
+import csv
+
+import pytest
+
+import gmrmusic
+
+VIDEO_ID = "dQw4w9WgXcQ"
+OUTRO_ID = "9bZkp7q19f0"
+
+# Formas de URL gravadas no biblioteca.csv por versões antigas, todas do mesmo vídeo
+FORMAS = [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}&list=PLlocal&index=3",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"youtube.com/embed/{VIDEO_ID}?start=10",
+    f" https://music.youtube.com/watch?v={VIDEO_ID} ",
+]
+FORA_DO_YOUTUBE = "https://vimeo.com/123456"
+
+
+@pytest.fixture
+def csv_legado(tmp_path, monkeypatch):
+    caminho = tmp_path / "biblioteca.csv"
+    monkeypatch.setattr(gmrmusic, "BIBLIOTECA_CSV", str(caminho))
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Video URL", "Canal"])
+        for n, url in enumerate(FORMAS):
+            writer.writerow([url, f"Canal {n}"])
+        writer.writerow([f"https://youtu.be/{OUTRO_ID}", "Outro Canal"])
+        writer.writerow([FORA_DO_YOUTUBE])
+        writer.writerow([])
+    return caminho
+
+
+def test_csv_legado_vira_uma_chave_por_video(tmp_path, csv_legado, capsys):
+    registro = gmrmusic.RegistroBiblioteca(str(tmp_path / "biblioteca.db"))
+
+    chaves = [chave for (chave,) in registro.conexao.execute("SELECT chave FROM downloads ORDER BY rowid")]
+    assert chaves == [VIDEO_ID, OUTRO_ID, FORA_DO_YOUTUBE]
+    # A primeira linha de cada vídeo é a que fica
+    assert registro.listar() == [(FORMAS[0], "Canal 0"), (f"https://youtu.be/{OUTRO_ID}", "Outro Canal"),
+                                 (FORA_DO_YOUTUBE, "")]
+    assert all(registro.contem(url) for url in FORMAS)
+    assert registro.contem(gmrmusic.url_canonica(OUTRO_ID))
+    assert registro._versao() == gmrmusic.RegistroBiblioteca.VERSAO_CHAVES_CANONICAS
+
+    saida = capsys.readouterr().out
+    assert "8 registros importados" in saida
+    assert f"{len(FORMAS) - 1} duplicatas removidas" in saida
+
+
+def test_csv_legado_e_importado_uma_vez(tmp_path, csv_legado, capsys):
+    db = str(tmp_path / "biblioteca.db")
+    registro = gmrmusic.RegistroBiblioteca(db)
+    registro.registrar(f"https://youtu.be/{OUTRO_ID}", "Outro Canal", "/musica.m4a")
+    registro.salvar()
+    capsys.readouterr()
+
+    # O registro já migrado não relê o CSV nem duplica o que foi registrado depois
+    with open(csv_legado, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["https://youtu.be/aaaaaaaaaaa", "Novo"])
+    registro = gmrmusic.RegistroBiblioteca(db)
+    assert capsys.readouterr().out == ""
+    assert not registro.contem("https://youtu.be/aaaaaaaaaaa")
+    assert registro.caminho(gmrmusic.url_canonica(OUTRO_ID)) == "/musica.m4a"
+    assert registro.conexao.execute("SELECT COUNT(*) FROM downloads").fetchone()[0] == 3